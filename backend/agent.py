@@ -1,9 +1,11 @@
 from typing import Literal
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
 from langgraph.graph import StateGraph, END
-from nodes import router_node, rag_node, web_node, answer_node
+from nodes import router_node, rag_node, speculative_rag_node, web_node, answer_node
 from interview_node import interview_node
 from shared import AgentState
+from wrapnode import wrap_node
+from config import SPECULATIVE_WEB_SEARCH
 
 # Routing functions for conditional edges
 def from_router(st: AgentState) -> Literal["rag", "answer", "end"]:
@@ -19,19 +21,22 @@ def after_web(_) -> Literal["answer"]:
 
 # Graph Building
 g = StateGraph(AgentState)
-g.add_node("router", router_node)
-g.add_node("rag_lookup", rag_node)
-g.add_node("web_search", web_node)
-g.add_node("answer", answer_node)
-g.add_node("interview", interview_node)
+# every node is timed into rag_node_duration_seconds{node, route} (see metrics.py)
+g.add_node("router", wrap_node(router_node, "router"))
+# Speculative mode fetches web results during retrieval + judge; after_rag then routes straight to answer
+g.add_node("rag_lookup", wrap_node(speculative_rag_node if SPECULATIVE_WEB_SEARCH else rag_node, "rag_lookup"))
+g.add_node("web_search", wrap_node(web_node, "web_search"))
+g.add_node("answer", wrap_node(answer_node, "answer"))
+g.add_node("interview", wrap_node(interview_node, "interview"))
 
 g.set_entry_point("router")
 g.add_conditional_edges("router", from_router,
-                        {"rag": "rag_lookup", "answer": "answer", "interview": "interview","end": END})
+                        {"rag": "rag_lookup", "answer": "answer", "interview": "interview", "end": END})
 g.add_conditional_edges("rag_lookup", after_rag,
                         {"answer": "answer", "web": "web_search"})
 g.add_edge("web_search",  "answer")
 g.add_edge("interview", END)
 g.add_edge("answer", END)
+# history compaction runs after the turn is saved, outside the graph (see compaction.py)
 
 agent = g.compile()
\ No newline at end of file
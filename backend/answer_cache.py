@@ -0,0 +1,247 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
+import numpy as np
+from documents_loaders import embedding_function
+from resources import resource
+from config import (ANSWER_CACHE_ENABLED, ANSWER_CACHE_BACKEND, ANSWER_CACHE_DB_PATH,
+                    ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_MAX_ENTRIES)
+
+
+@dataclass
+class CacheEntry:
+    id: str
+    question: str
+    answer: str
+    embedding: np.ndarray
+    file_ids: List[int] = field(default_factory=list)
+    used_web: bool = False
+    created_at: float = field(default_factory=time.time)
+
+
+class MemoryCacheBackend:
+    """LRU-ordered entries plus a stacked embedding matrix for cosine lookup."""
+
+    def __init__(self):
+        self.entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._matrix = None
+        self._matrix_ids: List[str] = []
+
+    def load(self) -> None:
+        pass
+
+    def all(self) -> List[CacheEntry]:
+        return list(self.entries.values())
+
+    def matrix(self):
+        if self._matrix is None:
+            self._matrix_ids = list(self.entries)
+            self._matrix = (np.vstack([self.entries[i].embedding for i in self._matrix_ids])
+                            if self._matrix_ids else None)
+        return self._matrix, self._matrix_ids
+
+    def touch(self, entry_id: str) -> None:
+        self.entries.move_to_end(entry_id)
+
+    def add(self, entry: CacheEntry) -> None:
+        self.entries[entry.id] = entry
+        self._matrix = None
+
+    def remove(self, entry_ids: List[str]) -> None:
+        for entry_id in entry_ids:
+            self.entries.pop(entry_id, None)
+        self._matrix = None
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteCacheBackend(MemoryCacheBackend):
+    """Memory index mirrored to SQLite so entries survive restarts and are shared across workers.
+
+    PRAGMA data_version changes whenever another connection commits, which is
+    used to reload the in-memory index after writes from other processes.
+    """
+
+    def __init__(self, db_path: str = ANSWER_CACHE_DB_PATH):
+        super().__init__()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS answer_cache
+                             (id TEXT PRIMARY KEY,
+                              question TEXT,
+                              answer TEXT,
+                              embedding BLOB,
+                              file_ids TEXT,
+                              used_web INTEGER,
+                              created_at REAL,
+                              last_hit_at REAL)''')
+        self.conn.commit()
+        self._data_version = None
+
+    def load(self) -> None:
+        data_version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+        if data_version == self._data_version:
+            return
+        self._data_version = data_version
+        rows = self.conn.execute('''SELECT id, question, answer, embedding, file_ids, used_web, created_at
+                                    FROM answer_cache ORDER BY last_hit_at''').fetchall()
+        self.entries = OrderedDict(
+            (row[0], CacheEntry(id=row[0], question=row[1], answer=row[2],
+                                embedding=np.frombuffer(row[3], dtype=np.float32),
+                                file_ids=json.loads(row[4]), used_web=bool(row[5]), created_at=row[6]))
+            for row in rows
+        )
+        self._matrix = None
+
+    def touch(self, entry_id: str) -> None:
+        super().touch(entry_id)
+        self.conn.execute('UPDATE answer_cache SET last_hit_at = ? WHERE id = ?', (time.time(), entry_id))
+        self.conn.commit()
+
+    def add(self, entry: CacheEntry) -> None:
+        super().add(entry)
+        self.conn.execute('INSERT OR REPLACE INTO answer_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                          (entry.id, entry.question, entry.answer, entry.embedding.tobytes(),
+                           json.dumps(entry.file_ids), int(entry.used_web), entry.created_at, time.time()))
+        self.conn.commit()
+
+    def remove(self, entry_ids: List[str]) -> None:
+        super().remove(entry_ids)
+        self.conn.executemany('DELETE FROM answer_cache WHERE id = ?', [(i,) for i in entry_ids])
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class SemanticCache:
+    """Embedding-keyed answer cache for the RAG → answer path.
+
+    Entries are tagged with the file_ids of the chunks they were answered from
+    so document changes only invalidate the answers they can affect. Backend
+    reads and writes (SQLite commits) run in a worker thread, off the event loop.
+    """
+
+    def __init__(self, embeddings, backend, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 ttl_seconds: int = ANSWER_CACHE_TTL_SECONDS, max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.embeddings = embeddings
+        self.backend = backend
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # query embeddings computed during lookup, reused by store()
+        self._recent_embeddings: OrderedDict[str, np.ndarray] = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0,
+                         "invalidations": 0, "lookup_ms_total": 0.0}
+
+    async def aembed(self, query: str) -> np.ndarray:
+        cached = self._recent_embeddings.get(query)
+        if cached is not None:
+            return cached
+        vector = np.asarray(await self.embeddings.aembed_query(query), dtype=np.float32)
+        vector /= (np.linalg.norm(vector) or 1.0)
+        self._recent_embeddings[query] = vector
+        while len(self._recent_embeddings) > 256:
+            self._recent_embeddings.popitem(last=False)
+        return vector
+
+    async def alookup(self, query: str) -> Optional[CacheEntry]:
+        """Return the closest fresh entry above the similarity threshold."""
+        started = time.perf_counter()
+        vector = await self.aembed(query)
+        hit = await asyncio.to_thread(self._lookup, vector)
+        self.counters["hits" if hit else "misses"] += 1
+        self.counters["lookup_ms_total"] += (time.perf_counter() - started) * 1000
+        if hit:
+            logging.info(f"💾 Answer cache hit for '{query}' (matched '{hit.question}')")
+        return hit
+
+    def _lookup(self, vector: np.ndarray) -> Optional[CacheEntry]:
+        hit = None
+        with self._lock:
+            self.backend.load()
+            self._expire()
+            matrix, ids = self.backend.matrix()
+            if matrix is not None:
+                scores = matrix @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    hit = self.backend.entries[ids[best]]
+                    self.backend.touch(hit.id)
+        return hit
+
+    async def astore(self, query: str, answer: str, file_ids: List[int], used_web: bool = False) -> None:
+        vector = await self.aembed(query)
+        entry = CacheEntry(id=uuid.uuid4().hex, question=query, answer=answer, embedding=vector,
+                           file_ids=sorted(set(file_ids)), used_web=used_web)
+        await asyncio.to_thread(self._store, entry)
+
+    def _store(self, entry: CacheEntry) -> None:
+        with self._lock:
+            self.backend.load()
+            self.backend.add(entry)
+            self.counters["stores"] += 1
+            overflow = len(self.backend.entries) - self.max_entries
+            if overflow > 0:
+                self.backend.remove(list(self.backend.entries)[:overflow])
+                self.counters["evictions"] += overflow
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        expired = [e.id for e in self.backend.all() if e.created_at < cutoff]
+        if expired:
+            self.backend.remove(expired)
+            self.counters["evictions"] += len(expired)
+
+    def _invalidate(self, predicate) -> int:
+        with self._lock:
+            self.backend.load()
+            stale = [e.id for e in self.backend.all() if predicate(e)]
+            if stale:
+                self.backend.remove(stale)
+                self.counters["invalidations"] += len(stale)
+        return len(stale)
+
+    def invalidate_file(self, file_id: int) -> int:
+        """Drop answers built from chunks of a deleted or replaced document."""
+        return self._invalidate(lambda e: file_id in e.file_ids)
+
+    def invalidate_kb_misses(self) -> int:
+        """Drop answers that needed the web; a newly uploaded document may now cover them."""
+        return self._invalidate(lambda e: e.used_web or not e.file_ids)
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "entries": len(self.backend.entries),
+            "hit_rate": self.counters["hits"] / lookups if lookups else 0.0,
+            "avg_lookup_ms": self.counters["lookup_ms_total"] / lookups if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self.backend.close()
+
+
+@resource("answer_cache")
+def answer_cache() -> Optional[SemanticCache]:
+    """Build the answer cache selected by ANSWER_CACHE_BACKEND (None when disabled)."""
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    if ANSWER_CACHE_BACKEND == "memory":
+        backend = MemoryCacheBackend()
+    elif ANSWER_CACHE_BACKEND == "sqlite":
+        backend = SqliteCacheBackend()
+    else:
+        raise ValueError(f"Unsupported answer cache backend: {ANSWER_CACHE_BACKEND}")
+    return SemanticCache(embedding_function(), backend)
@@ -0,0 +1,205 @@
+"""Incrementally index every document under DOC_SOURCE_DIR.
+
+A manifest maps each relative path to (size, mtime, content hash, file_id).
+Files whose size and mtime are unchanged are skipped without being read, so
+re-running on an unchanged directory only costs a directory scan. The
+manifest is rewritten after every file, so an interrupted run keeps what it
+finished. One sync runs at a time per manifest: with INDEX_ON_STARTUP and
+several uvicorn workers, the first worker to start syncs and the others skip.
+
+Usage (from backend/):
+    python bulk_indexer.py [--dir ../documents] [--workers 4]
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from config import DOC_SOURCE_DIR, INDEX_MANIFEST_PATH, INDEX_WORKERS
+
+try:  # advisory file locks (POSIX); without them concurrent syncs are not excluded
+    import fcntl
+except ImportError:
+    fcntl = None
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.html')
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(path: str) -> Dict[str, dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(path: str, manifest: Dict[str, dict]) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+@contextlib.contextmanager
+def manifest_lock(path: str):
+    """Yield whether this process got the manifest's sync lock; it is held until the block exits."""
+    if fcntl is None:
+        yield True
+        return
+    with open(f"{path}.lock", "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def scan_directory(source_dir: str) -> Dict[str, os.stat_result]:
+    found = {}
+    for root, _, files in os.walk(source_dir):
+        for name in files:
+            if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                full_path = os.path.join(root, name)
+                found[os.path.relpath(full_path, source_dir)] = os.stat(full_path)
+    return found
+
+
+def remove_document(file_id: int) -> bool:
+    """Delete a document's chunks, record and cached answers; False (and nothing removed) if Chroma fails."""
+    from documents_loaders import delete_doc_from_chroma
+    from db_utils import delete_document_record
+    from answer_cache import answer_cache
+
+    if not delete_doc_from_chroma(file_id):
+        return False
+    delete_document_record(file_id)
+    cache = answer_cache()
+    if cache is not None:
+        cache.invalidate_file(file_id)
+    return True
+
+
+def sync_directory(source_dir: str = DOC_SOURCE_DIR, manifest_path: str = INDEX_MANIFEST_PATH,
+                   workers: int = INDEX_WORKERS, dry_run: bool = False) -> dict:
+    """Index new/changed files, drop removed ones and rewrite the manifest.
+
+    Returns without doing anything ("skipped") when another process is syncing the same manifest.
+    """
+    if dry_run:
+        return _sync(source_dir, manifest_path, workers, dry_run)
+    with manifest_lock(manifest_path) as acquired:
+        if acquired:
+            return _sync(source_dir, manifest_path, workers, dry_run)
+    logging.info(f"📚 Bulk index of {source_dir} skipped: another process is syncing {manifest_path}")
+    return {"indexed": [], "unchanged": 0, "removed": [], "failed": [], "skipped": True}
+
+
+def _sync(source_dir: str, manifest_path: str, workers: int, dry_run: bool) -> dict:
+    started = time.perf_counter()
+    manifest = load_manifest(manifest_path)
+    on_disk = scan_directory(source_dir)
+    summary = {"indexed": [], "unchanged": 0, "removed": [], "failed": []}
+
+    to_index = {}
+    for rel_path, st in on_disk.items():
+        entry = manifest.get(rel_path)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            summary["unchanged"] += 1
+            continue
+        content_hash = file_sha256(os.path.join(source_dir, rel_path))
+        if entry and entry["sha256"] == content_hash:
+            # touched but identical: refresh the stat fields only
+            entry.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+            summary["unchanged"] += 1
+            continue
+        to_index[rel_path] = (st, content_hash, entry.get("file_id") if entry else None)
+
+    removed = [p for p in manifest if p not in on_disk]
+    if dry_run:
+        return {**summary, "indexed": sorted(to_index), "removed": removed,
+                "seconds": time.perf_counter() - started}
+
+    # Only pull in the indexing stack when there is work to do
+    if to_index or removed:
+        from ingestion_jobs import ingest_file
+        from db_utils import document_exists
+
+    lock = threading.Lock()
+
+    def record(rel_path: str, entry: Optional[dict]) -> None:
+        """Update one manifest entry (None drops it) and write the manifest; caller holds lock."""
+        if entry is None:
+            manifest.pop(rel_path, None)
+        else:
+            manifest[rel_path] = entry
+        save_manifest(manifest_path, manifest)
+
+    for rel_path in removed:
+        # a document whose chunks could not be deleted keeps its entry, so the next sync retries it
+        if remove_document(manifest[rel_path]["file_id"]):
+            record(rel_path, None)
+            summary["removed"].append(rel_path)
+        else:
+            summary["failed"].append({"path": rel_path, "error": "deleting its chunks from Chroma failed"})
+
+    def index_one(rel_path: str) -> None:
+        st, content_hash, old_file_id = to_index[rel_path]
+        # a changed file is swapped in atomically for its previous version, unless that was deleted meanwhile
+        replaces = old_file_id if old_file_id is not None and document_exists(old_file_id) else None
+        try:
+            file_id = ingest_file(os.path.join(source_dir, rel_path), os.path.basename(rel_path),
+                                  replaces=replaces)
+        except Exception as e:
+            logging.exception(f"Failed to index {rel_path}")
+            with lock:
+                summary["failed"].append({"path": rel_path, "error": str(e)})
+            return
+        with lock:
+            record(rel_path, {"size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                              "sha256": content_hash, "file_id": file_id})
+            summary["indexed"].append(rel_path)
+
+    if to_index:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk-index") as pool:
+            list(pool.map(index_one, sorted(to_index)))
+
+    # also keeps the refreshed stat fields of touched but identical files
+    save_manifest(manifest_path, manifest)
+    summary["seconds"] = time.perf_counter() - started
+    logging.info(f"📚 Bulk index of {source_dir}: {len(summary['indexed'])} indexed, "
+                 f"{summary['unchanged']} unchanged, {len(summary['removed'])} removed, "
+                 f"{len(summary['failed'])} failed in {summary['seconds']:.3f}s")
+    return summary
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=DOC_SOURCE_DIR, help="document directory (default: DOC_SOURCE_DIR)")
+    parser.add_argument("--manifest", default=INDEX_MANIFEST_PATH)
+    parser.add_argument("--workers", type=int, default=INDEX_WORKERS)
+    parser.add_argument("--dry-run", action="store_true", help="only report what would change")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    summary = sync_directory(args.dir, args.manifest, args.workers, args.dry_run)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Pick RAG_ACCEPT_THRESHOLD / RAG_REJECT_THRESHOLD from a labelled query set.
+
+Input is JSONL with one {"query": ..., "sufficient": true|false} per line.
+Queries without a "sufficient" label are labelled by judge_llm when
+--label-with-judge is given, so a plain list of real user questions works too.
+
+For every query the retrieval score is computed exactly as in rag_node: the
+best dense relevance score among the chunks search_kb returns (after fusion
+in hybrid mode). The accept threshold is the lowest score above which at
+least --min-precision of queries are sufficient; the reject threshold is the
+highest score below which at least --min-precision are insufficient.
+
+Below the reject threshold, gate_retrieval still sends retrievals holding
+the brochure of the product the query names to the judge ('product_judge'),
+so those queries never count towards the reject precision. Queries whose
+returned chunks have no dense score always go to the judge and are skipped.
+
+Usage (from backend/):
+    python calibrate_rag_gate.py queries.jsonl [--min-precision 0.95] [--label-with-judge]
+"""
+import argparse
+import asyncio
+import json
+from typing import List, Optional, Tuple
+
+
+def pick_thresholds(samples: List[Tuple[float, bool, bool]],
+                    min_precision: float) -> Tuple[Optional[float], Optional[float]]:
+    """Return (accept, reject) thresholds from (score, sufficient, product_match) samples.
+
+    None when no threshold reaches the precision target.
+    """
+    scores = sorted({score for score, _, _ in samples})
+
+    accept = None
+    for t in scores:  # lowest t whose auto-accept region is precise enough
+        above = [ok for score, ok, _ in samples if score >= t]
+        if above and sum(above) / len(above) >= min_precision:
+            accept = t
+            break
+
+    reject = None
+    for t in reversed(scores):  # highest t whose auto-reject region is precise enough
+        below = [not ok for score, ok, product in samples if score < t and not product]
+        if below and sum(below) / len(below) >= min_precision:
+            reject = t
+            break
+
+    if accept is not None and reject is not None and reject > accept:
+        reject = accept
+    return accept, reject
+
+
+async def score_queries(rows: List[dict], label_with_judge: bool) -> List[Tuple[float, bool, bool]]:
+    from tools import search_kb
+    from nodes import judge_retrieval
+
+    samples = []
+    for row in rows:
+        result = await search_kb(row["query"])
+        if result.score is None:
+            continue
+        label = row.get("sufficient")
+        if label is None:
+            if not label_with_judge:
+                continue
+            label = await judge_retrieval(row["query"], result.chunks)
+        samples.append((result.score, bool(label), result.product_match))
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("queries", help="JSONL file of labelled queries")
+    parser.add_argument("--min-precision", type=float, default=0.95)
+    parser.add_argument("--label-with-judge", action="store_true", help="label unlabelled queries with judge_llm")
+    args = parser.parse_args()
+
+    with open(args.queries, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+
+    samples = asyncio.run(score_queries(rows, args.label_with_judge))
+    accept, reject = pick_thresholds(samples, args.min_precision)
+
+    accepted = sum(1 for score, _, _ in samples if accept is not None and score >= accept)
+    rejected = sum(1 for score, _, product in samples if reject is not None and score < reject and not product)
+    product_judged = sum(1 for score, _, product in samples if reject is not None and score < reject and product)
+    print(json.dumps({
+        "samples": len(samples),
+        "RAG_ACCEPT_THRESHOLD": accept,
+        "RAG_REJECT_THRESHOLD": reject,
+        "judge_skip_rate": (accepted + rejected) / len(samples) if samples else 0.0,
+        "product_judge": product_judged,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Cassettes: the external calls (LLM, embeddings, Tavily, MCP) made during recorded chat turns.
+
+With CASSETTE_DIR set, every /chat and /chat/stream turn appends one JSON line
+to <CASSETTE_DIR>/<session_id>.jsonl: the endpoint, the question, the turn's
+wall time and each external call in completion order with its response, latency and tokens.
+bench/replay.py serves these responses in place of the real services to
+replay the sessions in chat_history against a new build without network
+access.
+
+Calls are keyed so a replay can find them even if prompts change:
+- llm: "<node>" or "<node>:<structured output schema>"
+- embedding: the embedded text
+- tavily: the query
+- mcp: "<tool> <arguments as sorted JSON>"
+"""
+import asyncio
+import base64
+import functools
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from array import array
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.embeddings import Embeddings
+from langchain_core.outputs import LLMResult
+from langchain_core.tracers.context import register_configure_hook
+from config import CASSETTE_DIR
+from metrics import current_node, token_usage, response_model_name
+
+_write_lock = threading.Lock()
+
+
+def encode_vector(vector: List[float]) -> str:
+    """float32 bytes as base64 (a quarter of the size of a JSON float list)."""
+    return base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+
+
+def decode_vector(data: str) -> List[float]:
+    return array("f", base64.b64decode(data)).tolist()
+
+
+def llm_key(node: str, schema: Optional[str]) -> str:
+    return f"{node}:{schema}" if schema else node
+
+
+def mcp_key(name: str, arguments: dict) -> str:
+    arguments = {k: v for k, v in arguments.items() if k != "request_id"}  # a fresh uuid per call
+    return f"{name} {json.dumps(arguments, sort_keys=True, ensure_ascii=False, default=str)}"
+
+
+def cassette_path(session_id: str, directory: str = CASSETTE_DIR) -> str:
+    return os.path.join(directory, re.sub(r"[^\w.-]", "_", session_id) + ".jsonl")
+
+
+def load_cassette(session_id: str, directory: str = CASSETTE_DIR) -> List[dict]:
+    """Recorded turns of a session in order ([] when it was never recorded)."""
+    try:
+        with open(cassette_path(session_id, directory), encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+class TurnRecorder(BaseCallbackHandler):
+    """Collects the external calls of one chat turn.
+
+    LLM calls arrive as callbacks (the recorder is added to every callback
+    manager while it is current_recorder); the other calls are added by
+    @recorded and RecordingEmbeddings.
+    """
+
+    run_inline = True
+    ignore_chain = True
+    ignore_agent = True
+    ignore_retriever = True
+
+    def __init__(self, session_id: str, question: str, endpoint: str):
+        self.session_id = session_id
+        self.question = question
+        self.endpoint = endpoint
+        self.calls: List[dict] = []
+        self._runs: Dict[UUID, tuple] = {}
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, key: str, response: Any, seconds: float, node: Optional[str] = None, **extra) -> None:
+        call = {"kind": kind, "key": key, "node": node or current_node.get(), "ms": round(seconds * 1000, 2),
+                "response": response, **extra}
+        with self._lock:
+            self.calls.append(call)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs) -> None:
+        params = kwargs.get("invocation_params") or {}
+        schema = params.get("response_format")
+        if isinstance(schema, dict):
+            schema = (schema.get("json_schema") or {}).get("name")
+        elif schema is not None:
+            schema = getattr(schema, "__name__", None)
+        node = current_node.get()
+        if node == "none":
+            node = (metadata or {}).get("langgraph_node", "none")
+        prompt = hashlib.sha256("\x1e".join(str(m.content) for batch in messages for m in batch)
+                                .encode("utf-8")).hexdigest()[:16]
+        self._runs[run_id] = (llm_key(node, schema), node, prompt, time.perf_counter())
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        key, node, prompt, started = run
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        message = getattr(generation, "message", None)
+        content = getattr(message, "content", None) or (generation.text if generation else "")
+        if not content and getattr(message, "tool_calls", None):  # function-calling structured output
+            content = json.dumps(message.tool_calls[0]["args"], ensure_ascii=False)
+        self.add("llm", key, content, time.perf_counter() - started, node=node, prompt=prompt,
+                 tokens=list(token_usage(response)), model=response_model_name(response))
+
+    def on_llm_error(self, error: BaseException, *, run_id, **kwargs) -> None:
+        self._runs.pop(run_id, None)
+
+    def save(self, seconds: float, directory: str = CASSETTE_DIR) -> None:
+        line = json.dumps({"session_id": self.session_id, "endpoint": self.endpoint, "question": self.question,
+                           "ms": round(seconds * 1000, 2), "recorded_at": time.time(), "calls": self.calls},
+                          ensure_ascii=False)
+        os.makedirs(directory, exist_ok=True)
+        with _write_lock, open(cassette_path(self.session_id, directory), "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+current_recorder: ContextVar[Optional[TurnRecorder]] = ContextVar("current_recorder", default=None)
+# while a turn is recorded, every LangChain run started in its context reports to the recorder
+register_configure_hook(current_recorder, True)
+
+
+@asynccontextmanager
+async def record_turn(session_id: str, question: str, endpoint: str):
+    """Record the external calls made inside the block as one cassette line (no-op when CASSETTE_DIR is unset).
+
+    Turns that raise are not written.
+    """
+    if not CASSETTE_DIR:
+        yield None
+        return
+    recorder = TurnRecorder(session_id, question, endpoint)
+    token = current_recorder.set(recorder)
+    started = time.perf_counter()
+    try:
+        yield recorder
+    finally:
+        current_recorder.reset(token)
+    await asyncio.to_thread(recorder.save, time.perf_counter() - started)
+
+
+def recorded(kind: str, key: Callable[..., str], serialize: Callable[[Any], Any] = lambda result: result) -> Callable:
+    """Add each call of an async function made during a recorded turn to its cassette."""
+    def decorator(fn):
+        if not CASSETTE_DIR:
+            return fn
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            recorder = current_recorder.get()
+            if recorder is None:
+                return await fn(*args, **kwargs)
+            started = time.perf_counter()
+            result = await fn(*args, **kwargs)
+            recorder.add(kind, key(*args, **kwargs), serialize(result), time.perf_counter() - started)
+            return result
+        return wrapper
+    return decorator
+
+
+class RecordingEmbeddings(Embeddings):
+    """Embeddings wrapper adding the vectors computed during a recorded turn to its cassette."""
+
+    def __init__(self, underlying: Embeddings):
+        self.underlying = underlying
+
+    def _add(self, texts: List[str], vectors: List[List[float]], started: float) -> None:
+        recorder = current_recorder.get()
+        if recorder is not None:
+            seconds = (time.perf_counter() - started) / max(len(texts), 1)
+            for text, vector in zip(texts, vectors):
+                recorder.add("embedding", text, encode_vector(vector), seconds)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        started = time.perf_counter()
+        vectors = self.underlying.embed_documents(texts)
+        self._add(texts, vectors, started)
+        return vectors
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        started = time.perf_counter()
+        vectors = await self.underlying.aembed_documents(texts)
+        self._add(texts, vectors, started)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        started = time.perf_counter()
+        vector = self.underlying.embed_query(text)
+        self._add([text], [vector], started)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        started = time.perf_counter()
+        vector = await self.underlying.aembed_query(text)
+        self._add([text], [vector], started)
+        return vector
@@ -0,0 +1,120 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Tuple, TypeVar
+
+T = TypeVar("T")
+Emit = Callable[[str, Any], None]
+
+
+def submission_key(session_id: str, question: str, model: str) -> Tuple[str, str, str]:
+    """Submissions that differ only in whitespace are the same submission."""
+    return session_id, " ".join(question.split()), model
+
+
+class TurnEvents:
+    """Events a turn emits while it runs, kept so every stream joining the turn gets all of them."""
+
+    def __init__(self):
+        self.events: List[Tuple[str, Any]] = []
+        self._added = asyncio.Event()
+
+    def emit(self, event: str, data: Any) -> None:
+        self.events.append((event, data))
+        self._added.set()
+
+    async def follow(self, task: asyncio.Task) -> AsyncIterator[Tuple[str, Any]]:
+        """Yield the events emitted so far, then new ones as they come, until task is done."""
+        seen = 0
+        while True:
+            while seen < len(self.events):
+                seen += 1
+                yield self.events[seen - 1]
+            if task.done():
+                return
+            self._added.clear()
+            added = asyncio.ensure_future(self._added.wait())
+            try:
+                # waiting on the task itself never cancels it
+                await asyncio.wait({added, task}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                added.cancel()
+
+
+class ChatTurns:
+    """Runs chat turns one at a time per session and coalesces duplicate submissions.
+
+    Turns of one session_id read and write the same session state, so they
+    are serialized with a per-session asyncio.Lock. A submission identical
+    to one still queued or running (Streamlit reruns, double-clicks) does not
+    start a second turn, on /chat or /chat/stream: it joins the first one,
+    gets the same response and, when streaming, the same events.
+
+    Locks and coalescing are per process. Sessions need no worker affinity
+    (state is read from the shared session store on every turn), but two
+    workers running turns of one session at the same moment both save and
+    the later save wins.
+    """
+
+    def __init__(self):
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._holders: Dict[str, int] = {}
+        self._inflight: Dict[Tuple[str, str, str], Tuple[asyncio.Task, TurnEvents]] = {}
+        self.counters = {"turns": 0, "coalesced": 0, "queued": 0}
+
+    @asynccontextmanager
+    async def lock(self, session_id: str):
+        """Hold the session's turn lock; locks are dropped once no turn holds or waits for them."""
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        self._holders[session_id] = self._holders.get(session_id, 0) + 1
+        if lock.locked():
+            self.counters["queued"] += 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._holders[session_id] -= 1
+            if not self._holders[session_id]:
+                del self._holders[session_id], self._locks[session_id]
+
+    def _join(self, session_id: str, question: str, model: str,
+              turn: Callable[[Emit], Awaitable[T]]) -> Tuple[asyncio.Task, TurnEvents]:
+        """The in-flight turn of an identical submission, else a new turn queued under the session lock."""
+        key = submission_key(session_id, question, model)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.counters["coalesced"] += 1
+            return inflight
+        self.counters["turns"] += 1
+        events = TurnEvents()
+        task = asyncio.get_running_loop().create_task(self._locked(session_id, lambda: turn(events.emit)))
+        self._inflight[key] = task, events
+
+        def finished(t: asyncio.Task) -> None:
+            if self._inflight.get(key, (None,))[0] is t:
+                del self._inflight[key]
+        task.add_done_callback(finished)
+        return task, events
+
+    async def run(self, session_id: str, question: str, model: str, turn: Callable[[Emit], Awaitable[T]]) -> T:
+        """Run turn(emit) under the session lock, or join the identical submission already in flight."""
+        task, _ = self._join(session_id, question, model, turn)
+        # a caller that disconnects must not cancel the turn (or the callers sharing it)
+        return await asyncio.shield(task)
+
+    async def stream(self, session_id: str, question: str, model: str,
+                     turn: Callable[[Emit], Awaitable[T]]) -> AsyncIterator[Tuple[str, Any]]:
+        """Like run(), yielding the turn's emitted events and then ("result", its return value)."""
+        task, events = self._join(session_id, question, model, turn)
+        async for event in events.follow(task):
+            yield event
+        yield "result", await asyncio.shield(task)
+
+    async def _locked(self, session_id: str, turn: Callable[[], Awaitable[T]]) -> T:
+        async with self.lock(session_id):
+            return await turn()
+
+    def stats(self) -> dict:
+        return {**self.counters, "inflight": len(self._inflight), "active_sessions": len(self._locks)}
+
+
+chat_turns = ChatTurns()
@@ -0,0 +1,90 @@
+"""History compaction after the reply, off the request path.
+
+The summary LLM call used to run as the last graph node, so it delayed the
+/chat response and the SSE 'done' event and held the session's turn lock.
+HistoryCompactor runs it as a background task per session once the turn is
+saved: the summary is written without the lock, and applied under it only
+if the summarized messages are still the head of the stored state (a turn
+that compacted or replaced them in the meantime wins). Sessions in the
+middle of a lead interview are left alone until it ends.
+"""
+import asyncio
+import logging
+import time
+from typing import AsyncContextManager, Awaitable, Callable, Dict, List
+from langchain_core.messages import BaseMessage
+from history import compact_history
+from metrics import NODE_ERRORS, NODE_SECONDS, current_node
+from shared import summary_llm
+from config import METRICS_ENABLED
+
+Load = Callable[[str], Awaitable[dict]]
+Save = Callable[[str, dict], Awaitable[None]]
+
+
+def interviewing(state: dict) -> bool:
+    return bool(state.get("awaiting_field") or state.get("awaiting_confirmation"))
+
+
+def same_messages(a: List[BaseMessage], b: List[BaseMessage]) -> bool:
+    return len(a) == len(b) and all(x.type == y.type and x.content == y.content for x, y in zip(a, b))
+
+
+class HistoryCompactor:
+    """One background compaction at a time per session, applied under the session's turn lock."""
+
+    def __init__(self, load: Load, save: Save, lock: Callable[[str], AsyncContextManager]):
+        self.load = load
+        self.save = save
+        self.lock = lock
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.counters = {"scheduled": 0, "compacted": 0, "stale": 0, "skipped_interview": 0, "failures": 0}
+
+    def schedule(self, session_id: str, state: dict) -> None:
+        """Compact the session in the background if its saved state has turns to fold."""
+        if interviewing(state):
+            self.counters["skipped_interview"] += 1
+            return
+        if session_id in self._tasks:
+            return  # turns keep piling up; the next turn after it finishes schedules another
+        self.counters["scheduled"] += 1
+        task = asyncio.get_running_loop().create_task(self._compact(session_id, state))
+        self._tasks[session_id] = task
+        task.add_done_callback(lambda t: self._tasks.pop(session_id, None))
+
+    async def _compact(self, session_id: str, state: dict) -> None:
+        current_node.set("compact")  # the task's own context: summary LLM calls are labelled 'compact'
+        started = time.perf_counter()
+        try:
+            compacted = await compact_history(state, summary_llm())
+            if compacted is None:
+                return
+            folded = state["messages"][:len(state["messages"]) - len(compacted["messages"])]
+            async with self.lock(session_id):
+                latest = await self.load(session_id)
+                messages = latest.get("messages") or []
+                if (interviewing(latest) or latest.get("history_summary") != state.get("history_summary")
+                        or not same_messages(messages[:len(folded)], folded)):
+                    self.counters["stale"] += 1
+                    return
+                await self.save(session_id, {**latest, "messages": messages[len(folded):],
+                                             "history_summary": compacted["history_summary"]})
+            self.counters["compacted"] += 1
+            if METRICS_ENABLED:
+                NODE_SECONDS.labels("compact", "none").observe(time.perf_counter() - started)
+        except Exception:
+            # the reply is already delivered; the full history is kept and a later turn retries
+            self.counters["failures"] += 1
+            if METRICS_ENABLED:
+                NODE_ERRORS.labels("compact").inc()
+            logging.exception(f"History compaction of session {session_id} failed")
+
+    async def aclose(self) -> None:
+        """Cancel compactions still running (shutdown); their sessions keep the full history."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {**self.counters, "running": len(self._tasks)}
@@ -1,4 +1,5 @@
 from dotenv import load_dotenv
+import json
 import os
 
 load_dotenv()
@@ -13,6 +14,134 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
 
+# persistent chunk embedding cache used during indexing
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_DB_PATH = os.getenv("EMBEDDING_CACHE_DB_PATH", "embedding_cache.db")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
 # document source directory
 DOC_SOURCE_DIR = os.getenv("DOC_SOURCE_DIR", "./documents")
+INDEX_MANIFEST_PATH = os.getenv("INDEX_MANIFEST_PATH", "index_manifest.json")
+INDEX_WORKERS = int(os.getenv("INDEX_WORKERS", "4"))
+# sync DOC_SOURCE_DIR into the index in the background when the API starts (one worker syncs, the others skip)
+INDEX_ON_STARTUP = os.getenv("INDEX_ON_STARTUP", "false").lower() == "true"
+
+# startup: models, Chroma, caches and clients are built on first use; warm-up builds them (and opens
+# Chroma's collection and the database) when the API starts. background | blocking | off
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "background")
+# warm-up also opens the OpenAI HTTP pool and the MCP session (network calls at boot)
+PREWARM_CONNECTIONS = os.getenv("PREWARM_CONNECTIONS", "false").lower() == "true"
+
+# product catalog (one brochure per product in DOC_SOURCE_DIR)
+PRODUCT_NAMES = [p.strip() for p in os.getenv(
+    "PRODUCT_NAMES",
+    "คุ้มชีวา,คุ้มตลอดชีพ พลัส,คุ้มรักษาเหมาจ่าย เอ็กซ์ตร้า,คุ้มออมสุข,ตลอดชีพ 90/20",
+).split(",") if p.strip()]
+
+# speculative web search: start Tavily alongside retrieval + judge
+SPECULATIVE_WEB_SEARCH = os.getenv("SPECULATIVE_WEB_SEARCH", "false").lower() == "true"
+# cost guard: by default only speculate when the query names no known product
+SPECULATE_ON_PRODUCT_MATCH = os.getenv("SPECULATE_ON_PRODUCT_MATCH", "false").lower() == "true"
+
+# local pre-router in front of router_llm
+PREROUTER_ENABLED = os.getenv("PREROUTER_ENABLED", "true").lower() == "true"
+PREROUTER_MIN_CONFIDENCE = float(os.getenv("PREROUTER_MIN_CONFIDENCE", "0.9"))
+# routes the statistical model may decide on its own, on a session's first turn only (keyword rules always
+# apply; 'end' and 'interview' are rule-only). Empty by default: no threshold separates off-domain questions
+# from KB questions (bench/prerouter.py), so calibrate PREROUTER_MIN_CONFIDENCE there before enabling 'rag'
+PREROUTER_MODEL_ROUTES = tuple(r.strip() for r in os.getenv("PREROUTER_MODEL_ROUTES", "").split(",") if r.strip())
+
+# retrieval: dense top-k fused with a BM25 lexical index via reciprocal rank fusion
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "3"))
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+HYBRID_FETCH_K = int(os.getenv("HYBRID_FETCH_K", "10"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+LEXICAL_SYNC_INTERVAL_SECONDS = float(os.getenv("LEXICAL_SYNC_INTERVAL_SECONDS", "30"))
+
+# retrieval sufficiency gate: auto-accept / auto-reject on the best dense relevance score of the returned chunks,
+# judge_llm only in between (calibrate with calibrate_rag_gate.py); with hybrid retrieval a low
+# score still goes to judge_llm when BM25 found the brochure of the product the question names
+RAG_ACCEPT_THRESHOLD = float(os.getenv("RAG_ACCEPT_THRESHOLD", "0.45"))
+RAG_REJECT_THRESHOLD = float(os.getenv("RAG_REJECT_THRESHOLD", "0.15"))
+
+# background document ingestion
+INGEST_MAX_WORKERS = int(os.getenv("INGEST_MAX_WORKERS", "2"))
+INGEST_MAX_JOBS_KEPT = int(os.getenv("INGEST_MAX_JOBS_KEPT", "500"))
+
+# semantic answer cache (RAG → answer path)
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_BACKEND = os.getenv("ANSWER_CACHE_BACKEND", "memory")  # memory | sqlite
+ANSWER_CACHE_DB_PATH = os.getenv("ANSWER_CACHE_DB_PATH", "answer_cache.db")
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 3600)))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+
+# Tavily web search cache: normalized query → result on disk, concurrent identical searches share one call
+WEB_SEARCH_CACHE_ENABLED = os.getenv("WEB_SEARCH_CACHE_ENABLED", "true").lower() == "true"
+WEB_SEARCH_CACHE_DB_PATH = os.getenv("WEB_SEARCH_CACHE_DB_PATH", "web_search_cache.db")
+WEB_SEARCH_CACHE_TTL_SECONDS = int(os.getenv("WEB_SEARCH_CACHE_TTL_SECONDS", "3600"))
+WEB_SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("WEB_SEARCH_CACHE_MAX_ENTRIES", "5000"))
+# serve an expired result while one background search refreshes it, up to this much past the TTL
+WEB_SEARCH_STALE_WHILE_REVALIDATE = os.getenv("WEB_SEARCH_STALE_WHILE_REVALIDATE", "true").lower() == "true"
+WEB_SEARCH_STALE_TTL_SECONDS = int(os.getenv("WEB_SEARCH_STALE_TTL_SECONDS", str(24 * 3600)))
+
+# chat history / document store database
+CHAT_DB_PATH = os.getenv("CHAT_DB_PATH", "rag_app.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+
+# session state store
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "tiered")  # memory | sqlite | tiered
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "1000"))
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+# how often the lifespan deletes sessions idle past the TTL (0 disables)
+SESSION_PURGE_INTERVAL_SECONDS = int(os.getenv("SESSION_PURGE_INTERVAL_SECONDS", "3600"))
+
+# conversation history: per-node prompt budgets (tokens) and the rolling summary of older turns
+HISTORY_COMPACTION_ENABLED = os.getenv("HISTORY_COMPACTION_ENABLED", "true").lower() == "true"
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "4"))
+HISTORY_SUMMARIZE_BATCH = int(os.getenv("HISTORY_SUMMARIZE_BATCH", "4"))
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "300"))
+ROUTER_HISTORY_BUDGET = int(os.getenv("ROUTER_HISTORY_BUDGET", "1200"))
+ANSWER_HISTORY_BUDGET = int(os.getenv("ANSWER_HISTORY_BUDGET", "2500"))
+
+# follow-up questions ("แล้วเบี้ยเท่าไหร่?") are rewritten into standalone ones for retrieval, web search and
+# the answer cache, concurrently with the router (see contextualize.py)
+CONTEXTUALIZE_ENABLED = os.getenv("CONTEXTUALIZE_ENABLED", "true").lower() == "true"
+CONTEXTUALIZE_HISTORY_BUDGET = int(os.getenv("CONTEXTUALIZE_HISTORY_BUDGET", "800"))
+# questions shorter than this (letters, no spaces) that name no product follow up on the conversation
+CONTEXTUALIZE_SHORT_QUESTION_CHARS = int(os.getenv("CONTEXTUALIZE_SHORT_QUESTION_CHARS", "25"))
+CONTEXTUALIZE_CACHE_SIZE = int(os.getenv("CONTEXTUALIZE_CACHE_SIZE", "1024"))
+
+# MCP server (product-interest logging): one long-lived client session, durable outbox when the server is down
+MCP_URL = os.getenv("MCP_URL", "http://localhost:8081/mcp")
+MCP_CALL_TIMEOUT_SECONDS = float(os.getenv("MCP_CALL_TIMEOUT_SECONDS", "10"))
+MCP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("MCP_CONNECT_TIMEOUT_SECONDS", "5"))
+MCP_MAX_RETRIES = int(os.getenv("MCP_MAX_RETRIES", "3"))
+MCP_BACKOFF_BASE_SECONDS = float(os.getenv("MCP_BACKOFF_BASE_SECONDS", "0.2"))
+MCP_BACKOFF_MAX_SECONDS = float(os.getenv("MCP_BACKOFF_MAX_SECONDS", "30"))
+MCP_OUTBOX_DB_PATH = os.getenv("MCP_OUTBOX_DB_PATH", "mcp_outbox.db")
+MCP_OUTBOX_FLUSH_INTERVAL_SECONDS = float(os.getenv("MCP_OUTBOX_FLUSH_INTERVAL_SECONDS", "30"))
+# tools whose calls are queued in the outbox instead of failing while the server is down; they must
+# accept a request_id idempotency key, since a timed-out call is retried and may already be stored
+MCP_DURABLE_TOOLS = tuple(t.strip() for t in os.getenv("MCP_DURABLE_TOOLS", "log_product_interest").split(",") if t.strip())
+
+# lead interview: template questions; an answer the rules cannot read may use one LLM call per lead
+# multi-slot: read every field a message states ("ชื่อสมชาย อายุ 35 ...") instead of only the one asked
+INTERVIEW_MULTI_SLOT = os.getenv("INTERVIEW_MULTI_SLOT", "true").lower() == "true"
+INTERVIEW_LLM_FALLBACK = os.getenv("INTERVIEW_LLM_FALLBACK", "true").lower() == "true"
+INTERVIEW_MAX_LLM_CALLS = int(os.getenv("INTERVIEW_MAX_LLM_CALLS", "1"))
+
+# observability: Prometheus /metrics, per-request trace ids
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# request header carrying a caller's trace id, echoed on the response ("" disables trace ids)
+TRACE_ID_HEADER = os.getenv("TRACE_ID_HEADER", "X-Trace-Id")
+# USD per 1M tokens (prompt, completion) for rag_llm_cost_usd_total; JSON override {"model": [in, out]}
+LLM_PRICES_USD_PER_1M_TOKENS = {model: tuple(prices) for model, prices in json.loads(os.getenv(
+    "LLM_PRICES_USD_PER_1M_TOKENS",
+    '{"gpt-4.1": [2.0, 8.0], "gpt-4.1-mini": [0.4, 1.6], "gpt-4o": [2.5, 10.0], "gpt-4o-mini": [0.15, 0.6]}',
+)).items()}
 
+# record/replay: append the LLM, embedding, Tavily and MCP calls of each chat turn to
+# <CASSETTE_DIR>/<session_id>.jsonl for bench/replay.py ("" disables recording)
+CASSETTE_DIR = os.getenv("CASSETTE_DIR", "")
@@ -0,0 +1,137 @@
+"""Standalone rewrites of follow-up questions for retrieval, web search and the answer cache.
+
+"แล้วเบี้ยเท่าไหร่?" means nothing to the KB without the product discussed
+in the previous turn. needs_context() decides locally whether a question
+needs the history at all; only those questions go to contextualise_chain.
+router_node starts the rewrite as a task that runs alongside its own
+routing call, and rag/web nodes await it when they need the query, so the
+rewrite overlaps the router instead of adding a round trip. Rewrites are
+memoized per (session, turn): every node of the turn, and a retry of it,
+reuses the same one.
+"""
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from langchain_core.messages import BaseMessage, HumanMessage
+from history import history_for_prompt
+from langchain_utils import contextualise_chain
+from metrics import current_node
+from utils import match_product_name
+from config import (CONTEXTUALIZE_ENABLED, CONTEXTUALIZE_HISTORY_BUDGET, CONTEXTUALIZE_SHORT_QUESTION_CHARS,
+                    CONTEXTUALIZE_CACHE_SIZE)
+
+# pronouns, demonstratives and "what about / and then" openers that point back into the conversation
+FOLLOW_UP = re.compile(
+    r"^\s*(แล้ว|และ|ส่วน|ถ้างั้น|งั้น)|(ล่ะ|ละ)\s*[?？]?\s*$|นั้น|นี้|ดังกล่าว|ตัวเดิม|อันเดิม|เขา|มัน"
+    r"|\b(it|its|this|that|these|those|they|them|their|the same|above|previous|what about|how about)\b"
+    r"|^\s*(and|also|so|then)\b",
+    re.IGNORECASE)
+LETTERS = re.compile(r"[^\W\d_]", re.UNICODE)
+
+
+def last_human_index(messages: List[BaseMessage]) -> Optional[int]:
+    return next((i for i in range(len(messages) - 1, -1, -1) if isinstance(messages[i], HumanMessage)), None)
+
+
+def needs_context(question: str, state: dict) -> bool:
+    """Whether the question leans on earlier turns (local heuristic, no LLM call).
+
+    Never on the first turn. Otherwise yes when it refers back (pronouns,
+    demonstratives, "แล้ว…ล่ะ"), no when it names a catalog product, and yes
+    when it is too short to carry its own subject.
+    """
+    messages = state.get("messages") or []
+    index = last_human_index(messages)
+    if not (index or state.get("history_summary")):
+        return False
+    if FOLLOW_UP.search(question):
+        return True
+    if match_product_name(question):
+        return False
+    return len(LETTERS.findall(question)) < CONTEXTUALIZE_SHORT_QUESTION_CHARS
+
+
+class Contextualizer:
+    """Memoized, concurrently started rewrites of the current turn's question."""
+
+    def __init__(self, max_entries: int = CONTEXTUALIZE_CACHE_SIZE,
+                 history_budget: int = CONTEXTUALIZE_HISTORY_BUDGET):
+        self.max_entries = max_entries
+        self.history_budget = history_budget
+        self._turns: OrderedDict[Tuple[str, str], asyncio.Task] = OrderedDict()
+        self.counters = {"skipped": 0, "rewrites": 0, "reused": 0, "discarded": 0, "failures": 0,
+                         "rewrite_ms_total": 0.0}
+
+    @staticmethod
+    def turn_key(state: dict) -> Tuple[str, str]:
+        """(session_id, digest of the question and the message before it): one key per turn of a session."""
+        messages = state.get("messages") or []
+        index = last_human_index(messages)
+        question = messages[index].content if index is not None else ""
+        previous = messages[index - 1].content if index else ""
+        digest = hashlib.sha256(f"{previous}\x1e{question}".encode("utf-8")).hexdigest()[:16]
+        return state.get("session_id") or "", digest
+
+    def start(self, state: dict) -> Optional[asyncio.Task]:
+        """Start the rewrite of the turn's question if it needs one (idempotent per turn)."""
+        key = self.turn_key(state)
+        task = self._turns.get(key)
+        if task is not None:
+            self._turns.move_to_end(key)
+            self.counters["reused"] += 1
+            return task
+        messages = state.get("messages") or []
+        index = last_human_index(messages)
+        if index is None or not needs_context(messages[index].content, state):
+            self.counters["skipped"] += 1
+            return None
+
+        history = history_for_prompt({**state, "messages": messages[:index]}, self.history_budget)
+        task = asyncio.get_running_loop().create_task(self._rewrite(messages[index].content, history))
+        self._turns[key] = task
+        while len(self._turns) > self.max_entries:
+            self._turns.popitem(last=False)
+        return task
+
+    async def _rewrite(self, question: str, history: List[BaseMessage]) -> str:
+        current_node.set("contextualize")  # the task's own context: metrics and cassettes label the call
+        started = time.perf_counter()
+        try:
+            rewritten = await contextualise_chain().ainvoke({"chat_history": history, "input": question})
+        except Exception as e:
+            self.counters["failures"] += 1
+            logging.warning(f"⚠️ Contextualizing '{question}' failed, searching with it as is: {e!r}")
+            return question
+        self.counters["rewrites"] += 1
+        self.counters["rewrite_ms_total"] += (time.perf_counter() - started) * 1000
+        rewritten = rewritten.strip() or question
+        logging.info(f"🪄 Contextualized '{question}' → '{rewritten}'")
+        return rewritten
+
+    async def standalone_question(self, state: dict) -> str:
+        """The turn's question, rewritten when it needs the history; awaits a rewrite already under way."""
+        messages = state.get("messages") or []
+        index = last_human_index(messages)
+        question = messages[index].content if index is not None else ""
+        task = self.start(state)
+        # shielded: one node giving up must not cancel the rewrite the others share
+        return await asyncio.shield(task) if task is not None else question
+
+    def discard(self, state: dict) -> None:
+        """Drop the turn's rewrite when its route does not search (end, answer, interview)."""
+        task = self._turns.pop(self.turn_key(state), None)
+        if task is not None and not task.done():
+            task.cancel()
+            self.counters["discarded"] += 1
+
+    def stats(self) -> dict:
+        rewrites = self.counters["rewrites"]
+        return {**self.counters, "entries": len(self._turns),
+                "avg_rewrite_ms": self.counters["rewrite_ms_total"] / rewrites if rewrites else 0.0}
+
+
+contextualizer = Contextualizer() if CONTEXTUALIZE_ENABLED else None
@@ -1,15 +1,84 @@
+import asyncio
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime
+from typing import Callable, Optional
+from config import CHAT_DB_PATH, DB_POOL_SIZE
+from resources import registry
 
-DB_NAME = "rag_app.db"
+DB_NAME = CHAT_DB_PATH
+
+# WAL lets readers run alongside the single writer; NORMAL sync is durable across app crashes in WAL mode
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA cache_size=-20000',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA mmap_size=268435456',
+)
 
 def get_db_connection():
-    conn = sqlite3.connect(DB_NAME)
+    conn = sqlite3.connect(DB_NAME, check_same_thread=False, timeout=30)
     conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     return conn
 
-def create_chat_history():
-    conn = get_db_connection()
+class ConnectionPool:
+    """Fixed-size pool of configured SQLite connections shared across threads.
+
+    setup(conn) runs once, on the first connection the pool opens (schema
+    creation), so importing this module does not touch the database.
+    connect opens a connection (default: the chat database).
+    """
+
+    def __init__(self, size: int = DB_POOL_SIZE, setup: Optional[Callable[[sqlite3.Connection], None]] = None,
+                 connect: Callable[[], sqlite3.Connection] = get_db_connection):
+        self.size = size
+        self.setup = setup
+        self.connect = connect
+        self._ready = setup is None
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                conn = self.connect()
+                if not self._ready:
+                    self.setup(conn)
+                    self._ready = True
+                self._created += 1
+                return conn
+        return self._idle.get()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        self._created = 0
+
+def create_chat_history(conn):
     conn.execute('''CREATE TABLE IF NOT EXISTS chat_history
                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
                      session_id TEXT,
@@ -17,60 +86,141 @@ def create_chat_history():
                      gpt_response TEXT,
                      model TEXT,
                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    conn.close()
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_chat_history_session_created ON chat_history (session_id, created_at)')
+    conn.commit()
 
-def insert_chat_history(session_id, user_query, gpt_response, model):
-    conn = get_db_connection()
-    conn.execute('INSERT INTO chat_history (session_id, user_query, gpt_response, model) VALUES (?, ?, ?, ?)',
-                 (session_id, user_query, gpt_response, model))
+def create_chat_sessions(conn):
+    """Per-session summary so the session list does not scan chat_history."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS chat_sessions
+                    (session_id TEXT PRIMARY KEY,
+                     last_message_id INTEGER,
+                     message_count INTEGER NOT NULL DEFAULT 0,
+                     updated_at TIMESTAMP)''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_chat_sessions_last_message ON chat_sessions (last_message_id)')
+    # Backfill databases created before the summary table existed
+    if conn.execute('SELECT 1 FROM chat_sessions LIMIT 1').fetchone() is None:
+        conn.execute('''INSERT INTO chat_sessions (session_id, last_message_id, message_count, updated_at)
+                        SELECT session_id, MAX(id), COUNT(*), MAX(created_at)
+                        FROM chat_history GROUP BY session_id''')
     conn.commit()
-    conn.close()
+
+def insert_chat_history(session_id, user_query, gpt_response, model):
+    with pool.connection() as conn:
+        cursor = conn.execute('INSERT INTO chat_history (session_id, user_query, gpt_response, model) VALUES (?, ?, ?, ?)',
+                              (session_id, user_query, gpt_response, model))
+        conn.execute('''INSERT INTO chat_sessions (session_id, last_message_id, message_count, updated_at)
+                        VALUES (?, ?, 1, CURRENT_TIMESTAMP)
+                        ON CONFLICT(session_id) DO UPDATE SET
+                            last_message_id = excluded.last_message_id,
+                            message_count = chat_sessions.message_count + 1,
+                            updated_at = excluded.updated_at''',
+                     (session_id, cursor.lastrowid))
+        conn.commit()
 
 def get_chat_history(session_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT user_query, gpt_response FROM chat_history WHERE session_id = ? ORDER BY created_at', (session_id,))
-    messages = []
-    for row in cursor.fetchall():
-        messages.extend([
-            {"role": "human", "content": row['user_query']},
-            {"role": "ai", "content": row['gpt_response']}
-        ])
-    conn.close()
+    with pool.connection() as conn:
+        cursor = conn.execute('SELECT user_query, gpt_response FROM chat_history WHERE session_id = ? ORDER BY created_at, id',
+                              (session_id,))
+        messages = []
+        for row in cursor.fetchall():
+            messages.extend([
+                {"role": "human", "content": row['user_query']},
+                {"role": "ai", "content": row['gpt_response']}
+            ])
     return messages
 
-def create_document_store():
-    conn = get_db_connection()
+def get_all_sessions(limit=None):
+    """Session ids, most recently active first."""
+    with pool.connection() as conn:
+        cursor = conn.execute('SELECT session_id FROM chat_sessions ORDER BY last_message_id DESC LIMIT ?',
+                              (limit if limit is not None else -1,))
+        return [row['session_id'] for row in cursor.fetchall()]
+
+def create_document_store(conn):
     conn.execute('''CREATE TABLE IF NOT EXISTS document_store
                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
                      filename TEXT,
-                     upload_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    conn.close()
-
-def insert_document_record(filename):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO document_store (filename) VALUES (?)', (filename,))
-    file_id = cursor.lastrowid
+                     upload_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                     status TEXT NOT NULL DEFAULT 'ready')''')
+    # Older databases predate the status column
+    columns = [row['name'] for row in conn.execute('PRAGMA table_info(document_store)')]
+    if 'status' not in columns:
+        conn.execute("ALTER TABLE document_store ADD COLUMN status TEXT NOT NULL DEFAULT 'ready'")
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_document_store_status ON document_store (status)')
     conn.commit()
-    conn.close()
-    return file_id
+
+def insert_document_record(filename, status='ready'):
+    """Insert a document row; 'pending' rows stay hidden until mark_document_ready."""
+    with pool.connection() as conn:
+        cursor = conn.execute('INSERT INTO document_store (filename, status) VALUES (?, ?)', (filename, status))
+        conn.commit()
+        return cursor.lastrowid
+
+def mark_document_ready(file_id):
+    with pool.connection() as conn:
+        conn.execute("UPDATE document_store SET status = 'ready', upload_timestamp = CURRENT_TIMESTAMP WHERE id = ?",
+                     (file_id,))
+        conn.commit()
+
+def swap_document_records(new_file_id, old_file_id):
+    """Publish a staged replacement and retire the version it replaces in one transaction.
+
+    Raises ValueError when old_file_id is no longer live (deleted or already replaced).
+    """
+    with pool.connection() as conn:
+        retired = conn.execute("UPDATE document_store SET status = 'retired' WHERE id = ? AND status = 'ready'",
+                               (old_file_id,)).rowcount
+        if not retired:
+            conn.rollback()
+            raise ValueError(f"Document {old_file_id} is not live and cannot be replaced")
+        conn.execute("UPDATE document_store SET status = 'ready', upload_timestamp = CURRENT_TIMESTAMP WHERE id = ?",
+                     (new_file_id,))
+        conn.commit()
 
 def delete_document_record(file_id):
-    conn = get_db_connection()
-    conn.execute('DELETE FROM document_store WHERE id = ?', (file_id,))
-    conn.commit()
-    conn.close()
+    return delete_document_records([file_id])
+
+def delete_document_records(file_ids):
+    with pool.connection() as conn:
+        conn.executemany('DELETE FROM document_store WHERE id = ?', [(file_id,) for file_id in file_ids])
+        conn.commit()
     return True
 
+def get_hidden_document_ids():
+    """file_ids whose chunks must not be retrieved: staged ('pending') and replaced ('retired') versions."""
+    with pool.connection() as conn:
+        cursor = conn.execute("SELECT id FROM document_store WHERE status != 'ready'")
+        return [row['id'] for row in cursor.fetchall()]
+
+def document_exists(file_id):
+    with pool.connection() as conn:
+        return conn.execute("SELECT 1 FROM document_store WHERE id = ? AND status = 'ready'", (file_id,)).fetchone() is not None
+
 def get_all_documents():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, filename, upload_timestamp FROM document_store ORDER BY upload_timestamp DESC')
-    documents = cursor.fetchall()
-    conn.close()
-    return [dict(doc) for doc in documents]
-
-# Initialize the database tables
-create_chat_history()
-create_document_store()
\ No newline at end of file
+    with pool.connection() as conn:
+        cursor = conn.execute("SELECT id, filename, upload_timestamp FROM document_store WHERE status = 'ready' ORDER BY upload_timestamp DESC")
+        return [dict(doc) for doc in cursor.fetchall()]
+
+# Async wrappers: run the blocking SQLite calls in a worker thread, off the event loop
+async def ainsert_chat_history(session_id, user_query, gpt_response, model):
+    await asyncio.to_thread(insert_chat_history, session_id, user_query, gpt_response, model)
+
+async def aget_chat_history(session_id):
+    return await asyncio.to_thread(get_chat_history, session_id)
+
+async def aget_all_sessions(limit=None):
+    return await asyncio.to_thread(get_all_sessions, limit)
+
+
+def create_tables(conn):
+    create_chat_history(conn)
+    create_chat_sessions(conn)
+    create_document_store(conn)
+
+def open_connection(db_pool):
+    with db_pool.connection():
+        pass
+
+pool = ConnectionPool(setup=create_tables)
+# prewarm opens the first connection (and creates the tables) before the first request needs it
+registry.register("database", lambda: pool, prewarm=open_connection)
@@ -1,19 +1,48 @@
-from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, UnstructuredHTMLLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
-from typing import List
+from typing import Callable, List, Optional
 from langchain_core.documents import Document
 import os
+import uuid
+import logging
 from dotenv import load_dotenv
+from embedding_cache import CachedEmbeddings
+from lexical_index import ChromaLexicalIndex
+from cassette import RecordingEmbeddings
+from resources import resource
+from config import EMBEDDING_MODEL, EMBEDDING_CACHE_ENABLED, CASSETTE_DIR
 
 load_dotenv(override=True)
 
 text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, length_function=len)
-embedding_function = OpenAIEmbeddings(model="text-embedding-3-large")
-vectorstore = Chroma(persist_directory="./chroma_db", embedding_function=embedding_function)
+INDEX_BATCH_SIZE = 64
+
+@resource("embedding_function")
+def embedding_function():
+    from langchain_openai import OpenAIEmbeddings
+
+    embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
+    if CASSETTE_DIR:
+        embeddings = RecordingEmbeddings(embeddings)
+    if EMBEDDING_CACHE_ENABLED:
+        # unchanged chunks of re-uploaded brochures are served from the local cache
+        embeddings = CachedEmbeddings(embeddings, model_name=EMBEDDING_MODEL)
+    return embeddings
+
+# prewarm: the first read opens Chroma's SQLite and segment files, so the first query does not have to
+@resource("vectorstore", prewarm=lambda store: store.get(limit=1, include=[]))
+def vectorstore():
+    from langchain_chroma import Chroma
+
+    return Chroma(persist_directory="./chroma_db", embedding_function=embedding_function())
+
+# BM25 over the same chunks, kept in sync by index_document/delete_docs_from_chroma
+@resource("lexical_index", prewarm=lambda index: index.ensure_synced())
+def lexical_index():
+    return ChromaLexicalIndex(vectorstore())
+
+def load_document(file_path: str) -> List[Document]:
+    from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, UnstructuredHTMLLoader
 
-def load_and_split_document(file_path: str) -> List[Document]:
     if file_path.endswith('.pdf'):
         loader = PyPDFLoader(file_path)
     elif file_path.endswith('.docx'):
@@ -22,37 +51,83 @@ def load_and_split_document(file_path: str) -> List[Document]:
         loader = UnstructuredHTMLLoader(file_path)
     else:
         raise ValueError(f"Unsupported file type: {file_path}")
-    
-    documents = loader.load()
-    return text_splitter.split_documents(documents)
 
-def index_document_to_chroma(file_path: str, file_id: int) -> bool:
+    return loader.load()
+
+def load_and_split_document(file_path: str) -> List[Document]:
+    return text_splitter.split_documents(load_document(file_path))
+
+def index_document(file_path: str, file_id: int,
+                   progress: Optional[Callable[[str, int], None]] = None) -> int:
+    """Parse, embed and write a document's chunks; returns the chunk count.
+
+    progress(counter, value) is called with "pages_parsed", "chunks_total" and
+    "chunks_written" as indexing advances; a batch is embedded and written by
+    one add_texts call, so there is no separate embedded count. Raises on failure.
+    """
+    report = progress or (lambda counter, value: None)
+
+    pages = load_document(file_path)
+    report("pages_parsed", len(pages))
+    splits = text_splitter.split_documents(pages)
+    report("chunks_total", len(splits))
+
+    # Add metadata to each split
+    for split in splits:
+        split.metadata['file_id'] = file_id
+
+    store = vectorstore()
+    embeddings_model = store.embeddings
+    stats = {"hits": 0, "misses": 0}
+    written = 0
+    for start in range(0, len(splits), INDEX_BATCH_SIZE):
+        batch = splits[start:start + INDEX_BATCH_SIZE]
+        texts = [d.page_content for d in batch]
+        ids = [str(uuid.uuid4()) for _ in batch]
+        metadatas = [d.metadata for d in batch]
+
+        # add_texts embeds the batch with the store's embedding function, then writes it
+        if isinstance(embeddings_model, CachedEmbeddings):
+            with embeddings_model.track() as batch_stats:
+                store.add_texts(texts, metadatas=metadatas, ids=ids)
+            stats = {k: stats[k] + batch_stats[k] for k in stats}
+        else:
+            store.add_texts(texts, metadatas=metadatas, ids=ids)
+        lexical_index().add(ids, texts, metadatas)
+        written += len(batch)
+        report("chunks_written", written)
+
+    if isinstance(embeddings_model, CachedEmbeddings):
+        logging.info(f"🧮 Embedding cache for file_id {file_id}: "
+                     f"{stats['hits']} cached, {stats['misses']} embedded")
+    return written
+
+def index_document_to_chroma(file_path: str, file_id: int,
+                             progress: Optional[Callable[[str, int], None]] = None) -> bool:
     try:
-        splits = load_and_split_document(file_path)
-        
-        # Add metadata to each split
-        for split in splits:
-            split.metadata['file_id'] = file_id
-        
-        vectorstore.add_documents(splits)
+        index_document(file_path, file_id, progress)
         # vectorstore.persist()
         return True
     except Exception as e:
         print(f"Error indexing document: {e}")
         return False
 
-def delete_doc_from_chroma(file_id: int):
+def delete_docs_from_chroma(file_ids: List[int]) -> bool:
+    """Delete every chunk of the given documents with a metadata filter.
+
+    Chroma resolves the filter itself, so no chunk ids or payloads are fetched.
+    """
+    if not file_ids:
+        return True
     try:
-        docs = vectorstore.get(where={"file_id": file_id})
-        print(f"Found {len(docs['ids'])} document chunks for file_id {file_id}")
-        
-        if docs['ids']:
-            # Delete the documents with the specified file_id
-            vectorstore.delete(ids=docs['ids'])
-            print(f"Deleted {len(docs['ids'])} document chunks with file_id {file_id}")
-        else:
-            print(f"No document chunks found with file_id {file_id}")
+        where = {"file_id": file_ids[0]} if len(file_ids) == 1 else {"file_id": {"$in": list(file_ids)}}
+        vectorstore().delete(where=where)
+        removed = lexical_index().remove_files(file_ids)
+        logging.info(f"🗑️ Deleted chunks of file_ids {list(file_ids)} from Chroma ({removed} in the lexical index)")
         return True
     except Exception as e:
-        print(f"Error deleting document with file_id {file_id} from Chroma: {str(e)}")
-        return False
\ No newline at end of file
+        print(f"Error deleting documents with file_ids {list(file_ids)} from Chroma: {str(e)}")
+        return False
+
+def delete_doc_from_chroma(file_id: int) -> bool:
+    return delete_docs_from_chroma([file_id])
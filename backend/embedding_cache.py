@@ -0,0 +1,159 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+from config import EMBEDDING_CACHE_DB_PATH, EMBEDDING_CACHE_MAX_ENTRIES
+
+# Per-ingestion counters, set by CachedEmbeddings.track()
+_ingestion_stats: ContextVar[Optional[Dict[str, int]]] = ContextVar("ingestion_stats", default=None)
+
+
+def normalize_chunk_text(text: str) -> str:
+    """NFC-normalize and collapse whitespace so re-extracted PDFs hash identically."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+class CachedEmbeddings(Embeddings):
+    """Persistent chunk-level cache around an Embeddings model.
+
+    Document embeddings are keyed by (model name, hash of the normalized chunk
+    text) in SQLite, so re-uploading an unchanged or partly changed brochure only
+    embeds the chunks that actually changed. Query embeddings are not persisted;
+    the last few are kept in memory, so a question embedded for the answer cache
+    lookup is not embedded again by the vector store search.
+    """
+
+    def __init__(self, underlying: Embeddings, model_name: str,
+                 db_path: str = EMBEDDING_CACHE_DB_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS embedding_cache
+                             (key TEXT PRIMARY KEY,
+                              model TEXT,
+                              vector BLOB,
+                              last_used REAL)''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used ON embedding_cache (last_used)')
+        self.conn.commit()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+        self._recent_queries: OrderedDict[str, List[float]] = OrderedDict()
+
+    def cache_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\x00{normalize_chunk_text(text)}".encode("utf-8")).hexdigest()
+
+    @contextmanager
+    def track(self):
+        """Collect hit/miss counts for the embeddings made inside the block."""
+        stats = {"hits": 0, "misses": 0}
+        token = _ingestion_stats.set(stats)
+        try:
+            yield stats
+        finally:
+            _ingestion_stats.reset(token)
+
+    def _record(self, hits: int, misses: int) -> None:
+        self.counters["hits"] += hits
+        self.counters["misses"] += misses
+        stats = _ingestion_stats.get()
+        if stats is not None:
+            stats["hits"] += hits
+            stats["misses"] += misses
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            for i in range(0, len(unique), 500):
+                batch = unique[i:i + 500]
+                rows = self.conn.execute(
+                    f'SELECT key, vector FROM embedding_cache WHERE key IN ({",".join("?" * len(batch))})', batch
+                ).fetchall()
+                found.update((key, array("f", blob).tolist()) for key, blob in rows)
+            if found:
+                now = time.time()
+                self.conn.executemany('UPDATE embedding_cache SET last_used = ? WHERE key = ?',
+                                      [(now, key) for key in found])
+                self.conn.commit()
+        return found
+
+    def _store(self, items: Dict[str, List[float]]) -> None:
+        now = time.time()
+        with self._lock:
+            self.conn.executemany('INSERT OR REPLACE INTO embedding_cache VALUES (?, ?, ?, ?)',
+                                  [(key, self.model_name, array("f", vector).tobytes(), now)
+                                   for key, vector in items.items()])
+            overflow = self.conn.execute('SELECT COUNT(*) FROM embedding_cache').fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self.conn.execute('''DELETE FROM embedding_cache WHERE key IN
+                                     (SELECT key FROM embedding_cache ORDER BY last_used LIMIT ?)''', (overflow,))
+                self.counters["evictions"] += overflow
+            self.conn.commit()
+
+    def _split(self, texts: List[str]):
+        keys = [self.cache_key(t) for t in texts]
+        cached = self._lookup(keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+        return keys, cached, missing
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, cached, missing = self._split(texts)
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing, vectors))
+            self._store(fresh)
+            cached.update(fresh)
+        self._record(len(texts) - len(missing), len(missing))
+        return [cached[key] for key in keys]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, cached, missing = self._split(texts)
+        if missing:
+            vectors = await self.underlying.aembed_documents(list(missing.values()))
+            fresh = dict(zip(missing, vectors))
+            self._store(fresh)
+            cached.update(fresh)
+        self._record(len(texts) - len(missing), len(missing))
+        return [cached[key] for key in keys]
+
+    def _remember_query(self, text: str, vector: List[float]) -> List[float]:
+        with self._lock:
+            self._recent_queries[text] = vector
+            while len(self._recent_queries) > 256:
+                self._recent_queries.popitem(last=False)
+        return vector
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self._recent_queries.get(text)
+        return vector if vector is not None else self._remember_query(text, self.underlying.embed_query(text))
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vector = self._recent_queries.get(text)
+        if vector is not None:
+            return vector
+        return self._remember_query(text, await self.underlying.aembed_query(text))
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self.conn.execute('SELECT COUNT(*) FROM embedding_cache').fetchone()[0]
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {**self.counters, "entries": entries,
+                "hit_rate": self.counters["hits"] / lookups if lookups else 0.0}
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
@@ -0,0 +1,113 @@
+import logging
+import math
+import re
+from typing import List, Optional
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from config import HISTORY_COMPACTION_ENABLED, HISTORY_KEEP_TURNS, HISTORY_SUMMARIZE_BATCH, HISTORY_SUMMARY_MAX_TOKENS
+
+_encoding = None
+_encoding_failed = False
+THAI_CHAR = re.compile(r"[฀-๿]")
+MESSAGE_OVERHEAD_TOKENS = 4  # role/separator tokens the chat format adds per message
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken; a Thai-aware estimate when its encoding cannot be loaded (offline)."""
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoding_failed = True
+            logging.warning("⚠️ tiktoken encoding unavailable, estimating token counts")
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    thai = len(THAI_CHAR.findall(text))
+    return math.ceil(thai / 2 + (len(text) - thai) / 4)
+
+
+def message_tokens(message: BaseMessage) -> int:
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    return count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+def split_turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """Group messages into turns, each starting at a HumanMessage."""
+    turns: List[List[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def summary_message(summary: Optional[str]) -> List[BaseMessage]:
+    if not summary:
+        return []
+    return [SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")]
+
+
+def history_for_prompt(state: dict, budget: int, exclude_last_human: bool = False) -> List[BaseMessage]:
+    """Rolling summary plus the newest messages that fit in `budget` tokens.
+
+    The latest message is always kept. With exclude_last_human the trailing
+    question is dropped, for prompts that restate it themselves.
+    """
+    messages = list(state.get("messages", []))
+    if exclude_last_human and messages and isinstance(messages[-1], HumanMessage):
+        messages = messages[:-1]
+
+    head = summary_message(state.get("history_summary"))
+    remaining = budget - sum(message_tokens(m) for m in head)
+    selected: List[BaseMessage] = []
+    for message in reversed(messages):
+        cost = message_tokens(message)
+        if selected and cost > remaining:
+            break
+        selected.append(message)
+        remaining -= cost
+    return head + selected[::-1]
+
+
+def render_transcript(messages: List[BaseMessage]) -> str:
+    lines = []
+    for message in messages:
+        role = "User" if isinstance(message, HumanMessage) else "Assistant" if isinstance(message, AIMessage) else "System"
+        lines.append(f"{role}: {message.content}")
+    return "\n".join(lines)
+
+
+async def update_summary(summary_llm, summary: Optional[str], messages: List[BaseMessage]) -> str:
+    """Fold messages into the running summary with one LLM call."""
+    prompt = (
+        "You maintain a running summary of a conversation between a customer and an insurance assistant.\n"
+        "Update the summary with the new messages. Keep names, ages, products, amounts and open "
+        "questions; drop greetings and repetition. Write in the language of the conversation, "
+        f"at most {HISTORY_SUMMARY_MAX_TOKENS} tokens.\n\n"
+        f"Current summary:\n{summary or '(empty)'}\n\nNew messages:\n{render_transcript(messages)}"
+    )
+    reply = await summary_llm.ainvoke([SystemMessage(content=prompt)])
+    return reply.content.strip()
+
+
+async def compact_history(state: dict, summary_llm, keep_turns: int = HISTORY_KEEP_TURNS,
+                          batch_turns: int = HISTORY_SUMMARIZE_BATCH) -> Optional[dict]:
+    """Move turns older than the last keep_turns into the rolling summary.
+
+    Runs only once batch_turns turns have piled up beyond the verbatim window, so
+    the summary LLM is called on roughly one turn in batch_turns. Returns the
+    updated {"messages", "history_summary"} or None when nothing changed.
+    """
+    if not HISTORY_COMPACTION_ENABLED:
+        return None
+    turns = split_turns(state.get("messages", []))
+    if len(turns) < keep_turns + batch_turns:
+        return None
+
+    split = len(turns) - keep_turns
+    old = [m for turn in turns[:split] for m in turn]
+    kept = [m for turn in turns[split:] for m in turn]
+    summary = await update_summary(summary_llm, state.get("history_summary"), old)
+    logging.info(f"🗜️ Compacted {len(old)} messages into the history summary ({count_tokens(summary)} tokens)")
+    return {"messages": kept, "history_summary": summary}
@@ -0,0 +1,135 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+from db_utils import insert_document_record, mark_document_ready, delete_document_record, swap_document_records
+from documents_loaders import index_document, delete_doc_from_chroma
+from answer_cache import answer_cache
+from config import INGEST_MAX_WORKERS, INGEST_MAX_JOBS_KEPT
+
+
+@dataclass
+class IngestionJob:
+    id: str
+    filename: str
+    file_path: str
+    replaces: Optional[int] = None  # file_id swapped out once this version is indexed
+    status: str = "queued"  # queued | running | succeeded | failed
+    file_id: Optional[int] = None
+    progress: dict = field(default_factory=lambda: {
+        "pages_parsed": 0, "chunks_total": 0, "chunks_written": 0})
+    error: Optional[str] = None
+    queued_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        now = time.time()
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "file_id": self.file_id,
+            "replaces": self.replaces,
+            "progress": dict(self.progress),
+            "error": self.error,
+            "timing": {
+                "queued_at": self.queued_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "queue_seconds": (self.started_at or now) - self.queued_at,
+                "run_seconds": ((self.finished_at or now) - self.started_at) if self.started_at else None,
+            },
+        }
+
+
+def ingest_file(file_path: str, filename: str, progress=None, replaces: Optional[int] = None) -> int:
+    """Index a file under a hidden 'pending' document row and publish it once Chroma has it.
+
+    With replaces, the staged version and the old one trade places in a single
+    document_store transaction, so retrieval sees exactly one of them at any
+    time; the old chunks and row are deleted afterwards. Returns the new
+    file_id; on failure the partial chunks and the row are removed.
+    """
+    file_id = insert_document_record(filename, status='pending')
+    try:
+        index_document(file_path, file_id, progress)
+        if replaces is None:
+            mark_document_ready(file_id)
+        else:
+            swap_document_records(file_id, replaces)
+    except Exception:
+        delete_doc_from_chroma(file_id)
+        delete_document_record(file_id)
+        raise
+
+    if replaces is not None:
+        # retired rows stay hidden from retrieval even if this cleanup fails
+        if delete_doc_from_chroma(replaces):
+            delete_document_record(replaces)
+        logging.info(f"🔁 file_id {file_id} replaced file_id {replaces}")
+    cache = answer_cache()
+    if cache is not None:
+        if replaces is not None:
+            cache.invalidate_file(replaces)
+        cache.invalidate_kb_misses()
+    return file_id
+
+
+class IngestionQueue:
+    """Bounded worker pool that indexes uploaded documents in the background."""
+
+    def __init__(self, max_workers: int = INGEST_MAX_WORKERS, max_jobs_kept: int = INGEST_MAX_JOBS_KEPT):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self.max_jobs_kept = max_jobs_kept
+        self.jobs: OrderedDict[str, IngestionJob] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, file_path: str, filename: str, replaces: Optional[int] = None) -> IngestionJob:
+        job = IngestionJob(id=uuid.uuid4().hex, filename=filename, file_path=file_path, replaces=replaces)
+        with self._lock:
+            self.jobs[job.id] = job
+            self._trim()
+        self.executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _trim(self) -> None:
+        finished = [j.id for j in self.jobs.values() if j.status in ("succeeded", "failed")]
+        for job_id in finished[:max(0, len(self.jobs) - self.max_jobs_kept)]:
+            del self.jobs[job_id]
+
+    def _run(self, job: IngestionJob) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        logging.info(f"📥 Ingestion job {job.id} started for {job.filename}")
+
+        def progress(counter, value):
+            job.progress[counter] = value
+
+        try:
+            job.file_id = ingest_file(job.file_path, job.filename, progress, replaces=job.replaces)
+            job.status = "succeeded"
+            logging.info(f"✅ Ingestion job {job.id} indexed {job.filename} as file_id {job.file_id}")
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logging.exception(f"Ingestion job {job.id} failed")
+        finally:
+            job.finished_at = time.time()
+            if os.path.exists(job.file_path):
+                os.remove(job.file_path)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+ingestion_queue = IngestionQueue()
@@ -0,0 +1,168 @@
+import math
+import re
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from lexical_index import tokenize
+from utils import detect_language, match_product_name
+from config import PREROUTER_ENABLED, PREROUTER_MIN_CONFIDENCE, PREROUTER_MODEL_ROUTES
+
+# Labelled routes for the local model (same labels as RouteDecision.route)
+ROUTE_EXAMPLES: List[Tuple[str, str]] = [
+    ("สวัสดีครับ", "end"), ("สวัสดีค่ะ", "end"), ("หวัดดี", "end"), ("ขอบคุณครับ", "end"),
+    ("ขอบคุณมากค่ะ", "end"), ("hi", "end"), ("hello", "end"), ("hey there", "end"),
+    ("thanks", "end"), ("thank you so much", "end"), ("good morning", "end"), ("bye", "end"),
+    ("คุ้มชีวาคุ้มครองอะไรบ้าง", "rag"), ("เบี้ยประกันคุ้มออมสุขเท่าไหร่", "rag"),
+    ("ประกันสุขภาพเหมาจ่ายมีค่าห้องเท่าไหร่", "rag"), ("แบบตลอดชีพ 90/20 จ่ายเบี้ยกี่ปี", "rag"),
+    ("เงื่อนไขการรับประกันมีอะไรบ้าง", "rag"), ("ลดหย่อนภาษีได้ไหม", "rag"),
+    ("ระยะเวลาคุ้มครองกี่ปี", "rag"), ("ความคุ้มครองกรณีเสียชีวิต", "rag"),
+    ("what does the policy cover", "rag"), ("how much is the premium", "rag"),
+    ("what is the coverage period", "rag"), ("is the premium tax deductible", "rag"),
+    ("what are the benefits of the savings plan", "rag"), ("maximum entry age for the health plan", "rag"),
+    ("เคลมประกันยังไง", "rag"), ("ยื่นเคลมค่ารักษาต้องใช้เอกสารอะไรบ้าง", "rag"), ("เคลมได้ภายในกี่วัน", "rag"),
+    ("เปลี่ยนผู้รับผลประโยชน์ทำอย่างไร", "rag"), ("ชำระเบี้ยช่องทางไหนได้บ้าง", "rag"),
+    ("ยกเลิกกรมธรรม์ได้ไหม", "rag"), ("ติดต่อ call center เบอร์อะไร", "rag"),
+    ("how do i claim", "rag"), ("how do i file a claim for hospital costs", "rag"),
+    ("what documents do i need for a claim", "rag"), ("how do i change my beneficiary", "rag"),
+    ("how do i pay my premium", "rag"), ("how do i cancel my policy", "rag"),
+    ("how do i update my address", "rag"),
+    ("สนใจซื้อประกัน", "interview"), ("อยากสมัครคุ้มชีวา", "interview"),
+    ("ต้องการซื้อแผนนี้", "interview"), ("สนใจทำประกันครับ", "interview"),
+    ("อยากให้ตัวแทนติดต่อกลับ", "interview"), ("ขอสมัครเลยค่ะ", "interview"),
+    ("i want to buy this plan", "interview"), ("i'd like to apply", "interview"),
+    ("sign me up", "interview"), ("i am interested in buying insurance", "interview"),
+    ("please have an agent contact me", "interview"), ("how do i apply for this", "interview"),
+    ("1+1 เท่ากับเท่าไหร่", "answer"), ("แปลคำว่า insurance เป็นภาษาไทย", "answer"),
+    ("what is insurance in general", "answer"), ("explain what a deductible is", "answer"),
+    ("translate this to english", "answer"), ("เขียนอีเมลขอบคุณลูกค้าให้หน่อย", "answer"),
+]
+
+_GREETING_WORDS = r"สวัสดี|หวัดดี|ดีครับ|ดีค่ะ|hi|hello|hey|good (?:morning|afternoon|evening)"
+_THANKS_WORDS = r"ขอบคุณ|ขอบใจ|thanks?|thank you|thx"
+_CLOSING_WORDS = r"ลาก่อน|บาย|แค่นี้ก่อน|(?:good)?bye|see you"
+# a message made only of greetings, thanks and goodbyes (with particles), e.g. "ขอบคุณครับ บาย"
+SMALL_TALK = re.compile(
+    rf"^\s*(?:(?:{_GREETING_WORDS}|{_THANKS_WORDS}|{_CLOSING_WORDS})"
+    r"[\s!.,]*(?:ครับ|ค่ะ|คะ|จ้า|นะ|มาก|มากๆ|so much|you|there|later)*[\s!.,]*)+$",
+    re.IGNORECASE,
+)
+THANKS = re.compile(_THANKS_WORDS, re.IGNORECASE)
+CLOSING = re.compile(_CLOSING_WORDS, re.IGNORECASE)
+INTEREST = re.compile(
+    r"(สนใจ(ซื้อ|สมัคร|ทำ)|อยาก(ซื้อ|สมัคร|ทำประกัน)|ต้องการ(ซื้อ|สมัคร)|ขอสมัคร|ให้ตัวแทนติดต่อ"
+    r"|\b(want|would like|'d like) to (buy|apply|purchase|sign up)\b|\bsign me up\b)",
+    re.IGNORECASE,
+)
+
+GREETING_REPLIES = {
+    "th": "สวัสดีครับ/ค่ะ ยินดีให้บริการข้อมูลประกันของ SCB Protect มีอะไรให้ช่วยไหมครับ/คะ?",
+    "en": "Hello! I'm happy to help with SCB Protect insurance. What would you like to know?",
+}
+THANKS_REPLIES = {
+    "th": "ยินดีครับ/ค่ะ หากมีคำถามเพิ่มเติมเกี่ยวกับประกันของ SCB Protect สอบถามได้เลยนะครับ/คะ",
+    "en": "You're welcome! Let me know if you have any other questions about SCB Protect insurance.",
+}
+CLOSING_REPLIES = {
+    "th": "ขอบคุณที่ใช้บริการ SCB Protect ครับ/ค่ะ แล้วพบกันใหม่นะครับ/คะ",
+    "en": "Thank you for chatting with SCB Protect. Goodbye!",
+}
+
+
+def small_talk_reply(text: str) -> str:
+    """Reply to a SMALL_TALK message: a goodbye wins over thanks, thanks over a greeting."""
+    replies = CLOSING_REPLIES if CLOSING.search(text) else THANKS_REPLIES if THANKS.search(text) else GREETING_REPLIES
+    return replies[detect_language(text)]
+
+
+@dataclass
+class PreRoute:
+    route: str
+    confidence: float
+    source: str  # "rule" | "model"
+    reply: Optional[str] = None
+
+
+class NaiveBayesRouter:
+    """Multinomial naive Bayes over the BM25 tokens (words + Thai bigrams)."""
+
+    def __init__(self, examples: List[Tuple[str, str]], alpha: float = 0.5):
+        self.alpha = alpha
+        self.term_counts: Dict[str, Counter] = defaultdict(Counter)
+        label_counts = Counter(label for _, label in examples)
+        for text, label in examples:
+            self.term_counts[label].update(tokenize(text))
+        self.vocab = {t for counts in self.term_counts.values() for t in counts}
+        self.log_prior = {label: math.log(n / len(examples)) for label, n in label_counts.items()}
+        self.totals = {label: sum(counts.values()) for label, counts in self.term_counts.items()}
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        tokens = [t for t in tokenize(text) if t in self.vocab]
+        if not tokens:
+            return "answer", 0.0
+        scores = {}
+        for label, prior in self.log_prior.items():
+            denom = self.totals[label] + self.alpha * len(self.vocab)
+            scores[label] = prior + sum(math.log((self.term_counts[label][t] + self.alpha) / denom) for t in tokens)
+        best = max(scores, key=scores.get)
+        total = sum(math.exp(s - scores[best]) for s in scores.values())
+        return best, 1.0 / total
+
+
+class PreRouter:
+    """Cheap local routing in front of router_llm.
+
+    Keyword rules handle greetings/thanks/goodbyes, purchase intent and
+    product questions; everything else falls through to the LLM router.
+    The naive Bayes model is only consulted for PREROUTER_MODEL_ROUTES (none
+    by default) and never on a session with earlier turns: it routes
+    off-domain questions ("what's the weather today") and questions about
+    the conversation ("ผมชื่ออะไร") to 'rag' as confidently as real KB
+    questions, see bench/prerouter.py.
+    """
+
+    def __init__(self, min_confidence: float = PREROUTER_MIN_CONFIDENCE,
+                 model_routes: Tuple[str, ...] = PREROUTER_MODEL_ROUTES):
+        self.min_confidence = min_confidence
+        self.model_routes = set(model_routes)
+        self.model = NaiveBayesRouter(ROUTE_EXAMPLES)
+        self.counters = {"calls": 0, "llm_calls_saved": 0, "fallbacks": 0, "classify_ms_total": 0.0}
+        self.saved_by_route: Counter = Counter()
+
+    def _classify(self, text: str, has_history: bool) -> Optional[PreRoute]:
+        if SMALL_TALK.match(text):
+            return PreRoute("end", 1.0, "rule", small_talk_reply(text))
+        if INTEREST.search(text):
+            return PreRoute("interview", 1.0, "rule")
+        if match_product_name(text):
+            return PreRoute("rag", 1.0, "rule")
+
+        if not self.model_routes or has_history:
+            return None
+        route, confidence = self.model.predict(text)
+        # 'end' needs a reply, so only the small-talk rule may short-circuit it; a wrong 'interview' starts a
+        # lead interview for a question ("how do I claim?"), so only the INTEREST rule may short-circuit that
+        if route in self.model_routes and route not in ("end", "interview") and confidence >= self.min_confidence:
+            return PreRoute(route, confidence, "model")
+        return None
+
+    def classify(self, text: str, has_history: bool = False) -> Optional[PreRoute]:
+        """Return a confident route for text, or None to defer to router_llm."""
+        started = time.perf_counter()
+        decision = self._classify(text, has_history)
+        self.counters["calls"] += 1
+        self.counters["classify_ms_total"] += (time.perf_counter() - started) * 1000
+        if decision is None:
+            self.counters["fallbacks"] += 1
+        else:
+            self.counters["llm_calls_saved"] += 1
+            self.saved_by_route[decision.route] += 1
+        return decision
+
+    def stats(self) -> dict:
+        calls = self.counters["calls"]
+        return {**self.counters, "saved_by_route": dict(self.saved_by_route),
+                "avg_classify_ms": self.counters["classify_ms_total"] / calls if calls else 0.0}
+
+
+prerouter = PreRouter() if PREROUTER_ENABLED else None
@@ -0,0 +1,281 @@
+"""Deterministic lead interview: bilingual question templates and local answer parsing.
+
+The interview collects the six ProductInterest fields. Every message is first
+scanned for any fields it states ("ผมชื่อสมชาย อายุ 35 เงินเดือน 6 หมื่น"),
+then the rest of the message is read as the answer to the question asked.
+Parsing uses plain rules, so a normal interview needs no LLM at all; the
+interview node may spend one LLM call per lead on what the rules cannot read
+(see INTERVIEW_LLM_FALLBACK).
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from utils import detect_language, match_product_name
+from config import PRODUCT_NAMES
+
+FIELDS = ["name", "age", "occupation", "income", "product_name", "memo"]
+
+INTRO = {
+    "th": "ยินดีครับ/ค่ะ เพื่อให้เจ้าหน้าที่ติดต่อกลับ ขอสอบถามข้อมูลเล็กน้อยนะครับ/คะ",
+    "en": "Great! So that an agent can contact you, I need a few details.",
+}
+QUESTIONS = {
+    "name": {"th": "ขอทราบชื่อ-นามสกุลของคุณด้วยครับ/ค่ะ", "en": "May I have your full name?"},
+    "age": {"th": "คุณอายุเท่าไหร่ครับ/คะ?", "en": "How old are you?"},
+    "occupation": {"th": "คุณประกอบอาชีพอะไรครับ/คะ?", "en": "What is your occupation?"},
+    "income": {"th": "รายได้ต่อเดือนของคุณประมาณเท่าไหร่ครับ/คะ? (บาท)", "en": "What is your monthly income (THB)?"},
+    "product_name": {"th": "คุณสนใจผลิตภัณฑ์ใดครับ/คะ?\n{products}", "en": "Which product are you interested in?\n{products}"},
+    "memo": {"th": "มีข้อมูลเพิ่มเติมที่อยากแจ้งเจ้าหน้าที่ไหมครับ/คะ? (พิมพ์ - หากไม่มี)",
+             "en": "Anything else you'd like our agent to know? (type - if none)"},
+}
+INVALID = {
+    "name": {"th": "ขออภัยครับ/ค่ะ กรุณาระบุชื่อของคุณ", "en": "Sorry, please tell me your name."},
+    "age": {"th": "กรุณาระบุอายุเป็นตัวเลข เช่น 35 ครับ/ค่ะ", "en": "Please enter your age as a number, e.g. 35."},
+    "occupation": {"th": "กรุณาระบุอาชีพของคุณครับ/ค่ะ", "en": "Please tell me your occupation."},
+    "income": {"th": "กรุณาระบุรายได้ต่อเดือนเป็นตัวเลข เช่น 30000 ครับ/ค่ะ",
+               "en": "Please enter your monthly income as a number, e.g. 30000."},
+    "product_name": {"th": "กรุณาเลือกผลิตภัณฑ์จากรายการครับ/ค่ะ", "en": "Please choose a product from the list."},
+    "memo": {"th": "พิมพ์ข้อมูลเพิ่มเติม หรือ - หากไม่มีครับ/ค่ะ", "en": "Type a note, or - if none."},
+}
+LABELS = {
+    "name": {"th": "ชื่อ", "en": "Name"},
+    "age": {"th": "อายุ", "en": "Age"},
+    "occupation": {"th": "อาชีพ", "en": "Occupation"},
+    "income": {"th": "รายได้", "en": "Income"},
+    "product_name": {"th": "สินค้าที่สนใจ", "en": "Product"},
+    "memo": {"th": "หมายเหตุ", "en": "Memo"},
+}
+SUMMARY = {
+    "th": "ขอสรุปข้อมูลที่ได้ดังนี้นะครับ/ค่ะ:\n{lines}\n\nหากข้อมูลถูกต้อง พิมพ์ 'ถูกต้อง' เพื่อยืนยัน หรือบอกหัวข้อที่ต้องการแก้ไขครับ/ค่ะ",
+    "en": "Here is what I have:\n{lines}\n\nType 'yes' to confirm, or tell me which item to change.",
+}
+ASK_CORRECTION = {
+    "th": "ข้อมูลใดที่ต้องการแก้ไขครับ/คะ? (ชื่อ / อายุ / อาชีพ / รายได้ / สินค้า / หมายเหตุ)",
+    "en": "Which item would you like to change? (name / age / occupation / income / product / memo)",
+}
+CLOSING = {
+    "th": "ขอบคุณครับ/ค่ะ คุณ{name} เราได้บันทึกความสนใจใน {product_name} เรียบร้อยแล้ว เจ้าหน้าที่จะติดต่อกลับโดยเร็วที่สุดครับ/ค่ะ",
+    "en": "Thank you, {name}! Your interest in {product_name} has been recorded and an agent will contact you soon.",
+}
+CANCELLED = {
+    "th": "ยกเลิกการกรอกข้อมูลแล้วครับ/ค่ะ หากต้องการสอบถามเพิ่มเติมสามารถพิมพ์ได้เลยครับ/ค่ะ",
+    "en": "No problem, I've cancelled that. Feel free to ask anything else.",
+}
+FAILED = {
+    "th": "ขออภัยครับ/ค่ะ ระบบไม่สามารถบันทึกข้อมูลได้ในขณะนี้ กรุณาลองใหม่อีกครั้งภายหลังครับ/ค่ะ",
+    "en": "Sorry, we couldn't record your details right now. Please try again later.",
+}
+
+# Thai has no word boundaries, so only the Latin alternatives are anchored with \b
+YES = re.compile(r"^\s*(ถูกต้อง|ยืนยัน|ใช่|ตกลง|โอเค|ครับ|ค่ะ|(yes|y|yep|correct|ok|okay|confirm)\b)", re.IGNORECASE)
+NO = re.compile(r"(ไม่ถูก|ไม่ใช่|^\s*ไม่\s*(ครับ|ค่ะ)?\s*$|ผิด|แก้|\b(no|nope|wrong|incorrect|change|edit)\b)", re.IGNORECASE)
+CANCEL = re.compile(r"^\s*(ยกเลิก|ไม่สนใจแล้ว|(cancel|stop|quit)\b)", re.IGNORECASE)
+NONE_ANSWERS = {"-", "ไม่มี", "ไม่", "none", "no", "n/a", "nothing"}
+FIELD_ALIASES = {
+    "name": ("ชื่อ", "name"),
+    "age": ("อายุ", "age"),
+    "occupation": ("อาชีพ", "occupation", "job"),
+    "income": ("รายได้", "เงินเดือน", "income", "salary"),
+    "product_name": ("สินค้า", "ผลิตภัณฑ์", "แผน", "product", "plan"),
+    "memo": ("หมายเหตุ", "memo", "note"),
+}
+NAME_PREFIX = re.compile(r"^\s*(ผมชื่อ|ฉันชื่อ|ดิฉันชื่อ|หนูชื่อ|ชื่อ|my name is|i am|i'm|name:?)\s*", re.IGNORECASE)
+THAI_DIGITS = str.maketrans("๐๑๒๓๔๕๖๗๘๙", "0123456789")
+
+# Amounts: "60000", "60,000", "60k", "สามสิบห้า", "6 หมื่น", "1.5 แสน", "หกหมื่นห้าพัน"
+THAI_NUMBER_WORDS = {"ศูนย์": 0, "หนึ่ง": 1, "เอ็ด": 1, "สอง": 2, "ยี่": 2, "สาม": 3, "สี่": 4,
+                     "ห้า": 5, "หก": 6, "เจ็ด": 7, "แปด": 8, "เก้า": 9}
+THAI_UNITS = {"สิบ": 10, "ร้อย": 100, "พัน": 1_000, "หมื่น": 10_000, "แสน": 100_000, "ล้าน": 1_000_000}
+_NUM = r"\d[\d,]*(?:\.\d+)?"
+_WORD = "|".join(THAI_NUMBER_WORDS)
+_UNIT = "|".join(THAI_UNITS)
+AMOUNT = (rf"(?:{_NUM}\s*[kK](?![A-Za-z])"
+          rf"|(?:{_NUM}|{_WORD}|{_UNIT})(?:\s*(?:{_UNIT})|\s*{_NUM}\s*(?:{_UNIT})|{_WORD}|{_UNIT})*)")
+NUMBER = re.compile(AMOUNT)
+AMOUNT_TOKEN = re.compile(rf"\d+(?:\.\d+)?|{_WORD}|{_UNIT}")
+
+# Multi-slot extraction. Values run until the next keyword, particle or punctuation.
+_PARTICLE = r"(?:ครับ|ค่ะ|คะ|นะ|จ้ะ|จ้า)(?=[\s,.!?]|$)"
+_STOP_TH = rf"(?=\s*(?:อายุ|อาชีพ|ทำงาน|เป็น|เงินเดือน|รายได้|สนใจ|อยาก|และ|{_PARTICLE}|[,.;!?\n]|\d|$))"
+_STOP_EN = r"(?=\s*(?:[,.;!?\n]|\band\b|\bwith\b|\bearn|\bmy\b|\bi\b|\bi'm\b|\bage|\binterested\b|\d|$))"
+# what follows a bare "เป็น" / "I'm" in sentences that are not about work
+_NOT_OCCUPATION_TH = r"(?:คน|ลูกค้า|ข้อมูล|สนใจ|อยาก|ห่วง|กังวล|ไป|ได้|ถูก|ใช่|แบบ|อย่าง|เรื่อง|ที่|ของ|การ|ความ)"
+_NOT_OCCUPATION_EN = (r"(?:interested|looking|wondering|thinking|planning|trying|asking|calling|writing|here|just|not"
+                      r"|so|very|really|also|still|happy|glad|sure|fine|ok|okay|good|correct|right|done|ready|bit"
+                      r"|little|customer|person|client|new|existing|confused|sorry)\b")
+SLOT_PATTERNS = {
+    "income": [
+        re.compile(rf"(?:เงินเดือน|รายได้)(?:ต่อเดือน)?\s*(?:ประมาณ|เดือนละ|ต่อเดือน|คือ|เป็น|อยู่ที่|ราว ?ๆ|ราว)?\s*"
+                   rf"(?P<v>{AMOUNT})(?:\s*บาท)?"),
+        re.compile(rf"เดือนละ\s*(?P<v>{AMOUNT})(?:\s*บาท)?"),
+        re.compile(rf"(?P<v>{AMOUNT})\s*บาท"),
+        re.compile(rf"\b(?:income|salary|earn(?:s|ing)?)\b\s*(?:is|of|:|about|around)?\s*(?:thb|฿)?\s*(?P<v>{AMOUNT})(?:\s*(?:baht|thb)\b)?",
+                   re.IGNORECASE),
+        re.compile(rf"(?P<v>{AMOUNT})\s*(?:baht|thb)\b", re.IGNORECASE),
+    ],
+    "age": [
+        re.compile(rf"อายุ\s*(?:ประมาณ|เป็น|คือ|ได้)?\s*(?P<v>{AMOUNT})(?:\s*(?:ปี|ขวบ))?"),
+        re.compile(rf"(?P<v>{AMOUNT})\s*ขวบ"),
+        re.compile(r"\b(?:age|aged)\s*(?:is|:)?\s*(?P<v>\d+)", re.IGNORECASE),
+        re.compile(r"(?P<v>\d+)\s*(?:years?[ -]old|y/o|yo\b)", re.IGNORECASE),
+        re.compile(r"\b(?:i'm|i am)\s+(?P<v>\d{1,3})\b(?!\s*(?:k\b|baht|thb|,\d))", re.IGNORECASE),
+    ],
+    "name": [
+        re.compile(rf"(?:ผม|ฉัน|ดิฉัน|หนู|เรา)?ชื่อ(?:ว่า|คือ)?\s*(?P<v>[^\s,\d].*?){_STOP_TH}"),
+        re.compile(rf"\b(?:my name is|name is|name:|call me)\s*(?P<v>[A-Za-z][A-Za-z.'\- ]*?){_STOP_EN}", re.IGNORECASE),
+    ],
+    "occupation": [
+        re.compile(rf"(?:อาชีพ(?:คือ|เป็น)?|ทำอาชีพ|ทำงาน(?:เป็น|ที่))\s*(?P<v>[^\s,\d].*?){_STOP_TH}"),
+        re.compile(rf"\b(?:i work as|work as|working as|occupation(?: is|:)?|job(?: is|:)?)\s+(?:an?\s+)?"
+                   rf"(?P<v>[A-Za-z][A-Za-z\- ]*?){_STOP_EN}", re.IGNORECASE),
+        # without a cue ("เป็นวิศวกร", "I'm a teacher") only when what follows is not interest, a confirmation, ...
+        re.compile(rf"(?:ผม|ฉัน|ดิฉัน|หนู)?เป็น\s*(?!{_NOT_OCCUPATION_TH})(?P<v>[^\s,\d].*?){_STOP_TH}"),
+        re.compile(rf"\b(?:i'm|i am)\s+(?:an?\s+(?!{_NOT_OCCUPATION_EN})|(?!an?\s|{_NOT_OCCUPATION_EN}))"
+                   rf"(?P<v>[A-Za-z][A-Za-z\- ]*?){_STOP_EN}", re.IGNORECASE),
+    ],
+}
+# keywords that show a field was mentioned; one left in the unparsed rest of a message means the rules missed it
+SLOT_HINTS = {
+    "name": re.compile(r"ชื่อ|\bname\b", re.IGNORECASE),
+    "age": re.compile(r"อายุ|ขวบ|\bage\b|\baged\b|years? old", re.IGNORECASE),
+    "occupation": re.compile(r"อาชีพ|ทำงาน|\bwork|\bjob\b|\boccupation\b", re.IGNORECASE),
+    "income": re.compile(r"เงินเดือน|รายได้|บาท|\bincome\b|\bsalary\b|\bearn|\bbaht\b", re.IGNORECASE),
+}
+FILLER = re.compile(rf"{_PARTICLE}|[;!?]|,(?!\d)|(?<!\d)\.(?!\d)")
+
+
+def message_language(text: str, default: str = "th") -> str:
+    """'th' / 'en' from the script of text; default when it has no letters (e.g. "35")."""
+    if detect_language(text) == "th":
+        return "th"
+    return "en" if re.search(r"[A-Za-z]", text) else default
+
+
+def amount_value(raw: str) -> Optional[int]:
+    """Value of an AMOUNT match, e.g. "6 หมื่น" -> 60000, "สามสิบห้า" -> 35, "30k" -> 30000."""
+    raw = raw.replace(",", "").strip()
+    if raw[-1] in "kK":
+        return int(float(raw[:-1].strip()) * 1000)
+    total, current = 0.0, None
+    for token in AMOUNT_TOKEN.findall(raw):
+        if token == "ล้าน":
+            total = (total + (current if current is not None else (0 if total else 1))) * THAI_UNITS[token]
+            current = None
+        elif token in THAI_UNITS:
+            total += (current if current is not None else 1) * THAI_UNITS[token]
+            current = None
+        else:
+            current = THAI_NUMBER_WORDS[token] if token in THAI_NUMBER_WORDS else float(token)
+    return int(round(total + (current or 0)))
+
+
+def parse_number(text: str) -> Optional[int]:
+    match = NUMBER.search(text.translate(THAI_DIGITS))
+    if not match:
+        return None
+    try:
+        return amount_value(match.group(0))
+    except ValueError:
+        return None
+
+
+def parse_answer(field: str, text: str) -> Tuple[bool, Any]:
+    """(ok, value) for an answer to field; ok is False when the rules cannot read it."""
+    text = text.strip()
+    if field == "name":
+        name = NAME_PREFIX.sub("", text).strip(" .")
+        return (0 < len(name) <= 100), name
+    if field == "age":
+        age = parse_number(text)
+        return (age is not None and 1 <= age <= 120), age
+    if field == "income":
+        income = parse_number(text)
+        return (income is not None and income >= 0), income
+    if field == "occupation":
+        return (0 < len(text) <= 100), text
+    if field == "product_name":
+        choice = text.translate(THAI_DIGITS)
+        if choice.isdigit() and 1 <= int(choice) <= len(PRODUCT_NAMES):
+            return True, PRODUCT_NAMES[int(choice) - 1]
+        product = match_product_name(text)
+        return (product is not None), product
+    if field == "memo":
+        return True, "" if text.lower() in NONE_ANSWERS else text
+    raise ValueError(f"Unknown interview field {field}")
+
+
+def next_missing(data: Dict[str, Any]) -> Optional[str]:
+    return next((f for f in FIELDS if f not in data), None)
+
+
+def question(field: str, lang: str) -> str:
+    products = "\n".join(f"{i}. {p}" for i, p in enumerate(PRODUCT_NAMES, start=1))
+    return QUESTIONS[field][lang].format(products=products)
+
+
+def summary(data: Dict[str, Any], lang: str) -> str:
+    empty = "ไม่มี" if lang == "th" else "-"
+    lines = "\n".join(f"- {LABELS[f][lang]}: {data.get(f) if data.get(f) not in (None, '') else empty}" for f in FIELDS)
+    return SUMMARY[lang].format(lines=lines)
+
+
+def correction_field(text: str) -> Optional[str]:
+    """Field the customer wants to change, if their reply names one."""
+    lowered = text.lower()
+    for field, aliases in FIELD_ALIASES.items():
+        if any(alias in lowered for alias in aliases):
+            return field
+    return None
+
+
+def find_product(text: str) -> Optional[Tuple[str, Tuple[int, int]]]:
+    """(catalog product, span) mentioned in text, tolerating the separators match_product_name ignores."""
+    for product in sorted(PRODUCT_NAMES, key=len, reverse=True):
+        chars = [re.escape(c) for c in re.sub(r"[\s_/\-.]+", "", product)]
+        match = re.search(r"[\s_/\-.]*".join(chars), text, re.IGNORECASE)
+        if match:
+            return product, match.span()
+    return None
+
+
+def extract_slots(text: str) -> Tuple[Dict[str, Any], str]:
+    """Every field text states, plus what is left of text once those statements are removed.
+
+    "ผมชื่อสมชาย อายุ 35 เป็นวิศวกร เงินเดือน 6 หมื่น สนใจคุ้มชีวา" fills all five
+    fields; "สมชาย ใจดี อายุ 35" gives {"age": 35} and the rest "สมชาย ใจดี".
+    Bare values without a keyword ("35") are left in the rest for the caller.
+    """
+    rest = text.translate(THAI_DIGITS)
+    slots: Dict[str, Any] = {}
+
+    def cut(span):
+        nonlocal rest
+        rest = f"{rest[:span[0]]},{rest[span[1]:]}"  # the comma keeps neighbouring values apart
+
+    product = find_product(rest)
+    if product:
+        slots["product_name"] = product[0]
+        cut(product[1])
+    for field, patterns in SLOT_PATTERNS.items():  # numbers first, so "อายุเป็น 40" is gone before occupation
+        for pattern in patterns:
+            match = pattern.search(rest)
+            if not match:
+                continue
+            raw = match.group("v").strip()
+            ok, value = parse_answer(field, raw) if field in ("name", "occupation") else (True, amount_value(raw))
+            if field == "age":
+                ok = value is not None and 1 <= value <= 120
+            if ok and value not in (None, ""):
+                slots[field] = value
+                cut(match.span())
+                break
+    return slots, re.sub(r"\s+", " ", FILLER.sub(" ", rest)).strip()
+
+
+def mentioned_fields(text: str) -> List[str]:
+    """Fields whose keywords appear in text."""
+    return [field for field, hint in SLOT_HINTS.items() if hint.search(text)]
+
+
+def unread_fields(rest: str) -> List[str]:
+    """Fields whose keywords are still in the unparsed rest of a message."""
+    return mentioned_fields(rest)
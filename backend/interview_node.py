@@ -1,18 +1,36 @@
 # nodes.py
-from fastmcp import Client
 from langchain_core.messages import AIMessage, SystemMessage, HumanMessage
-from langchain_openai import ChatOpenAI
-from pydantic_models import ProductInterest
+from pydantic import ValidationError
+from pydantic_models import ProductInterest, ProductInterestSlots
+from mcp_client import mcp_client, tool_message, Delivery
+from metrics import llm_metrics
+from resources import resource
+from interview_engine import (INTRO, INVALID, CLOSING, CANCELLED, FAILED, ASK_CORRECTION, YES, NO, CANCEL,
+                              message_language, parse_answer, next_missing, question, summary, correction_field,
+                              extract_slots, unread_fields, mentioned_fields)
+from utils import match_product_name
+from config import INTERVIEW_LLM_FALLBACK, INTERVIEW_MAX_LLM_CALLS, INTERVIEW_MULTI_SLOT
+from typing import Any, Dict, List, Optional, Tuple
 import logging
 import os
 
 # ---- Config ----
-MCP_URL = "http://localhost:8081/mcp"
-llm = ChatOpenAI(
-    model="gpt-4o-mini",
-    temperature=0.5,
-    openai_api_key=os.getenv("OPENAI_API_KEY"),
-)
+@resource("slot_llm")
+def slot_llm():
+    from langchain_openai import ChatOpenAI
+
+    llm = ChatOpenAI(
+        model="gpt-4o-mini",
+        temperature=0.5,
+        openai_api_key=os.getenv("OPENAI_API_KEY"),
+        callbacks=[llm_metrics],
+    )
+    return llm.with_structured_output(ProductInterestSlots)
+
+# awaiting_field value while the customer picks which summary item to correct
+CORRECTION = "_correction"
+INTERVIEW_RESET = {"customer_data": {}, "awaiting_field": None, "awaiting_confirmation": False,
+                   "interview_llm_calls": 0}
 
 # ---- Interview Node ----
 # async def interview_node(state):
@@ -75,126 +93,147 @@ llm = ChatOpenAI(
 #     state["done"] = True
 #     return state
 
-async def log_to_mcp(state, customer_data):
+async def log_to_mcp(customer_data) -> Optional[Delivery]:
     """
-    Log collected data to MCP server and confirm with user.
+    Log collected data to the MCP server; None when the data does not validate
+    or the server rejects the call.
     """
     try:
         interest = ProductInterest(**customer_data)
-    except Exception as e:
+    except ValidationError as e:
         logging.error(f"Validation error: {e}")
-        state["messages"].append(AIMessage(content=f"❌ Invalid data: {e}"))
-        return state
-
-    # 🔗 Call MCP tool
-    client = Client(MCP_URL)
-    async with client:
-        result = await client.call_tool("log_product_interest", interest.dict())
-        logging.info(f"🧾 MCP result: {result}")
-
-    message = (
-        result.data.get("message")
-        or result.structured_content.get("message")
-        or result.content[0].text
-    )
+        return None
 
-    # 💬 Generate polite confirmation message
-    confirm_prompt = (
-        f"The user's info has been saved: {interest.dict()}.\n"
-        "Reply politely (in the user's language) confirming that their information was recorded successfully."
+    # 🔗 Call MCP tool over the shared session; queued in the outbox if the server is down
+    try:
+        delivery = await mcp_client().deliver("log_product_interest", interest.dict())
+    except Exception as e:  # ToolError (rejected by the server) or anything the outbox could not take
+        logging.exception(f"❌ Logging product interest to MCP failed: {e!r}")
+        return None
+    logging.info(f"🧾 MCP result: {tool_message(delivery.result) if delivery.result else 'queued'}")
+    return delivery
+
+async def extract_with_llm(fields: List[str], text: str, asked: Optional[str], lang: str) -> Dict[str, Any]:
+    """One structured LLM call for the fields the interview rules could not read."""
+    prompt = (
+        (f"The customer was asked: \"{question(asked, lang)}\"\n" if asked else "")
+        + f"Extract these fields from their reply if it states them: {', '.join(fields)}. "
+        "Return age and income (monthly, in baht) as numbers in digits. "
+        "Leave a field null if the reply does not state it."
     )
-    confirm_reply = llm.invoke([SystemMessage(content=confirm_prompt)])
-
-    final_message = f"{message}\n\n{confirm_reply.content}"
-
-    state["messages"].append(AIMessage(content=final_message))
-    state["done"] = True
-    state["awaiting_confirmation"] = False
-    return state
+    result: ProductInterestSlots = await slot_llm().ainvoke([SystemMessage(content=prompt), HumanMessage(content=text)])
+    slots = {}
+    for field in fields:
+        value = getattr(result, field)
+        if value in (None, ""):
+            continue
+        ok, parsed = parse_answer(field, str(value))  # the LLM's answer must pass the same rules
+        if ok:
+            slots[field] = parsed
+    return slots
+
+async def collect_slots(field: Optional[str], text: str, customer_data: dict, lang: str,
+                        llm_calls: int) -> Tuple[Dict[str, Any], int]:
+    """Fields filled from one message: every field it states, then the rest as the answer to field."""
+    if INTERVIEW_MULTI_SLOT and field != "memo":  # a memo is free text; keywords in it are not answers
+        found, rest = extract_slots(text)
+        found = {f: v for f, v in found.items() if f == field or f not in customer_data}
+    else:
+        found, rest = {}, text
+        product = None if field else match_product_name(text)
+        if product:
+            found["product_name"] = product
+    if field and field not in found and rest:
+        ok, value = parse_answer(field, rest)
+        if ok:
+            found[field] = value
+
+    # one LLM call for what is left: the unanswered question plus fields mentioned but not read
+    leftover = [field] if field and field not in found else []
+    if INTERVIEW_MULTI_SLOT:
+        leftover += [f for f in unread_fields(rest) if f not in found and f not in customer_data and f not in leftover]
+    if leftover and INTERVIEW_LLM_FALLBACK and llm_calls < INTERVIEW_MAX_LLM_CALLS:
+        llm_calls += 1
+        found.update(await extract_with_llm(leftover, text, field, lang))
+    return found, llm_calls
+
+def reply(state, text, **updates):
+    return {**state, "messages": state.get("messages", []) + [AIMessage(content=text)], **updates}
 
 # Interview Node
 async def interview_node(state):
     """
-    Conversationally collect user info, confirm, and send to MCP.
+    Collect the lead fields with template questions, confirm, and send to MCP.
+
+    A message may fill several fields at once; only the remaining ones are
+    asked. Answers are parsed locally; what the rules cannot read may cost
+    an LLM call, at most INTERVIEW_MAX_LLM_CALLS per lead.
     """
     logging.info("➡️ Entered interview_node")
 
     messages = state.get("messages", [])
     customer_data = dict(state.get("customer_data", {}) or {})
+    user_last = messages[-1].content if messages and isinstance(messages[-1], HumanMessage) else ""
+    lang = message_language(user_last, state.get("interview_lang") or "th")
+    field = state.get("awaiting_field")
+    llm_calls = state.get("interview_llm_calls", 0)
+
+    if (field or state.get("awaiting_confirmation")) and CANCEL.match(user_last):
+        return reply(state, CANCELLED[lang], **INTERVIEW_RESET, interview_lang=lang)
+
+    # A correction that names its field and states its value ("รายได้ 70000") is applied directly;
+    # "ถูกต้องครับ เป็นข้อมูลที่ถูก" names none, so nothing in it is taken for a value
+    if state.get("awaiting_confirmation") or field == CORRECTION:
+        stated = extract_slots(user_last)[0] if INTERVIEW_MULTI_SLOT else {}
+        named = set(mentioned_fields(user_last)) | {"product_name"}  # a product name names itself
+        stated = {f: v for f, v in stated.items() if f in named}
+        changed = {f: v for f, v in stated.items() if customer_data.get(f) != v}
+        if changed:
+            customer_data.update(changed)
+            return reply(state, summary(customer_data, lang), customer_data=customer_data, awaiting_field=None,
+                         awaiting_confirmation=True, interview_lang=lang)
 
     # If user is confirming
     if state.get("awaiting_confirmation"):
-        user_last = messages[-1].content.lower()
-        if any(word in user_last for word in ["ถูกต้อง", "ยืนยัน", "yes", "correct", "ok"]):
+        if YES.match(user_last) and not NO.search(user_last):
             logging.info("✅ User confirmed information — sending to MCP")
-
-            # ---- Send to MCP ----
-            result = await log_to_mcp(state, customer_data)
-
-            # Extract response text from MCP result
-            mcp_message = (
-                result.get("message")
-                if isinstance(result, dict)
-                else str(result)
-            )
-
-            # ---- Use LLM to summarize confirmation ----
-            confirm_prompt = (
-                f"The customer has completed the insurance interview. "
-                f"The recorded information is:\n\n{customer_data}\n\n"
-                "Write a short, polite closing message in the same language as the user. "
-                "Thank them for their time and confirm that their data was recorded successfully."
-            )
-
-            llm_reply = llm.invoke([SystemMessage(content=confirm_prompt)])
-            summary_text = llm_reply.content.strip()
-
-            # ---- Send the final summary to the user ----
-            full_response = f"{mcp_message}\n\n{summary_text}"
-            state["messages"].append(AIMessage(content=full_response))
-            state["done"] = True  # mark conversation complete
-            return state
-
-        else:
-            # User rejected confirmation → ask for correction
-            state["messages"].append(
-                AIMessage(content="ข้อมูลใดที่ต้องการแก้ไขบ้างครับ/ค่ะ?")
-            )
-            state["awaiting_field"] = None
-            return state
+            delivery = await log_to_mcp(customer_data)
+            text = CLOSING[lang].format(**customer_data) if delivery is not None else FAILED[lang]
+            return reply(state, text, **INTERVIEW_RESET, done=True, interview_lang=lang)
+
+        target = correction_field(user_last)
+        if target is None:
+            # "no" without naming an item → ask which one; anything else → show the summary again
+            if NO.search(user_last):
+                return reply(state, ASK_CORRECTION[lang], awaiting_field=CORRECTION,
+                             awaiting_confirmation=False, interview_lang=lang)
+            return reply(state, summary(customer_data, lang), interview_lang=lang)
+        customer_data.pop(target, None)
+
+    elif field == CORRECTION:
+        target = correction_field(user_last)
+        if target is None:
+            return reply(state, ASK_CORRECTION[lang], interview_lang=lang)
+        customer_data.pop(target, None)
+
+    else:
+        # Answering a question, or the opening message (which often names the product already)
+        found, llm_calls = await collect_slots(field, user_last, customer_data, lang, llm_calls)
+        if field and not found:
+            return reply(state, INVALID[field][lang], interview_llm_calls=llm_calls, interview_lang=lang)
+        customer_data.update(found)
+        if found:
+            logging.info(f"🧩 Interview slots filled: {sorted(found)}")
 
     # Ask next question if still collecting info
-    fields = ["name", "age", "occupation", "income", "product_name", "memo"]
-    missing_field = next((f for f in fields if not customer_data.get(f)), None)
-
+    missing_field = next_missing(customer_data)
     if missing_field:
-        system_prompt = (
-            "You are a polite bilingual (Thai/English) insurance assistant.\n"
-            "Ask only one clear question at a time to collect the customer's information.\n"
-            "Required fields: name, age, occupation, income, product_name, memo.\n"
-            "When all fields are complete, summarize them for confirmation.\n"
-            "Use the same language as the customer."
-        )
-        convo = [SystemMessage(content=system_prompt)] + messages
-        llm_reply = llm.invoke(convo)
-        question = llm_reply.content.strip()
-
-        state["messages"].append(AIMessage(content=question))
-        state["awaiting_field"] = missing_field
-        return state
+        text = question(missing_field, lang)
+        if not field and not state.get("awaiting_confirmation"):
+            text = f"{INTRO[lang]}\n\n{text}"
+        return reply(state, text, customer_data=customer_data, awaiting_field=missing_field,
+                     awaiting_confirmation=False, interview_llm_calls=llm_calls, interview_lang=lang, done=False)
 
     # All fields filled → ask for confirmation
-    summary = (
-        "ขอสรุปข้อมูลที่ได้ดังนี้นะครับ/ค่ะ:\n"
-        f"- ชื่อ: {customer_data.get('name')}\n"
-        f"- อายุ: {customer_data.get('age')} ปี\n"
-        f"- อาชีพ: {customer_data.get('occupation')}\n"
-        f"- รายได้: {customer_data.get('income')} บาท\n"
-        f"- สินค้าที่สนใจ: {customer_data.get('product_name')}\n"
-        f"- หมายเหตุ: {customer_data.get('memo') or 'ไม่มี'}\n\n"
-        "หากข้อมูลถูกต้อง พิมพ์ 'ถูกต้อง' เพื่อยืนยันครับ/ค่ะ."
-    )
-
-    state["messages"].append(AIMessage(content=summary))
-    state["awaiting_confirmation"] = True
-    return state
+    return reply(state, summary(customer_data, lang), customer_data=customer_data, awaiting_field=None,
+                 awaiting_confirmation=True, interview_llm_calls=llm_calls, interview_lang=lang)
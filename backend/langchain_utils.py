@@ -1,6 +1,7 @@
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
+from metrics import llm_metrics
+from resources import resource
 
 
 
@@ -20,4 +21,9 @@ CONTEXT_PROMPT = ChatPromptTemplate.from_messages([
 ])
 
 
-contextualise_chain = ( CONTEXT_PROMPT | ChatOpenAI(model_name="gpt-4.1-mini", temperature=0) | StrOutputParser()).with_config(run_name="contextualise_chain")
\ No newline at end of file
+@resource("contextualise_chain")
+def contextualise_chain():
+    from langchain_openai import ChatOpenAI
+
+    llm = ChatOpenAI(model_name="gpt-4.1-mini", temperature=0, callbacks=[llm_metrics])
+    return (CONTEXT_PROMPT | llm | StrOutputParser()).with_config(run_name="contextualise_chain")
@@ -0,0 +1,187 @@
+import logging
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from langchain_core.documents import Document
+from config import LEXICAL_SYNC_INTERVAL_SECONDS
+
+try:  # dictionary-based Thai word segmentation when available
+    from pythainlp.tokenize import word_tokenize as thai_word_tokenize
+except ImportError:
+    thai_word_tokenize = None
+
+THAI_RUN = re.compile(r"[฀-๿]+")
+LATIN_TOKEN = re.compile(r"[a-z0-9]+(?:[/.][a-z0-9]+)*")
+THAI_MARKS = re.compile(r"[ัิ-ฺ็-๎]")
+# Legacy Thai fonts in the brochure PDFs extract tone marks/vowels as private-use glyphs
+THAI_PUA_MARKS = re.compile(r"[\uf700-\uf71f]")
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokenize mixed Thai/English text for BM25.
+
+    Latin words and numbers such as "90/20" are kept whole. Thai has no spaces,
+    so Thai runs are segmented with pythainlp when installed and otherwise
+    indexed as character bigrams, which still match product names and terms
+    like "เหมาจ่าย" exactly.
+    """
+    text = THAI_PUA_MARKS.sub("", unicodedata.normalize("NFC", text)).casefold()
+    tokens = LATIN_TOKEN.findall(text)
+    for run in THAI_RUN.findall(text):
+        if thai_word_tokenize is not None:
+            tokens.extend(w for w in thai_word_tokenize(run, keep_whitespace=False) if w.strip())
+            continue
+        # bigrams over base characters; tone marks and vowels above/below are too noisy on their own
+        base = THAI_MARKS.sub("", run)
+        if len(base) == 1:
+            tokens.append(base)
+        tokens.extend(base[i:i + 2] for i in range(len(base) - 1))
+    return tokens
+
+
+def indexed_text(text: str, metadata: Optional[dict]) -> str:
+    """Chunk text plus its source file name, which names the product when the PDF text does not."""
+    source = (metadata or {}).get("source")
+    return f"{text}\n{os.path.splitext(os.path.basename(source))[0]}" if source else text
+
+
+def normalize_phrase(text: str) -> str:
+    """Base characters only, without whitespace or separators, for exact phrase matching."""
+    text = THAI_MARKS.sub("", THAI_PUA_MARKS.sub("", unicodedata.normalize("NFC", text)))
+    return re.sub(r"[\s_/\-.]+", "", text).casefold()
+
+
+def mentions(doc: Document, phrase: str) -> bool:
+    """Whether the indexed text of a chunk contains phrase, e.g. a product name."""
+    return normalize_phrase(phrase) in normalize_phrase(indexed_text(doc.page_content, doc.metadata))
+
+
+class BM25Index:
+    """In-process Okapi BM25 index over the KB chunks stored in Chroma.
+
+    Each chunk is indexed with its source file name, so a query naming a
+    product finds that product's brochure even where its PDF text is lossy.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._clear()
+
+    def _clear(self) -> None:
+        self.docs: Dict[str, Document] = {}
+        self.lengths: Dict[str, int] = {}
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def add(self, ids: Iterable[str], texts: Iterable[str], metadatas: Iterable[dict]) -> None:
+        with self._lock:
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                if doc_id in self.docs:
+                    self._remove(doc_id)
+                counts = Counter(tokenize(indexed_text(text, metadata)))
+                self.docs[doc_id] = Document(page_content=text, metadata=metadata or {}, id=doc_id)
+                self.lengths[doc_id] = sum(counts.values())
+                self.total_length += self.lengths[doc_id]
+                for term, tf in counts.items():
+                    self.postings[term][doc_id] = tf
+
+    def _remove(self, doc_id: str) -> None:
+        doc = self.docs.pop(doc_id)
+        self.total_length -= self.lengths.pop(doc_id)
+        for term in set(tokenize(indexed_text(doc.page_content, doc.metadata))):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+
+    def remove_file(self, file_id: int) -> int:
+        return self.remove_files([file_id])
+
+    def remove_files(self, file_ids: Iterable[int]) -> int:
+        file_ids = set(file_ids)
+        with self._lock:
+            doc_ids = [i for i, d in self.docs.items() if d.metadata.get("file_id") in file_ids]
+            for doc_id in doc_ids:
+                self._remove(doc_id)
+            return len(doc_ids)
+
+    def search(self, query: str, k: int, exclude_file_ids: Iterable[int] = ()) -> List[Tuple[Document, float]]:
+        excluded = set(exclude_file_ids)
+        with self._lock:
+            if not self.docs:
+                return []
+            n = len(self.docs)
+            avgdl = self.total_length / n
+            scores: Dict[str, float] = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    if excluded and self.docs[doc_id].metadata.get("file_id") in excluded:
+                        continue
+                    norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / avgdl)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / norm
+            best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [(self.docs[doc_id], score) for doc_id, score in best]
+
+
+class ChromaLexicalIndex(BM25Index):
+    """BM25 index mirrored from a Chroma collection.
+
+    Built lazily from the collection on first search and kept in sync by
+    index_document/delete_docs_from_chroma. Every LEXICAL_SYNC_INTERVAL_SECONDS
+    the chunk ids are compared with Chroma's (ids only, no documents), so
+    changes made by other worker processes trigger a rebuild, including a
+    document replaced by one with as many chunks (new chunks get new ids).
+    """
+
+    def __init__(self, vectorstore, sync_interval: float = LEXICAL_SYNC_INTERVAL_SECONDS):
+        super().__init__()
+        self.vectorstore = vectorstore
+        self.sync_interval = sync_interval
+        self._synced_at: Optional[float] = None
+
+    def rebuild(self) -> None:
+        data = self.vectorstore.get(include=["documents", "metadatas"])
+        with self._lock:
+            self._clear()
+            self.add(data["ids"], data["documents"], data["metadatas"])
+            self._synced_at = time.monotonic()
+        logging.info(f"🔤 Lexical index built with {len(self)} chunks")
+
+    def ensure_synced(self) -> None:
+        if self._synced_at is not None and time.monotonic() - self._synced_at < self.sync_interval:
+            return
+        if self._synced_at is None or set(self.vectorstore.get(include=[])["ids"]) != set(self.docs):
+            self.rebuild()
+        else:
+            self._synced_at = time.monotonic()
+
+    def search(self, query: str, k: int, exclude_file_ids: Iterable[int] = ()) -> List[Tuple[Document, float]]:
+        self.ensure_synced()
+        return super().search(query, k, exclude_file_ids)
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Document]], k: int = 60) -> List[Document]:
+    """Fuse ranked lists by summing 1 / (k + rank) per document."""
+    scores: Dict[str, float] = defaultdict(float)
+    docs: Dict[str, Document] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = doc.id or doc.page_content
+            scores[key] += 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)]
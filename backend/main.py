@@ -1,25 +1,84 @@
 import os
+import asyncio
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from pydantic_models import QueryInput, QueryResponse, DocumentInfo, DeleteFileRequest
-from db_utils import insert_chat_history, get_chat_history, get_all_documents, insert_document_record, delete_document_record
-from documents_loaders import index_document_to_chroma, delete_doc_from_chroma
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic_models import QueryInput, QueryResponse, DocumentInfo, DeleteFileRequest, DeleteFilesRequest
+from db_utils import (ainsert_chat_history, aget_chat_history, aget_all_sessions, get_all_documents,
+                      delete_document_record, delete_document_records, document_exists)
+from documents_loaders import delete_doc_from_chroma, delete_docs_from_chroma, embedding_function
 from agent import agent
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk
 import logging
 import shutil
+import tempfile
+import threading
+import time
+import json
 from utils import get_or_create_session_id, history_to_lc_messages, append_message
-from langchain_utils import contextualise_chain
-from fastapi import UploadFile, File, HTTPException
-import sqlite3
+from session_store import create_session_store
+from answer_cache import answer_cache
+from web_search_cache import web_search_cache
+from intent_classifier import prerouter
+from nodes import RAG_GATE_STATS
+from ingestion_jobs import ingestion_queue
+from mcp_client import mcp_client
+from bulk_indexer import sync_directory
+from config import (INDEX_ON_STARTUP, METRICS_ENABLED, TRACE_ID_HEADER, STARTUP_WARMUP, PREWARM_CONNECTIONS,
+                    SESSION_PURGE_INTERVAL_SECONDS)
+from metrics import HTTP_SECONDS, current_trace_id, new_trace_id, render_metrics, stats_collector
+from cassette import record_turn
+from chat_turns import chat_turns
+from compaction import HistoryCompactor
+from contextualize import contextualizer
+from resources import Resource, registry
 
 
 logging.basicConfig(filename='app.log', level=logging.INFO)
-app = FastAPI()
 load_dotenv(override=True)
-DB_PATH = "rag_app.db"
-SESSION_STORE: dict[str, dict] = {}
 
+async def purge_sessions_periodically(interval: float):
+    """Delete sessions idle past SESSION_TTL_SECONDS (the SQLite tier never expires them on its own)."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            purged = await asyncio.to_thread(session_store().purge_expired)
+            if purged:
+                logging.info(f"🧹 Purged {purged} expired sessions")
+        except Exception as e:
+            logging.warning(f"⚠️ Purging expired sessions failed: {e!r}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup: MCP outbox, optional bulk indexing, resource warm-up and session purging. Shutdown: close what was built."""
+    # Deliver MCP calls queued while the server was down
+    mcp_client().start()
+    if INDEX_ON_STARTUP:
+        # Index new or changed files in DOC_SOURCE_DIR without delaying startup
+        threading.Thread(target=sync_directory, name="bulk-index", daemon=True).start()
+
+    warmup = None
+    if STARTUP_WARMUP == "blocking":
+        await registry.startup(connect=PREWARM_CONNECTIONS)
+    elif STARTUP_WARMUP == "background":
+        # the port opens at once; /readyz reports 503 until the warm-up is done
+        warmup = asyncio.create_task(registry.startup(connect=PREWARM_CONNECTIONS))
+    else:
+        registry.started = True
+    purge = (asyncio.create_task(purge_sessions_periodically(SESSION_PURGE_INTERVAL_SECONDS))
+             if SESSION_PURGE_INTERVAL_SECONDS > 0 else None)
+    try:
+        yield
+    finally:
+        if warmup is not None and not warmup.done():
+            warmup.cancel()
+        if purge is not None:
+            purge.cancel()
+        await compactor.aclose()
+        await registry.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 # @app.post("/chat", response_model=QueryResponse)
 # async def chat(query_input: QueryInput):
 #     """Endpoint to handle chat queries."""
@@ -62,103 +121,232 @@ SESSION_STORE: dict[str, dict] = {}
 #         logging.error(f"Error in chat: {str(e)}")
 #         raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
 
-SESSION_STORE: dict[str, dict] = {}
+session_store = registry.register("session_store", create_session_store)
 
-def get_state(session_id):
-    return SESSION_STORE.setdefault(session_id, {"messages": []})
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    """Time each request by route template and echo a trace id (caller's or new) on the response."""
+    trace_id = None
+    if TRACE_ID_HEADER:
+        trace_id = (request.headers.get(TRACE_ID_HEADER) or "")[:64] or new_trace_id()
+    token = current_trace_id.set(trace_id)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        current_trace_id.reset(token)
+        if METRICS_ENABLED:
+            route = request.scope.get("route")
+            path = getattr(route, "path", "unmatched")  # templates, not raw paths, to bound label values
+            HTTP_SECONDS.labels(request.method, path, str(status)).observe(time.perf_counter() - started)
+    if trace_id:
+        response.headers[TRACE_ID_HEADER] = trace_id
+    return response
 
-def save_state(session_id, state):
-    SESSION_STORE[session_id] = state
+async def get_state(session_id):
+    """Session state, rebuilt from the chat history when the store no longer has it (expired, restarted)."""
+    state = await asyncio.to_thread(session_store().get, session_id)
+    if state is None:
+        state = {"messages": history_to_lc_messages(await aget_chat_history(session_id))}
+    return state
 
-@app.post("/chat", response_model=QueryResponse)
-async def chat(query_input: QueryInput):
-    session_id = get_or_create_session_id(query_input.session_id)
-    state = get_state(session_id)
+async def save_state(session_id, state):
+    await asyncio.to_thread(session_store().put, session_id, state)
 
-    user_input = query_input.question
-    state["messages"].append(HumanMessage(content=user_input))
+# summarizes old turns after the reply is out, under the same per-session lock as the turns
+compactor = HistoryCompactor(get_state, save_state, chat_turns.lock)
 
-    # ✅ If we were waiting for confirmation
-    if state.get("awaiting_confirmation"):
-        logging.info("🧠 Continuing interview confirmation flow")
-        result = await agent.ainvoke(state, start_at="interview")
-    else:
-        result = await agent.ainvoke(state)
+# results of the previous turn's nodes; a turn starts without them so its answer never sees stale context
+TURN_KEYS = ("rag", "web", "rag_sources", "rag_gate", "cache_key", "cached_answer")
 
-    save_state(session_id, result)
-    try:
-        # Load state for this session
-        state = get_state(session_id)
-        user_input = query_input.question
-
-        # 🧠 Handle ongoing interview
-        if state.get("awaiting_field"):
-            field = state["awaiting_field"]
-            state.setdefault("customer_data", {})[field] = user_input
-            state["awaiting_field"] = None
-            state["messages"].append(HumanMessage(content=user_input))
-            result = await agent.ainvoke(state, start_at="interview")
+def with_question(state, user_input, session_id):
+    """Copy of state with the question appended; the stored state stays untouched if the turn fails."""
+    state = {k: v for k, v in state.items() if k not in TURN_KEYS}
+    return {**state, "session_id": session_id,
+            "messages": append_message(state.get("messages") or [], HumanMessage(content=user_input))}
+
+# Nodes whose LLM tokens are forwarded to the client as they are generated
+STREAMED_NODES = {"answer", "interview"}
+
+async def run_graph(state, emit=None):
+    """One graph pass; with emit, node transitions and answer tokens are emitted as they happen."""
+    if emit is None:
+        return await agent.ainvoke(state)
+    result, current_node = state, "start"
+    async for mode, chunk in agent.astream(state, stream_mode=["messages", "updates", "values"]):
+        if mode == "values":
+            result = chunk
+            continue
+
+        if mode == "messages":
+            message, metadata = chunk
+            node = metadata.get("langgraph_node")
         else:
-            # Normal flow
-            chat_history = get_chat_history(session_id)
-            messages = history_to_lc_messages(chat_history)
-            messages = append_message(messages, HumanMessage(content=user_input))
-            result = await agent.ainvoke({"messages": messages})
-        
-        
+            message, node = None, next(iter(chunk), None)
+
+        if node and node != current_node:
+            emit("node", {"from": current_node, "to": node, "transition": f"{current_node}→{node}"})
+            current_node = node
+
+        # Only generated chunks are tokens; complete messages written to state are skipped
+        if isinstance(message, AIMessageChunk) and node in STREAMED_NODES and isinstance(message.content, str) and message.content:
+            emit("token", {"node": node, "content": message.content})
+    return result
+
+async def answer_turn(session_id, user_input, model, endpoint="/chat", emit=None) -> QueryResponse:
+    """One chat turn: a single graph pass on the session state, saved with the chat history."""
+    state = with_question(await get_state(session_id), user_input, session_id)
+    async with record_turn(session_id, user_input, endpoint):
+        # An interview in progress is routed back to the interview node by the router
+        result = await run_graph(state, emit)
 
         # Extract last AI message
         last_msg = next((m for m in reversed(result["messages"]) if isinstance(m, AIMessage)), None)
         answer = last_msg.content if last_msg else "I couldn't respond."
 
-        save_state(session_id, result)
-        insert_chat_history(session_id, user_input, answer, query_input.model.value)
-        logging.info(f"Session ID: {session_id}, AI Response: {answer}")
-
-        return QueryResponse(answer=answer, session_id=session_id, model=query_input.model)
+        await save_state(session_id, result)
+        await ainsert_chat_history(session_id, user_input, answer, model.value)
+    compactor.schedule(session_id, result)
+    logging.info(f"Session ID: {session_id}, AI Response: {answer}")
+    return QueryResponse(answer=answer, session_id=session_id, model=model)
 
+@app.post("/chat", response_model=QueryResponse)
+async def chat(query_input: QueryInput):
+    session_id = get_or_create_session_id(query_input.session_id)
+    user_input = query_input.question
+    try:
+        # one turn at a time per session; a duplicate of a queued or running submission shares its response
+        return await chat_turns.run(session_id, user_input, query_input.model.value,
+                                    lambda emit: answer_turn(session_id, user_input, query_input.model))
     except Exception as e:
         logging.exception("Error in chat")
         raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
 
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(query_input: QueryInput):
+    """Stream node transitions and answer tokens as Server-Sent Events.
+
+    A duplicate of a submission still in flight joins it: it replays the events
+    so far and follows the rest (only 'done' when the first was a /chat call).
+    """
+    session_id = get_or_create_session_id(query_input.session_id)
+    user_input = query_input.question
+
+    async def event_stream():
+        try:
+            async for event, data in chat_turns.stream(
+                    session_id, user_input, query_input.model.value,
+                    lambda emit: answer_turn(session_id, user_input, query_input.model, "/chat/stream", emit)):
+                if event == "result":
+                    yield sse_event("done", data.model_dump(mode="json"))
+                else:
+                    yield sse_event(event, data)
+        except Exception as e:
+            logging.exception("Error in chat stream")
+            yield sse_event("error", {"detail": f"Chat error: {str(e)}"})
 
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.get("/sessions")
-def get_sessions():
-    """Return all distinct session_ids from chat_history"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT session_id FROM chat_history ORDER BY id DESC;")
-    sessions = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return {"sessions": sessions}
-
-@app.post("/upload-doc")
-def upload_and_index_document(file: UploadFile = File(...)):
+async def get_sessions():
+    """Return all session_ids, most recently active first"""
+    return {"sessions": await aget_all_sessions()}
+
+def stats_of(res: Resource):
+    """stats() of a resource once it is built (None before, so a scrape never builds one)."""
+    def source():
+        value = res() if res.built else None
+        return value.stats() if hasattr(value, "stats") else None
+    return source
+
+# component counters, served as JSON by /stats and as rag_component_stat gauges by /metrics
+STATS_SOURCES = {
+    "answer_cache": stats_of(answer_cache),
+    "embedding_cache": stats_of(embedding_function),
+    "prerouter": lambda: prerouter.stats() if prerouter is not None else None,
+    "web_search_cache": stats_of(web_search_cache),
+    "mcp": stats_of(mcp_client),
+    "chat_turns": chat_turns.stats,
+    "compaction": compactor.stats,
+    "contextualizer": lambda: contextualizer.stats() if contextualizer is not None else None,
+    "rag_gate": lambda: {**RAG_GATE_STATS,
+                         "judge_skipped": sum(RAG_GATE_STATS.values()) - RAG_GATE_STATS["judge"]
+                                          - RAG_GATE_STATS["product_judge"]},
+}
+for _name, _source in STATS_SOURCES.items():
+    stats_collector.add(_name, _source)
+
+@app.get("/stats")
+def get_stats():
+    """Cache hit-rate and latency counters."""
+    return {name: source() for name, source in STATS_SOURCES.items()}
+
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: 503 until the startup warm-up has finished and every resource built."""
+    if registry.started:
+        registry.retry_failed()  # a resource that failed to build at startup may build now
+    status = registry.status()
+    if not registry.ready:
+        return JSONResponse(status_code=503, content={"status": "not_ready", **status})
+    return {"status": "ready", **status}
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text exposition: node/LLM/tool/HTTP latency, tokens, cost, errors, component counters."""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+def save_upload(file: UploadFile) -> str:
+    """Validate the extension and spool the upload to a temp file the ingestion worker removes."""
     allowed_extensions = ['.pdf', '.docx', '.html']
     file_extension = os.path.splitext(file.filename)[1].lower()
     
     if file_extension not in allowed_extensions:
         raise HTTPException(status_code=400, detail=f"Unsupported file type. Allowed types are: {', '.join(allowed_extensions)}")
     
-    temp_file_path = f"temp_{file.filename}"
-    
-    try:
-        # Save the uploaded file to a temporary file
-        with open(temp_file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        file_id = insert_document_record(file.filename)
-        success = index_document_to_chroma(temp_file_path, file_id)
-        
-        if success:
-            return {"message": f"File {file.filename} has been successfully uploaded and indexed.", "file_id": file_id}
-        else:
-            delete_document_record(file_id)
-            raise HTTPException(status_code=500, detail=f"Failed to index {file.filename}.")
-    finally:
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+    fd, temp_file_path = tempfile.mkstemp(prefix="upload_", suffix=file_extension)
+    with os.fdopen(fd, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+    return temp_file_path
+
+@app.post("/upload-doc", status_code=202)
+def upload_and_index_document(file: UploadFile = File(...)):
+    """Queue a document for background indexing and return its job id."""
+    temp_file_path = save_upload(file)
+    job = ingestion_queue.submit(temp_file_path, file.filename)
+    return {"message": f"File {file.filename} has been queued for indexing.", "job_id": job.id}
+
+@app.post("/replace-doc", status_code=202)
+def replace_document(file_id: int = Form(...), file: UploadFile = File(...)):
+    """Index a new version of a document and swap it in for file_id once it is fully indexed."""
+    if not document_exists(file_id):
+        raise HTTPException(status_code=404, detail=f"Unknown document {file_id}")
+    temp_file_path = save_upload(file)
+    job = ingestion_queue.submit(temp_file_path, file.filename, replaces=file_id)
+    return {"message": f"File {file.filename} has been queued to replace document {file_id}.", "job_id": job.id}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Progress, errors and timing of an ingestion job."""
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job.to_dict()
 
 @app.get("/list-docs", response_model=list[DocumentInfo])
 def list_documents():
@@ -172,9 +360,26 @@ def delete_document(request: DeleteFileRequest):
     if chroma_delete_success:
         # Then delete from the database
         db_delete_success = delete_document_record(request.file_id)
+        cache = answer_cache()
+        if cache is not None:
+            cache.invalidate_file(request.file_id)
         if db_delete_success:
             return {"message": f"Successfully deleted document with file_id {request.file_id} from the system."}
         else:
             return {"error": f"Deleted from Chroma but failed to delete document with file_id {request.file_id} from the database."}
     else:
-        return {"error": f"Failed to delete document with file_id {request.file_id} from Chroma."}
\ No newline at end of file
+        return {"error": f"Failed to delete document with file_id {request.file_id} from Chroma."}
+
+@app.post("/delete-docs")
+def delete_documents(request: DeleteFilesRequest):
+    """Delete several documents with one Chroma filter delete."""
+    file_ids = sorted(set(request.file_ids))
+    if not delete_docs_from_chroma(file_ids):
+        return {"error": f"Failed to delete documents with file_ids {file_ids} from Chroma."}
+
+    delete_document_records(file_ids)
+    cache = answer_cache()
+    if cache is not None:
+        for file_id in file_ids:
+            cache.invalidate_file(file_id)
+    return {"message": f"Successfully deleted {len(file_ids)} documents from the system.", "file_ids": file_ids}
@@ -0,0 +1,260 @@
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING, Any, NamedTuple, Optional
+from metrics import instrument_tool
+from cassette import recorded, mcp_key
+from resources import resource
+from config import (MCP_URL, MCP_CALL_TIMEOUT_SECONDS, MCP_CONNECT_TIMEOUT_SECONDS, MCP_MAX_RETRIES,
+                    MCP_BACKOFF_BASE_SECONDS, MCP_BACKOFF_MAX_SECONDS, MCP_OUTBOX_DB_PATH,
+                    MCP_OUTBOX_FLUSH_INTERVAL_SECONDS, MCP_DURABLE_TOOLS)
+
+if TYPE_CHECKING:  # fastmcp takes ~1.5 s to import; it is loaded when the first session opens
+    from fastmcp import Client
+
+
+def tool_message(result) -> str:
+    """User-facing message of a tool result (structured data first, then text content)."""
+    data = result.data if isinstance(result.data, dict) else {}
+    structured = result.structured_content or {}
+    return data.get("message") or structured.get("message") or (result.content[0].text if result.content else "")
+
+
+def tool_result_record(result) -> dict:
+    """The parts of a CallToolResult the backend reads, for cassettes."""
+    return {"data": result.data if isinstance(result.data, dict) else None,
+            "structured_content": result.structured_content, "text": tool_message(result)}
+
+
+class Delivery(NamedTuple):
+    result: Any       # CallToolResult, None when queued
+    queued: bool      # True when the call went to the outbox instead
+    outbox_id: Optional[int] = None
+
+
+class MCPOutbox:
+    """Durable SQLite queue of tool calls that could not reach the MCP server."""
+
+    def __init__(self, db_path: str = MCP_OUTBOX_DB_PATH):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS mcp_outbox
+                             (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                              tool TEXT NOT NULL,
+                              arguments TEXT NOT NULL,
+                              attempts INTEGER NOT NULL DEFAULT 0,
+                              last_error TEXT,
+                              created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        self.conn.commit()
+        self._lock = threading.Lock()
+
+    def put(self, tool: str, arguments: dict, error: str) -> int:
+        with self._lock:
+            cursor = self.conn.execute('INSERT INTO mcp_outbox (tool, arguments, last_error) VALUES (?, ?, ?)',
+                                       (tool, json.dumps(arguments, ensure_ascii=False), error))
+            self.conn.commit()
+            return cursor.lastrowid
+
+    def pending(self, limit: int = 100) -> list:
+        with self._lock:
+            rows = self.conn.execute('SELECT id, tool, arguments FROM mcp_outbox ORDER BY id LIMIT ?', (limit,)).fetchall()
+        return [(row_id, tool, json.loads(arguments)) for row_id, tool, arguments in rows]
+
+    def done(self, row_id: int) -> None:
+        with self._lock:
+            self.conn.execute('DELETE FROM mcp_outbox WHERE id = ?', (row_id,))
+            self.conn.commit()
+
+    def failed(self, row_id: int, error: str) -> None:
+        with self._lock:
+            self.conn.execute('UPDATE mcp_outbox SET attempts = attempts + 1, last_error = ? WHERE id = ?', (error, row_id))
+            self.conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.conn.execute('SELECT COUNT(*) FROM mcp_outbox').fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+
+class MCPClientManager:
+    """Process-wide MCP client that keeps one initialized session open.
+
+    The session is opened on first use and reused by every call (MCP
+    multiplexes concurrent requests over it). Connection failures drop the
+    session and reconnect with exponential backoff; while the server is
+    known to be down, durable tools (MCP_DURABLE_TOOLS) go straight to the
+    outbox, which a background task flushes once the server is back.
+    """
+
+    def __init__(self, url: str = MCP_URL, outbox: Optional[MCPOutbox] = None,
+                 call_timeout: float = MCP_CALL_TIMEOUT_SECONDS, connect_timeout: float = MCP_CONNECT_TIMEOUT_SECONDS,
+                 max_retries: int = MCP_MAX_RETRIES, backoff_base: float = MCP_BACKOFF_BASE_SECONDS,
+                 backoff_max: float = MCP_BACKOFF_MAX_SECONDS, flush_interval: float = MCP_OUTBOX_FLUSH_INTERVAL_SECONDS):
+        self.url = url
+        self.outbox = outbox if outbox is not None else MCPOutbox()
+        self.call_timeout = call_timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.flush_interval = flush_interval
+        self._client: Optional["Client"] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._failures = 0
+        self._down_until = 0.0
+        self._flusher: Optional[asyncio.Task] = None
+        self.counters = {"calls": 0, "connects": 0, "reconnects": 0, "retries": 0, "queued": 0, "flushed": 0}
+
+    def _backoff(self) -> float:
+        delay = min(self.backoff_max, self.backoff_base * 2 ** max(self._failures - 1, 0))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _session(self) -> "Client":
+        from fastmcp import Client
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:  # sessions are bound to the loop that opened them
+            self._client, self._loop, self._connect_lock = None, loop, asyncio.Lock()
+        if self._client is not None and self._client.is_connected():
+            return self._client
+        async with self._connect_lock:
+            if self._client is not None and self._client.is_connected():
+                return self._client
+            client = Client(self.url, timeout=self.call_timeout, init_timeout=self.connect_timeout)
+            await asyncio.wait_for(client.__aenter__(), self.connect_timeout)
+            self.counters["reconnects" if self.counters["connects"] else "connects"] += 1
+            logging.info(f"🔌 MCP session opened to {self.url}")
+            self._client = client
+            return client
+
+    async def _drop_session(self) -> None:
+        client, self._client = self._client, None
+        if client is not None:
+            try:
+                await client.__aexit__(None, None, None)
+            except Exception:
+                pass
+
+    @instrument_tool("mcp")
+    @recorded("mcp", key=lambda self, name, arguments: mcp_key(name, arguments), serialize=tool_result_record)
+    async def call_tool(self, name: str, arguments: dict):
+        """Call a tool on the shared session, retrying connection failures with backoff.
+
+        Tool errors (bad arguments, server-side exceptions) are raised at once.
+        A timed-out call may still have been applied by the server, so tools
+        that write must be idempotent on the request_id deliver() adds.
+        """
+        from fastmcp.exceptions import ToolError
+
+        self.counters["calls"] += 1
+        if time.monotonic() < self._down_until:
+            raise ConnectionError(f"MCP server {self.url} is unavailable (backing off)")
+
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_retries):
+            if attempt:
+                self.counters["retries"] += 1
+                await asyncio.sleep(self._backoff())
+            try:
+                client = await self._session()
+                result = await client.call_tool(name, arguments, timeout=self.call_timeout)
+                self._failures = 0
+                self._down_until = 0.0
+                return result
+            except ToolError:
+                raise
+            except Exception as e:
+                last_error = e
+                self._failures += 1
+                logging.warning(f"⚠️ MCP call {name} failed (attempt {attempt + 1}/{self.max_retries}): {e!r}")
+                await self._drop_session()
+
+        self._down_until = time.monotonic() + self._backoff()
+        raise ConnectionError(f"MCP server {self.url} unreachable: {last_error!r}") from last_error
+
+    async def deliver(self, name: str, arguments: dict) -> Delivery:
+        """call_tool for durable tools: queue the call in the outbox when the server is down.
+
+        Durable calls carry a request_id idempotency key, kept by retries and the
+        outbox, so the server stores a call whose reply was lost only once.
+        """
+        if name not in MCP_DURABLE_TOOLS:
+            return Delivery(await self.call_tool(name, arguments), False)
+        arguments = {**arguments, "request_id": arguments.get("request_id") or uuid.uuid4().hex}
+        try:
+            result = await self.call_tool(name, arguments)
+        except ConnectionError as e:
+            outbox_id = await asyncio.to_thread(self.outbox.put, name, arguments, str(e))
+            self.counters["queued"] += 1
+            logging.warning(f"📮 MCP call {name} queued in outbox as #{outbox_id}")
+            self.start()
+            return Delivery(None, True, outbox_id)
+        self.start()
+        return Delivery(result, False)
+
+    async def flush_outbox(self) -> int:
+        """Deliver queued calls in order; stops at the first connection failure."""
+        from fastmcp.exceptions import ToolError
+
+        delivered = 0
+        for row_id, name, arguments in await asyncio.to_thread(self.outbox.pending):
+            try:
+                await self.call_tool(name, arguments)
+            except ToolError as e:
+                # rejected by the server: retrying cannot help, so log the payload and drop it
+                logging.error(f"MCP outbox #{row_id} {name}({arguments}) rejected by server: {e}")
+                await asyncio.to_thread(self.outbox.done, row_id)
+                continue
+            except ConnectionError as e:
+                await asyncio.to_thread(self.outbox.failed, row_id, str(e))
+                break
+            await asyncio.to_thread(self.outbox.done, row_id)
+            delivered += 1
+        if delivered:
+            self.counters["flushed"] += delivered
+            logging.info(f"📬 Flushed {delivered} queued MCP calls")
+        return delivered
+
+    async def _flush_loop(self) -> None:
+        while True:
+            if await asyncio.to_thread(len, self.outbox):
+                await self.flush_outbox()
+            await asyncio.sleep(self.flush_interval)
+
+    def start(self) -> None:
+        """Start the outbox flusher on the running loop (idempotent)."""
+        if self._flusher is None or self._flusher.done() or self._flusher.get_loop() is not asyncio.get_running_loop():
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self._drop_session()
+
+    def stats(self) -> dict:
+        return {**self.counters, "connected": bool(self._client and self._client.is_connected()),
+                "outbox_pending": len(self.outbox)}
+
+
+async def open_session(client: MCPClientManager) -> None:
+    await client._session()
+
+
+async def close_client(client: MCPClientManager) -> None:
+    await client.close()
+    await asyncio.to_thread(client.outbox.close)
+
+
+@resource("mcp_client", connect=open_session, close=close_client)
+def mcp_client() -> MCPClientManager:
+    return MCPClientManager()
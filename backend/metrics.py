@@ -0,0 +1,174 @@
+"""Prometheus metrics for graph nodes, LLM calls, tool calls and HTTP requests.
+
+Node timings come from wrapnode.wrap_node, LLM timings/tokens/cost from
+llm_metrics (a callback handler attached to every ChatOpenAI instance), and
+tool timings from @instrument_tool. Cache and client counters that already
+live in the components' stats() are exported at scrape time by
+StatsCollector, so they are never counted twice. GET /metrics serves it all.
+"""
+import functools
+import logging
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from config import METRICS_ENABLED, LLM_PRICES_USD_PER_1M_TOKENS
+
+# node currently executing (set by wrap_node) and the request's trace id (set by the HTTP middleware)
+current_node: ContextVar[str] = ContextVar("current_node", default="none")
+current_trace_id: ContextVar[Optional[str]] = ContextVar("current_trace_id", default=None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+NODE_SECONDS = Histogram("rag_node_duration_seconds", "Graph node wall time", ["node", "route"],
+                         buckets=LATENCY_BUCKETS)
+NODE_ERRORS = Counter("rag_node_errors_total", "Graph node exceptions", ["node"])
+LLM_SECONDS = Histogram("rag_llm_duration_seconds", "LLM call wall time", ["model", "node"], buckets=LATENCY_BUCKETS)
+LLM_TOKENS = Counter("rag_llm_tokens_total", "LLM tokens", ["model", "node", "kind"])  # kind: prompt | completion
+LLM_COST = Counter("rag_llm_cost_usd_total", "Estimated LLM cost from LLM_PRICES_USD_PER_1M_TOKENS", ["model", "node"])
+LLM_ERRORS = Counter("rag_llm_errors_total", "LLM call exceptions", ["model", "node"])
+TOOL_SECONDS = Histogram("rag_tool_duration_seconds", "Tool / external call wall time", ["tool", "node"],
+                         buckets=LATENCY_BUCKETS)
+TOOL_ERRORS = Counter("rag_tool_errors_total", "Tool / external call exceptions", ["tool", "node"])
+HTTP_SECONDS = Histogram("rag_http_request_duration_seconds", "HTTP request wall time", ["method", "path", "status"],
+                         buckets=LATENCY_BUCKETS)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+def llm_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prices = LLM_PRICES_USD_PER_1M_TOKENS.get(model)
+    if prices is None:  # dated snapshots, e.g. gpt-4.1-mini-2025-04-14
+        prices = next((p for name, p in sorted(LLM_PRICES_USD_PER_1M_TOKENS.items(), key=lambda kv: -len(kv[0]))
+                       if model.startswith(name)), None)
+    if prices is None:
+        return 0.0
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """Callback handler recording latency, token usage, cost and errors of each LLM call."""
+
+    run_inline = True  # cheap bookkeeping; keep it on the caller's task and context
+
+    def __init__(self):
+        self._runs: Dict[UUID, tuple] = {}
+
+    def _start(self, run_id: UUID, metadata: Optional[dict], kwargs: dict) -> None:
+        params = kwargs.get("invocation_params") or {}
+        model = (metadata or {}).get("ls_model_name") or params.get("model") or params.get("model_name") or "unknown"
+        node = current_node.get()
+        if node == "none":
+            node = (metadata or {}).get("langgraph_node", "none")
+        self._runs[run_id] = (model, node, time.perf_counter())
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs) -> None:
+        self._start(run_id, metadata, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs) -> None:
+        self._start(run_id, metadata, kwargs)
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        model, node, started = run
+        if model == "unknown":
+            model = response_model_name(response) or model
+        LLM_SECONDS.labels(model, node).observe(time.perf_counter() - started)
+        prompt_tokens, completion_tokens = token_usage(response)
+        LLM_TOKENS.labels(model, node, "prompt").inc(prompt_tokens)
+        LLM_TOKENS.labels(model, node, "completion").inc(completion_tokens)
+        LLM_COST.labels(model, node).inc(llm_cost(model, prompt_tokens, completion_tokens))
+
+    def on_llm_error(self, error: BaseException, *, run_id, **kwargs) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            LLM_ERRORS.labels(run[0], run[1]).inc()
+
+
+def token_usage(response: LLMResult) -> tuple:
+    """(prompt, completion) tokens from the provider's token_usage or the message usage_metadata."""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0) or 0, usage.get("completion_tokens", 0) or 0
+    prompt = completion = 0
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt += metadata.get("input_tokens", 0)
+            completion += metadata.get("output_tokens", 0)
+    return prompt, completion
+
+
+def response_model_name(response: LLMResult) -> Optional[str]:
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "response_metadata", None) or {}
+            if metadata.get("model_name"):
+                return metadata["model_name"]
+    return None
+
+
+llm_metrics = LLMMetricsHandler()
+
+
+def instrument_tool(tool: str) -> Callable:
+    """Time an async function as an external/tool call and count its exceptions."""
+    def decorator(fn):
+        if not METRICS_ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            node = current_node.get()
+            try:
+                return await fn(*args, **kwargs)
+            except Exception:
+                TOOL_ERRORS.labels(tool, node).inc()
+                raise
+            finally:
+                TOOL_SECONDS.labels(tool, node).observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+class StatsCollector:
+    """Exports the numeric fields of components' stats() dicts as rag_component_stat{component, stat}."""
+
+    def __init__(self):
+        self.sources: Dict[str, Callable[[], Optional[dict]]] = {}
+
+    def add(self, component: str, stats: Callable[[], Optional[dict]]) -> None:
+        self.sources[component] = stats
+
+    def collect(self):
+        family = GaugeMetricFamily("rag_component_stat", "Counters reported by cache / client stats()",
+                                   labels=["component", "stat"])
+        for component, stats in self.sources.items():
+            try:
+                values = stats() or {}
+            except Exception as e:
+                logging.warning(f"⚠️ stats() of {component} failed: {e!r}")
+                continue
+            for stat, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    family.add_metric([component, stat], float(value))
+        yield family
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def render_metrics() -> tuple:
+    """(body, content type) of the Prometheus text exposition."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -1,11 +1,56 @@
-from typing import Literal
+from collections import Counter
+from typing import Literal, Optional, Tuple
+import asyncio
+import logging
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from shared import AgentState, router_llm, judge_llm, answer_llm, RouteDecision, RagJudge
-from tools import rag_search_tool, web_search_tool
+from tools import search_kb, web_search_tool, KBSearchResult
+from answer_cache import answer_cache
+from intent_classifier import prerouter
+from contextualize import contextualizer
+from history import history_for_prompt
+from utils import match_product_name
+from config import (SPECULATE_ON_PRODUCT_MATCH, RAG_ACCEPT_THRESHOLD, RAG_REJECT_THRESHOLD,
+                    ROUTER_HISTORY_BUDGET, ANSWER_HISTORY_BUDGET)
+
+# How each retrieval was judged: accept/reject by score, empty KB result, or the LLM judge
+# ('product_judge': judged despite a low dense score because BM25 found the named product's brochure)
+RAG_GATE_STATS: Counter = Counter()
 
 # Routing Node
-def router_node(state: AgentState) -> AgentState:
-    # Use full message history with a system prompt
+async def router_node(state: AgentState) -> AgentState:
+    out = {"messages": state["messages"], "cache_key": None, "cached_answer": None}
+
+    # An interview in progress goes straight back to the interview node
+    if state.get("awaiting_field") or state.get("awaiting_confirmation"):
+        return {**out, "route": "interview"}
+
+    # A follow-up question is rewritten for retrieval while the router decides whether to retrieve at all
+    if contextualizer is not None:
+        contextualizer.start(state)
+    try:
+        out = await route_question(state, out)
+    except BaseException:
+        if contextualizer is not None:
+            contextualizer.discard(state)
+        raise
+    if contextualizer is not None and out["route"] != "rag":
+        contextualizer.discard(state)
+    return out
+
+async def route_question(state: AgentState, out: AgentState) -> AgentState:
+    # Local fast path: skip the LLM router when the pre-router is confident
+    humans = [m.content for m in state["messages"] if isinstance(m, HumanMessage)]
+    last_human = humans[-1] if humans else ""
+    has_history = len(humans) > 1 or bool(state.get("history_summary"))
+    decision = prerouter.classify(last_human, has_history) if prerouter is not None else None
+    if decision is not None:
+        logging.info(f"⚡ Pre-routed to '{decision.route}' by {decision.source} ({decision.confidence:.2f})")
+        if decision.route == "end":
+            return {**out, "route": "end", "messages": state["messages"] + [AIMessage(content=decision.reply)]}
+        return {**out, "route": decision.route}
+
+    # Recent history within the router budget, older turns via the rolling summary
     system_prompt = (
         "You are a router that decides how to handle user queries:\n"
         "- Use 'end' for pure greetings/small-talk (also provide a 'reply') and answer that is already in the current conversation chat history\n"
@@ -14,22 +59,16 @@ def router_node(state: AgentState) -> AgentState:
         "- Use 'interview' when the user expresses interest in buying, applying for, "
         "or asking about a product, service, or offer — where you should collect user details."
     )
-    messages = [SystemMessage(content=system_prompt)] + state["messages"]
-    result: RouteDecision = router_llm.invoke(messages)
+    messages = [SystemMessage(content=system_prompt)] + history_for_prompt(state, ROUTER_HISTORY_BUDGET)
+    result: RouteDecision = await router_llm().ainvoke(messages)
 
-    out = {"messages": state["messages"], "route": result.route}
+    out = {**out, "route": result.route}
     if result.route == "end":
         out["messages"] = state["messages"] + [AIMessage(content=result.reply or "Hello!")]
     return out
 
-# RAG Lookup Node
-def rag_node(state: AgentState) -> AgentState:
-    query = next((m.content for m in reversed(state["messages"])
-                  if isinstance(m, HumanMessage)), "")
-
-    chunks = rag_search_tool.invoke({"query": query})
-
-    # Corrective Judge
+# Corrective Judge
+async def judge_retrieval(query: str, chunks: str) -> bool:
     judge_messages = [
         ("system", (
             "You are a judge evaluating if the retrieved information is sufficient "
@@ -38,23 +77,114 @@ def rag_node(state: AgentState) -> AgentState:
         ("user", f"Question: {query}\n\nRetrieved info: {chunks}\n\nIs this sufficient to answer the question?")
     ]
 
-    verdict: RagJudge = judge_llm.invoke(judge_messages)
+    verdict: RagJudge = await judge_llm().ainvoke(judge_messages)
+    return verdict.sufficient
+
+async def gate_retrieval(query: str, result: KBSearchResult) -> Tuple[bool, str]:
+    """Score gate in front of the judge: only grey-zone retrievals pay for judge_llm.
+
+    A dense score below the reject threshold still goes to the judge when BM25
+    found the brochure of the product the question names; dense embeddings
+    score exact Thai product names poorly.
+    """
+    if not result.chunks or result.chunks.startswith("RAG_ERROR::"):
+        sufficient, gate = False, "empty"
+    elif result.score is not None and result.score >= RAG_ACCEPT_THRESHOLD:
+        sufficient, gate = True, "accept"
+    elif result.score is not None and result.score < RAG_REJECT_THRESHOLD and result.product_match:
+        sufficient, gate = await judge_retrieval(query, result.chunks), "product_judge"
+    elif result.score is not None and result.score < RAG_REJECT_THRESHOLD:
+        sufficient, gate = False, "reject"
+    else:
+        sufficient, gate = await judge_retrieval(query, result.chunks), "judge"
+
+    RAG_GATE_STATS[gate] += 1
+    logging.info(f"⚖️ Retrieval gate '{gate}' (score={result.score}) → {'answer' if sufficient else 'web'}")
+    return sufficient, gate
+
+async def cached_answer_for(query: str) -> Optional[str]:
+    cache = answer_cache()
+    if cache is None:
+        return None
+    hit = await cache.alookup(query)
+    return hit.answer if hit else None
+
+async def search_query(state: AgentState) -> str:
+    """The question to search and cache under: the standalone rewrite of a follow-up, else the question itself."""
+    if contextualizer is not None:
+        return await contextualizer.standalone_question(state)
+    return next((m.content for m in reversed(state["messages"])
+                 if isinstance(m, HumanMessage)), "")
+
+# RAG Lookup Node
+async def rag_node(state: AgentState) -> AgentState:
+    query = await search_query(state)
+
+    cached = await cached_answer_for(query)
+    if cached is not None:
+        return {**state, "cached_answer": cached, "route": "answer"}
+
+    result = await search_kb(query)
+    sufficient, gate = await gate_retrieval(query, result)
 
     return {
         **state,
-        "rag": chunks,
-        "route": "answer" if verdict.sufficient else "web"
+        "rag": result.chunks,
+        "rag_sources": result.file_ids,
+        "rag_gate": gate,
+        "web": None,
+        "cache_key": query,
+        "route": "answer" if sufficient else "web"
     }
 
+def should_speculate(query: str) -> bool:
+    """Cost guard: skip speculative web search for queries naming a catalog product."""
+    return SPECULATE_ON_PRODUCT_MATCH or match_product_name(query) is None
+
+# Speculative RAG Lookup Node: web search runs concurrently with retrieval + judge
+async def speculative_rag_node(state: AgentState) -> AgentState:
+    query = await search_query(state)
+    if not should_speculate(query):
+        return await rag_node(state)
+
+    cached = await cached_answer_for(query)
+    if cached is not None:
+        return {**state, "cached_answer": cached, "route": "answer"}
+
+    web_task = asyncio.create_task(web_search_tool.ainvoke({"query": query}))
+    try:
+        result = await search_kb(query)
+        sufficient, gate = await gate_retrieval(query, result)
+    except BaseException:
+        web_task.cancel()
+        raise
+
+    out = {**state, "rag": result.chunks, "rag_sources": result.file_ids, "rag_gate": gate,
+           "web": None, "cache_key": query, "route": "answer"}
+    if sufficient:
+        web_task.cancel()
+        logging.info("🔮 Speculative web search discarded (KB sufficient)")
+        return out
+
+    logging.info("🔮 Speculative web search used (KB insufficient)")
+    out["web"] = await web_task
+    return out
+
 # Web Search Node
-def web_node(state: AgentState) -> AgentState:
-    query = next((m.content for m in reversed(state["messages"])
-                  if isinstance(m, HumanMessage)), "")
-    snippets = web_search_tool.invoke({"query": query})
+async def web_node(state: AgentState) -> AgentState:
+    query = await search_query(state)
+    snippets = await web_search_tool.ainvoke({"query": query})
     return {**state, "web": snippets, "route": "answer"}
 
 # Answer Generation Node
-def answer_node(state: AgentState) -> AgentState:
+async def answer_node(state: AgentState) -> AgentState:
+    if state.get("cached_answer"):
+        return {
+            **state,
+            "cached_answer": None,
+            "messages": state["messages"] + [AIMessage(content=state["cached_answer"])]
+        }
+
     user_q = next((m.content for m in reversed(state["messages"])
                    if isinstance(m, HumanMessage)), "")
 
@@ -74,10 +204,16 @@ Context:
 {context}
 
 Provide a helpful, accurate, and concise response based on the available information."""
-    messages = state["messages"] + [HumanMessage(content=prompt)]
-    ans = answer_llm.invoke(messages).content
+    # The prompt restates the question, so it is left out of the history
+    messages = history_for_prompt(state, ANSWER_HISTORY_BUDGET, exclude_last_human=True) + [HumanMessage(content=prompt)]
+    ans = (await answer_llm().ainvoke(messages)).content
+
+    cache = answer_cache()
+    if cache is not None and state.get("cache_key"):
+        await cache.astore(state["cache_key"], ans, state.get("rag_sources") or [],
+                           used_web=bool(state.get("web")))
 
     return {
         **state,
         "messages": state["messages"] + [AIMessage(content=ans)]
-    }
\ No newline at end of file
+    }
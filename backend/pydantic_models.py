@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
 from enum import Enum
 from datetime import datetime
+from typing import List, Optional
 
 class ModelName(str, Enum):
     GPT4_1 = "gpt-4.1"
@@ -23,6 +24,9 @@ class DocumentInfo(BaseModel):
 
 class DeleteFileRequest(BaseModel):
     file_id: int
+
+class DeleteFilesRequest(BaseModel):
+    file_ids: List[int] = Field(..., min_length=1)
     
 class ProductInterest(BaseModel):
     """Structured product interest data."""
@@ -31,4 +35,13 @@ class ProductInterest(BaseModel):
     occupation: str = Field(..., description="Customer occupation")
     income: int = Field(..., description="Customer monthly income")
     product_name: str = Field(..., description="Customer product of interest")
-    memo: str = Field("", description="Extra notes from customer")
\ No newline at end of file
+    memo: str = Field("", description="Extra notes from customer")
+
+class ProductInterestSlots(BaseModel):
+    """ProductInterest fields stated in one customer message; null when not stated."""
+    name: Optional[str] = Field(None, description="Customer name")
+    age: Optional[int] = Field(None, description="Customer age")
+    occupation: Optional[str] = Field(None, description="Customer occupation")
+    income: Optional[int] = Field(None, description="Customer monthly income")
+    product_name: Optional[str] = Field(None, description="Customer product of interest")
+    memo: Optional[str] = Field(None, description="Extra notes from customer")
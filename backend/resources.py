@@ -0,0 +1,211 @@
+"""Lazily built process-wide resources (models, vector store, caches, clients).
+
+Modules declare their heavy singletons with @resource instead of building
+them at import time, and call them where they are used:
+
+    @resource("vectorstore", prewarm=lambda store: store.get(limit=1, include=[]))
+    def vectorstore():
+        return Chroma(...)
+
+    vectorstore().similarity_search(...)
+
+The first call builds the instance (thread-safe, once) and later calls
+return it. main's lifespan calls registry.startup() to build and prewarm
+everything before traffic arrives and registry.shutdown() to close what
+was built. Tests and benches swap an instance with override().
+"""
+import asyncio
+import inspect
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Generic, List, Optional, TypeVar
+
+T = TypeVar("T")
+Hook = Callable[[Any], Any]
+
+_UNSET = object()
+
+
+async def _run_hook(hook: Hook, value: Any) -> None:
+    """Await async hooks; run sync ones in a worker thread so they never block the loop."""
+    if inspect.iscoroutinefunction(hook):
+        await hook(value)
+    else:
+        result = await asyncio.to_thread(hook, value)
+        if inspect.isawaitable(result):
+            await result
+
+
+class Resource(Generic[T]):
+    """A singleton built by factory on first call.
+
+    prewarm runs local warm-up (open files, load indexes) and connect opens
+    network connections; both only run from Registry.startup. close releases
+    the instance on shutdown (default: its own close() method, if any).
+    error is the last build failure, cleared by a later successful build;
+    prewarm_error only means the instance started cold.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], T], close: Optional[Hook] = None,
+                 prewarm: Optional[Hook] = None, connect: Optional[Hook] = None):
+        self.name = name
+        self.factory = factory
+        self.close_hook = close
+        self.prewarm = prewarm
+        self.connect = connect
+        self.build_ms: Optional[float] = None
+        self.error: Optional[str] = None
+        self.prewarm_error: Optional[str] = None
+        self.failed_at: Optional[float] = None
+        self._value: Any = _UNSET
+        self._lock = threading.Lock()
+        self._on_build: Callable[["Resource"], None] = lambda res: None
+
+    def __call__(self) -> T:
+        value = self._value
+        if value is not _UNSET:
+            return value
+        with self._lock:
+            if self._value is _UNSET:
+                started = time.perf_counter()
+                try:
+                    self._value = self.factory()
+                except Exception as e:
+                    self.error = repr(e)
+                    self.failed_at = time.monotonic()
+                    raise
+                self.build_ms = (time.perf_counter() - started) * 1000
+                self.error = None
+                self._on_build(self)
+                logging.info(f"🧱 Built {self.name} in {self.build_ms:.0f} ms")
+            return self._value
+
+    @property
+    def built(self) -> bool:
+        return self._value is not _UNSET
+
+    def override(self, value: T) -> None:
+        """Use value instead of building (tests, benches, stand-ins)."""
+        with self._lock:
+            self._value = value
+            self._on_build(self)
+
+    def reset(self) -> None:
+        """Forget the instance; the next call builds a new one."""
+        with self._lock:
+            self._value = _UNSET
+            self.build_ms = None
+
+    async def aclose(self) -> None:
+        if not self.built:
+            return
+        value = self._value
+        hook = self.close_hook or (lambda v: getattr(v, "close", lambda: None)())
+        if value is not None:
+            await _run_hook(hook, value)
+        self.reset()
+
+
+class Registry:
+    """The process's resources, in declaration order, with lifespan startup/shutdown."""
+
+    def __init__(self):
+        self.resources: Dict[str, Resource] = {}
+        self._build_order: List[Resource] = []
+        self._order_lock = threading.Lock()
+        self.started = False
+        self.warm = False
+        self.warmup_ms: Optional[float] = None
+
+    def register(self, name: str, factory: Callable[[], T], **hooks) -> Resource[T]:
+        if name in self.resources:
+            raise ValueError(f"Resource {name} is already registered")
+        res = Resource(name, factory, **hooks)
+        res._on_build = self._built
+        self.resources[name] = res
+        return res
+
+    def _built(self, res: Resource) -> None:
+        with self._order_lock:
+            if res not in self._build_order:
+                self._build_order.append(res)
+
+    def __getitem__(self, name: str) -> Resource:
+        return self.resources[name]
+
+    async def startup(self, connect: bool = False) -> None:
+        """Build every resource and run its prewarm (and connect) hooks.
+
+        Build failures keep the registry from reporting ready until the
+        resource builds (on first use or retry_failed). A failed prewarm only
+        leaves the built resource cold, so it is recorded apart and the
+        registry is not warm; connect failures are only logged since those
+        connections are reopened on first use anyway.
+        """
+        started = time.perf_counter()
+        for res in list(self.resources.values()):
+            try:
+                value = await asyncio.to_thread(res)
+            except Exception as e:
+                logging.error(f"❌ Building {res.name} failed: {e!r}")
+                continue
+            if res.prewarm is not None and value is not None:
+                try:
+                    await _run_hook(res.prewarm, value)
+                    res.prewarm_error = None
+                except Exception as e:
+                    res.prewarm_error = repr(e)
+                    logging.warning(f"⚠️ Prewarm of {res.name} failed, it starts cold: {e!r}")
+            if connect and res.connect is not None and value is not None:
+                try:
+                    await _run_hook(res.connect, value)
+                except Exception as e:
+                    logging.warning(f"⚠️ Could not pre-open connections of {res.name}: {e!r}")
+        self.warmup_ms = (time.perf_counter() - started) * 1000
+        self.started = True
+        self.warm = not any(res.prewarm_error for res in self.resources.values())
+        logging.info(f"🔥 Resources warmed up in {self.warmup_ms:.0f} ms")
+
+    async def shutdown(self) -> None:
+        """Close built resources, most recently built first."""
+        with self._order_lock:
+            order, self._build_order = list(reversed(self._build_order)), []
+        for res in order:
+            try:
+                await res.aclose()
+            except Exception as e:
+                logging.warning(f"⚠️ Closing {res.name} failed: {e!r}")
+        self.started = self.warm = False
+
+    def retry_failed(self, min_interval: float = 30.0) -> None:
+        """Build again the resources whose last build failed at least min_interval seconds ago."""
+        for res in list(self.resources.values()):
+            if res.error and time.monotonic() - (res.failed_at or 0.0) >= min_interval:
+                try:
+                    res()
+                except Exception as e:
+                    logging.warning(f"⚠️ Rebuilding {res.name} failed: {e!r}")
+
+    @property
+    def ready(self) -> bool:
+        """Startup finished (with or without warm-up) and no resource is left unbuilt by a failure."""
+        return self.started and not any(res.error for res in self.resources.values())
+
+    def status(self) -> dict:
+        return {"started": self.started, "warm": self.warm,
+                "warmup_ms": round(self.warmup_ms, 1) if self.warmup_ms is not None else None,
+                "resources": {name: {"built": res.built,
+                                     "build_ms": round(res.build_ms, 1) if res.build_ms is not None else None,
+                                     "error": res.error, "prewarm_error": res.prewarm_error}
+                              for name, res in self.resources.items()}}
+
+
+registry = Registry()
+
+
+def resource(name: str, **hooks) -> Callable[[Callable[[], T]], Resource[T]]:
+    """Register the decorated factory as a lazily built resource."""
+    def decorator(factory: Callable[[], T]) -> Resource[T]:
+        return registry.register(name, factory, **hooks)
+    return decorator
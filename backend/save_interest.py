@@ -1,8 +1,6 @@
-from fastmcp import Client
 from langchain_core.messages import HumanMessage, AIMessage
 from pydantic_models import ProductInterest
-
-MCP_URL = "http://localhost:8080/mcp"
+from mcp_client import mcp_client, tool_message
 
 REQUIRED_FIELDS = ["name", "age", "occupation", "income", "product_name", "memo"]
 
@@ -54,11 +52,11 @@ async def save_interest_node(state):
 
     # If user just confirmed “yes” or “no”
     if latest_message.lower() in ["yes", "y"]:
-        client = Client(MCP_URL)
-        async with client:
-            result = await client.call_tool("log_product_interest", interest.dict())
+        delivery = await mcp_client().deliver("log_product_interest", interest.dict())
+        message = ("Thanks! Your details were received and an agent will contact you soon."
+                   if delivery.queued else tool_message(delivery.result))
 
-        confirm = AIMessage(content=result["message"])
+        confirm = AIMessage(content=message)
         state["messages"].append(confirm)
         state["route"] = "answer"
         state["user_data"] = {}
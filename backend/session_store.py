@@ -0,0 +1,221 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from langchain_core.messages import messages_from_dict, messages_to_dict
+from db_utils import ConnectionPool
+from config import DB_POOL_SIZE, SESSION_BACKEND, SESSION_DB_PATH, SESSION_CACHE_SIZE, SESSION_TTL_SECONDS
+
+
+def serialize_state(state: dict) -> str:
+    """Encode an AgentState (including its LangChain messages) as JSON."""
+    data = dict(state)
+    data["messages"] = messages_to_dict(state.get("messages", []))
+    return json.dumps(data, ensure_ascii=False, default=str)
+
+def deserialize_state(payload: str) -> dict:
+    """Decode a JSON payload produced by serialize_state."""
+    data = json.loads(payload)
+    data["messages"] = messages_from_dict(data.get("messages", []))
+    return data
+
+
+class SessionStore:
+    """Interface for session-state backends keyed by session_id."""
+
+    def get(self, session_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def put(self, session_id: str, state: dict) -> None:
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    def purge_expired(self) -> int:
+        """Delete sessions idle for longer than the TTL; returns how many were deleted."""
+        return 0
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """In-process store with LRU eviction and idle TTL."""
+
+    def __init__(self, max_entries: int = SESSION_CACHE_SIZE, ttl_seconds: int = SESSION_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            touched_at, state = entry
+            if time.time() - touched_at > self.ttl_seconds:
+                del self._entries[session_id]
+                return None
+            self._entries[session_id] = (time.time(), state)
+            self._entries.move_to_end(session_id)
+            return state
+
+    def put(self, session_id, state):
+        with self._lock:
+            self._entries[session_id] = (time.time(), state)
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def purge_expired(self):
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [sid for sid, (touched_at, _) in self._entries.items() if touched_at < cutoff]
+            for sid in expired:
+                del self._entries[sid]
+        return len(expired)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SqliteSessionStore(SessionStore):
+    """Durable store shared by every worker process through one SQLite file.
+
+    Connections are pooled (configured once, reused across operations). Any
+    worker can serve any session: the revision bumped by every put lets a
+    memory tier in another worker notice the change.
+    """
+
+    def __init__(self, db_path: str = SESSION_DB_PATH, ttl_seconds: int = SESSION_TTL_SECONDS,
+                 pool_size: int = DB_POOL_SIZE):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.pool = ConnectionPool(pool_size, setup=self._create_table, connect=self._connect)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    @staticmethod
+    def _create_table(conn) -> None:
+        conn.execute('''CREATE TABLE IF NOT EXISTS session_state
+                        (session_id TEXT PRIMARY KEY,
+                         state TEXT NOT NULL,
+                         revision INTEGER NOT NULL DEFAULT 1,
+                         updated_at REAL NOT NULL)''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_session_state_updated_at ON session_state (updated_at)')
+        conn.commit()
+
+    def get_with_revision(self, session_id: str,
+                          known_revision: Optional[int] = None) -> tuple[Optional[dict], Optional[int]]:
+        """Return (state, revision); state is None when absent or, in one query, still at known_revision."""
+        with self.pool.connection() as conn:
+            row = conn.execute('''SELECT CASE WHEN revision = ? THEN NULL ELSE state END, revision
+                                  FROM session_state WHERE session_id = ? AND updated_at > ?''',
+                               (known_revision, session_id, time.time() - self.ttl_seconds)).fetchone()
+        if row is None:
+            return None, None
+        return (deserialize_state(row[0]) if row[0] is not None else None), row[1]
+
+    def get(self, session_id):
+        return self.get_with_revision(session_id)[0]
+
+    def put(self, session_id, state):
+        self.put_with_revision(session_id, state)
+
+    def put_with_revision(self, session_id: str, state: dict) -> int:
+        with self.pool.connection() as conn:
+            row = conn.execute('''INSERT INTO session_state (session_id, state, revision, updated_at)
+                                  VALUES (?, ?, 1, ?)
+                                  ON CONFLICT(session_id) DO UPDATE SET
+                                      state = excluded.state,
+                                      revision = session_state.revision + 1,
+                                      updated_at = excluded.updated_at
+                                  RETURNING revision''',
+                               (session_id, serialize_state(state), time.time())).fetchone()
+            conn.commit()
+        return row[0]
+
+    def delete(self, session_id):
+        with self.pool.connection() as conn:
+            conn.execute('DELETE FROM session_state WHERE session_id = ?', (session_id,))
+            conn.commit()
+
+    def purge_expired(self) -> int:
+        """Delete sessions idle for longer than the TTL."""
+        with self.pool.connection() as conn:
+            cursor = conn.execute('DELETE FROM session_state WHERE updated_at <= ?',
+                                  (time.time() - self.ttl_seconds,))
+            conn.commit()
+        return cursor.rowcount
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def __len__(self):
+        with self.pool.connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM session_state').fetchone()[0]
+
+
+class TieredSessionStore(SessionStore):
+    """LRU memory tier in front of the SQLite tier.
+
+    A cached state is only reused while its revision matches the durable row,
+    so a session updated by another worker is reloaded instead of served stale.
+    The check and the reload are one query, which skips the payload when the
+    revision is unchanged.
+    """
+
+    def __init__(self, memory: MemorySessionStore, durable: SqliteSessionStore):
+        self.memory = memory
+        self.durable = durable
+
+    def get(self, session_id):
+        cached = self.memory.get(session_id)
+        state, revision = self.durable.get_with_revision(session_id, cached[0] if cached is not None else None)
+        if revision is None:
+            self.memory.delete(session_id)
+            return None
+        if state is None:  # unchanged since it was cached
+            return cached[1]
+        self.memory.put(session_id, (revision, state))
+        return state
+
+    def put(self, session_id, state):
+        revision = self.durable.put_with_revision(session_id, state)
+        self.memory.put(session_id, (revision, state))
+
+    def delete(self, session_id):
+        self.memory.delete(session_id)
+        self.durable.delete(session_id)
+
+    def purge_expired(self):
+        self.memory.purge_expired()
+        return self.durable.purge_expired()
+
+    def close(self) -> None:
+        self.durable.close()
+
+    def __len__(self):
+        return len(self.durable)
+
+
+def create_session_store(backend: str = SESSION_BACKEND) -> SessionStore:
+    """Build the session store selected by SESSION_BACKEND."""
+    if backend == "memory":
+        return MemorySessionStore()
+    if backend == "sqlite":
+        return SqliteSessionStore()
+    if backend == "tiered":
+        return TieredSessionStore(MemorySessionStore(), SqliteSessionStore())
+    raise ValueError(f"Unsupported session backend: {backend}")
@@ -1,7 +1,8 @@
-from typing import TypedDict, List, Literal
+from typing import Any, Dict, TypedDict, List, Literal, Optional
 from pydantic import BaseModel, Field
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import BaseMessage
+from metrics import llm_metrics
+from resources import resource
 
 # Structured output models for LLM nodes
 class RouteDecision(BaseModel):
@@ -11,16 +12,52 @@ class RouteDecision(BaseModel):
 class RagJudge(BaseModel):
     sufficient: bool
 
-# LLM instances with structured output
-router_llm = ChatOpenAI(model="gpt-4.1-mini", temperature=0)\
-             .with_structured_output(RouteDecision)
-judge_llm  = ChatOpenAI(model="gpt-4.1-mini", temperature=0)\
-             .with_structured_output(RagJudge)
-answer_llm = ChatOpenAI(model="gpt-4.1-mini", temperature=0.7)
+def chat_model(**kwargs):
+    """gpt-4.1-mini client; llm_metrics records latency, tokens and cost per call."""
+    from langchain_openai import ChatOpenAI  # ~1 s to import, so only when the first model is built
+
+    return ChatOpenAI(model="gpt-4.1-mini", callbacks=[llm_metrics], **kwargs)
+
+async def open_http_pool(llm) -> None:
+    """One cheap request so the first chat turn does not pay for TLS setup (clients share the pool)."""
+    client = getattr(llm, "root_async_client", None)
+    if client is not None:
+        await client.models.list()
+
+# LLM instances with structured output, built on first use
+@resource("router_llm")
+def router_llm():
+    return chat_model(temperature=0).with_structured_output(RouteDecision)
+
+@resource("judge_llm")
+def judge_llm():
+    return chat_model(temperature=0).with_structured_output(RagJudge)
+
+# stream_usage: streamed answers report token usage in their last chunk
+@resource("answer_llm", connect=open_http_pool)
+def answer_llm():
+    return chat_model(temperature=0.7, stream_usage=True)
+
+@resource("summary_llm")
+def summary_llm():
+    return chat_model(temperature=0)
 
 # Shared state type 
 class AgentState(TypedDict, total=False):
+    session_id: Optional[str]      # keys per-turn memos (see contextualize.py)
     messages: List[BaseMessage]
-    route:    Literal["rag", "answer", "end"]
+    route:    Literal["rag", "answer", "end", "interview"]
     rag:      str
-    web:      str 
\ No newline at end of file
+    web:      str
+    rag_sources:   List[int]       # file_ids of the chunks behind "rag"
+    rag_gate:      str             # accept | reject | empty | judge | product_judge (see nodes.gate_retrieval)
+    cache_key:     Optional[str]   # question to store in the answer cache after answering
+    cached_answer: Optional[str]   # answer served from the semantic cache
+    history_summary: Optional[str] # rolling summary of turns compacted out of "messages"
+    # lead interview (see interview_node)
+    customer_data:         Dict[str, Any]
+    awaiting_field:        Optional[str]
+    awaiting_confirmation: bool
+    interview_lang:        str        # th | en, follows the customer's last message with letters
+    interview_llm_calls:   int        # LLM fallback calls spent on the current lead
+    done:                  bool       # last lead was recorded
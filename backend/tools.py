@@ -1,18 +1,44 @@
-from langchain_tavily import TavilySearch
 from langchain_core.tools import tool
-from documents_loaders import vectorstore
+from documents_loaders import vectorstore, lexical_index
+from lexical_index import reciprocal_rank_fusion, mentions
+from db_utils import get_hidden_document_ids
+from web_search_cache import web_search_cache
+from metrics import instrument_tool
+from cassette import recorded
+from resources import resource
+from utils import match_product_name
+from config import RETRIEVAL_K, HYBRID_RETRIEVAL, HYBRID_FETCH_K, RRF_K
+import asyncio
+import warnings
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+from langchain_core.documents import Document
 import os
 
+# l2 relevance (1 - distance / sqrt(2)) dips below 0 for unrelated chunks; the gate thresholds expect that
+warnings.filterwarnings("ignore", message="Relevance scores must be between 0 and 1", category=UserWarning)
+
 # Tavily for web search
-tavily = TavilySearch(max_results=3, topic="general")
-# retriever for RAG
-retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+@resource("tavily")
+def tavily():
+    from langchain_tavily import TavilySearch
+
+    return TavilySearch(max_results=3, topic="general")
+
+@instrument_tool("tavily")
+@recorded("tavily", key=lambda query: query)
+async def tavily_search(query: str):
+    """One outbound Tavily search (tools.tavily can be overridden with a local stand-in)."""
+    return await tavily().ainvoke({"query": query})
 
 @tool
-def web_search_tool(query: str) -> str:
+async def web_search_tool(query: str) -> str:
     """Up-to-date web info via Tavily"""
     try:
-        result = tavily.invoke({"query": query})
+        cache = web_search_cache()
+        if cache is not None:
+            result = await cache.search(query, tavily_search)
+        else:
+            result = await tavily_search(query)
 
         # Extract and format the results from Tavily response
         if isinstance(result, dict) and 'results' in result:
@@ -29,12 +55,60 @@ def web_search_tool(query: str) -> str:
     except Exception as e:
         return f"WEB_ERROR::{e}"
 
-@tool
-def rag_search_tool(query: str) -> str:
-    """Top-3 chunks from KB (empty string if none)"""
+class KBSearchResult(NamedTuple):
+    chunks: str               # top-k chunk texts joined for the prompt
+    file_ids: List[int]       # documents the chunks came from
+    score: Optional[float]    # best dense relevance score (0..1) among the returned chunks, None if none has one
+    product_match: bool = False  # chunks include BM25's best for the catalog product the query names (hybrid only)
+
+@instrument_tool("dense_search")
+async def dense_search(query: str, k: int, exclude_file_ids: Sequence[int] = ()) -> List[Tuple[Document, float]]:
+    """Chroma top-k with relevance scores normalized by the collection's distance metric.
+
+    The query embedding made for the answer cache lookup is reused (see CachedEmbeddings).
+    """
+    where = {"file_id": {"$nin": list(exclude_file_ids)}} if exclude_file_ids else None
+    return await asyncio.to_thread(vectorstore().similarity_search_with_relevance_scores, query, k, filter=where)
+
+@instrument_tool("kb_search")
+async def search_kb(query: str) -> KBSearchResult:
+    """Top-k KB chunks joined as text, the file_ids they came from and their best dense score.
+
+    With HYBRID_RETRIEVAL, dense and BM25 candidates are fused with reciprocal
+    rank fusion so exact Thai terms and product names are not lost; when the
+    query names a catalog product, its best BM25 chunk is always kept, since in
+    a small KB fusion favours generic chunks both searches rank mid-list. The
+    score is the best dense score of the fused chunks that are returned, so the
+    retrieval gate judges what the answer will see; chunks only BM25 found have
+    no dense score. Chunks of staged or replaced documents are never returned.
+    """
+    product_match = False
     try:
-        docs = retriever.invoke(query)
-        print(docs)
-        return "\n\n".join(d.page_content for d in docs) if docs else ""
+        hidden = await asyncio.to_thread(get_hidden_document_ids)
+        if HYBRID_RETRIEVAL:
+            dense, lexical = await asyncio.gather(
+                dense_search(query, HYBRID_FETCH_K, hidden),
+                asyncio.to_thread(lexical_index().search, query, HYBRID_FETCH_K, hidden),
+            )
+            docs = reciprocal_rank_fusion([[d for d, _ in dense], [d for d, _ in lexical]], k=RRF_K)[:RETRIEVAL_K]
+            product = match_product_name(query)
+            pinned = next((d for d, _ in lexical if mentions(d, product)), None) if product else None
+            if pinned is not None and all(d.id != pinned.id for d in docs):
+                docs = [pinned] + docs[:RETRIEVAL_K - 1]
+            product_match = pinned is not None
+        else:
+            dense = await dense_search(query, RETRIEVAL_K, hidden)
+            docs = [d for d, _ in dense]
     except Exception as e:
-        return f"RAG_ERROR::{e}"
\ No newline at end of file
+        return KBSearchResult(f"RAG_ERROR::{e}", [], None)
+
+    file_ids = sorted({d.metadata["file_id"] for d in docs if d.metadata.get("file_id") is not None})
+    dense_scores = {d.id: s for d, s in dense}
+    score = max((dense_scores[d.id] for d in docs if d.id in dense_scores), default=None)
+    return KBSearchResult(("\n\n".join(d.page_content for d in docs) if docs else ""), file_ids, score,
+                          product_match)
+
+@tool
+async def rag_search_tool(query: str) -> str:
+    """Top-k chunks from KB (empty string if none)"""
+    return (await search_kb(query)).chunks
@@ -1,6 +1,8 @@
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
 import uuid
 from typing import List, Dict, Optional
+import re
+from config import PRODUCT_NAMES
 
 def get_or_create_session_id(session_id: Optional[str]) -> str:
     """Return the provided session_id or generate a new one."""
@@ -18,4 +20,20 @@ def history_to_lc_messages(history: List[Dict]) -> List[BaseMessage]:
 
 def append_message(history: List[BaseMessage], message: BaseMessage) -> List[BaseMessage]:
     """Return a new list with the message appended."""
-    return history + [message] 
\ No newline at end of file
+    return history + [message]
+
+def normalize_product_text(text: str) -> str:
+    """Lower-case and drop whitespace/separators so "90_20" matches "90 / 20"."""
+    return re.sub(r"[\s_/\-.]+", "", text).casefold()
+
+def match_product_name(text: str) -> Optional[str]:
+    """Return the catalog product mentioned in text, if any."""
+    normalized = normalize_product_text(text)
+    for product in sorted(PRODUCT_NAMES, key=len, reverse=True):
+        if normalize_product_text(product) in normalized:
+            return product
+    return None
+
+def detect_language(text: str) -> str:
+    """'th' when the text contains Thai script, otherwise 'en'."""
+    return "th" if re.search(r"[\u0E00-\u0E7F]", text) else "en"
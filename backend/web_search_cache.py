@@ -0,0 +1,175 @@
+import asyncio
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from config import (WEB_SEARCH_CACHE_ENABLED, WEB_SEARCH_CACHE_DB_PATH, WEB_SEARCH_CACHE_TTL_SECONDS,
+                    WEB_SEARCH_CACHE_MAX_ENTRIES, WEB_SEARCH_STALE_WHILE_REVALIDATE, WEB_SEARCH_STALE_TTL_SECONDS)
+from resources import resource
+
+Fetch = Callable[[str], Awaitable[Any]]
+
+
+def normalize_query(query: str) -> str:
+    """NFC, case-folded, whitespace-collapsed query without trailing punctuation.
+
+    Thai is written without word spaces, so spaces between Thai characters are dropped.
+    """
+    text = re.sub(r"\s+", " ", unicodedata.normalize("NFC", query).casefold()).strip()
+    text = re.sub(r"(?<=[\u0E00-\u0E7F]) (?=[\u0E00-\u0E7F])", "", text)
+    return text.rstrip("?!.。 ")
+
+
+def is_cacheable(result: Any) -> bool:
+    """Only well-formed search results are kept; errors are retried on the next call."""
+    if not isinstance(result, dict) or "error" in result:
+        return False
+    try:
+        json.dumps(result)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+class WebSearchCache:
+    """Persistent TTL cache in front of a web search call.
+
+    Results are keyed by the normalized query and kept in SQLite, so they
+    survive restarts. Concurrent misses for the same query await one outbound
+    search. With stale-while-revalidate, a result up to stale_ttl past its TTL
+    is returned at once while a single background search refreshes it.
+    """
+
+    def __init__(self, db_path: str = WEB_SEARCH_CACHE_DB_PATH, ttl_seconds: int = WEB_SEARCH_CACHE_TTL_SECONDS,
+                 max_entries: int = WEB_SEARCH_CACHE_MAX_ENTRIES,
+                 stale_while_revalidate: bool = WEB_SEARCH_STALE_WHILE_REVALIDATE,
+                 stale_ttl_seconds: int = WEB_SEARCH_STALE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_ttl_seconds = stale_ttl_seconds if stale_while_revalidate else 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')  # a lost last_used update only costs LRU accuracy
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS web_search_cache
+                             (key TEXT PRIMARY KEY,
+                              query TEXT,
+                              result TEXT,
+                              fetched_at REAL,
+                              last_used REAL)''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_web_search_cache_last_used ON web_search_cache (last_used)')
+        self.conn.commit()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.counters = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "refreshes": 0, "errors": 0,
+                         "evictions": 0, "upstream_calls": 0, "upstream_ms_total": 0.0, "hit_ms_total": 0.0}
+
+    def _get(self, key: str) -> Optional[Tuple[Any, float]]:
+        with self._lock:
+            row = self.conn.execute('SELECT result, fetched_at FROM web_search_cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute('UPDATE web_search_cache SET last_used = ? WHERE key = ?', (time.time(), key))
+            self.conn.commit()
+        return json.loads(row[0]), row[1]
+
+    def _put(self, key: str, query: str, result: Any) -> None:
+        now = time.time()
+        with self._lock:
+            self.conn.execute('INSERT OR REPLACE INTO web_search_cache VALUES (?, ?, ?, ?, ?)',
+                              (key, query, json.dumps(result, ensure_ascii=False), now, now))
+            # past TTL + stale window an entry can never be served again
+            evicted = self.conn.execute('DELETE FROM web_search_cache WHERE fetched_at < ?',
+                                        (now - self.ttl_seconds - self.stale_ttl_seconds,)).rowcount
+            overflow = self.conn.execute('SELECT COUNT(*) FROM web_search_cache').fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self.conn.execute('''DELETE FROM web_search_cache WHERE key IN
+                                     (SELECT key FROM web_search_cache ORDER BY last_used LIMIT ?)''', (overflow,))
+                evicted += overflow
+            self.counters["evictions"] += evicted
+            self.conn.commit()
+
+    async def _fetch_and_store(self, key: str, query: str, fetch: Fetch) -> Any:
+        self.counters["upstream_calls"] += 1
+        started = time.perf_counter()
+        try:
+            result = await fetch(query)
+        except Exception as e:
+            self.counters["errors"] += 1
+            logging.warning(f"⚠️ Web search failed for '{query}': {e!r}")
+            raise
+        finally:
+            self.counters["upstream_ms_total"] += (time.perf_counter() - started) * 1000
+        if is_cacheable(result):
+            await asyncio.to_thread(self._put, key, query, result)
+        return result
+
+    def _inflight_task(self, key: str) -> Optional[asyncio.Task]:
+        task = self._inflight.get(key)
+        return task if task is not None and task.get_loop() is asyncio.get_running_loop() else None
+
+    def _start_fetch(self, key: str, query: str, fetch: Fetch) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(self._fetch_and_store(key, query, fetch))
+        self._inflight[key] = task
+
+        def finished(t: asyncio.Task) -> None:
+            if self._inflight.get(key) is t:
+                del self._inflight[key]
+            if not t.cancelled():
+                t.exception()  # retrieved here so background refresh errors are not reported as unhandled
+
+        task.add_done_callback(finished)
+        return task
+
+    async def search(self, query: str, fetch: Fetch) -> Any:
+        """Cached result for query, calling fetch(query) on a miss."""
+        key = normalize_query(query)
+        started = time.perf_counter()
+        cached = await asyncio.to_thread(self._get, key)
+        if cached is not None:
+            result, fetched_at = cached
+            age = time.time() - fetched_at
+            fresh = age < self.ttl_seconds
+            if fresh or age < self.ttl_seconds + self.stale_ttl_seconds:
+                if not fresh and self._inflight_task(key) is None:
+                    self.counters["refreshes"] += 1
+                    self._start_fetch(key, query, fetch)
+                self.counters["hits" if fresh else "stale_hits"] += 1
+                self.counters["hit_ms_total"] += (time.perf_counter() - started) * 1000
+                if not fresh:
+                    logging.info(f"🌐 Web search cache served stale result for '{query}' ({age:.0f}s old)")
+                return result
+
+        task = self._inflight_task(key)
+        if task is not None:
+            self.counters["coalesced"] += 1
+        else:
+            self.counters["misses"] += 1
+            task = self._start_fetch(key, query, fetch)
+        # a cancelled caller must not cancel the search other callers are waiting on
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self.conn.execute('SELECT COUNT(*) FROM web_search_cache').fetchone()[0]
+        served = self.counters["hits"] + self.counters["stale_hits"]
+        lookups = served + self.counters["misses"] + self.counters["coalesced"]
+        upstream = self.counters["upstream_calls"]
+        return {**self.counters, "entries": entries, "inflight": len(self._inflight),
+                "hit_rate": served / lookups if lookups else 0.0,
+                "avg_hit_ms": self.counters["hit_ms_total"] / served if served else 0.0,
+                "avg_upstream_ms": self.counters["upstream_ms_total"] / upstream if upstream else 0.0}
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+
+@resource("web_search_cache")
+def web_search_cache() -> Optional[WebSearchCache]:
+    """Build the web search cache (None when WEB_SEARCH_CACHE_ENABLED is off)."""
+    return WebSearchCache() if WEB_SEARCH_CACHE_ENABLED else None
@@ -1,20 +1,47 @@
 from functools import wraps
 import inspect
+import logging
+import time
+from metrics import NODE_SECONDS, NODE_ERRORS, current_node, current_trace_id
+from config import METRICS_ENABLED
+
+def _record(name, state, started):
+    elapsed = time.perf_counter() - started
+    route = (state.get("route") or "none") if isinstance(state, dict) else "none"
+    NODE_SECONDS.labels(name, route).observe(elapsed)
+    logging.debug(f"⚙️ Node {name} took {elapsed * 1000:.0f} ms → {route} (trace {current_trace_id.get()})")
 
 def wrap_node(node_fn, name):
+    """Time a graph node and label it by node name and the route it chose; exceptions are counted."""
+    if not METRICS_ENABLED:
+        return node_fn
     if inspect.iscoroutinefunction(node_fn):
         @wraps(node_fn)
         async def async_wrapper(state):
-            print(f"⚙️ Executing node: {name}")
-            new_state = await node_fn(state)
-            print(f"➡️ Next route: {new_state.get('route', 'END')}\n")
+            token = current_node.set(name)
+            started = time.perf_counter()
+            try:
+                new_state = await node_fn(state)
+            except Exception:
+                NODE_ERRORS.labels(name).inc()
+                raise
+            finally:
+                current_node.reset(token)
+            _record(name, new_state, started)
             return new_state
         return async_wrapper
     else:
         @wraps(node_fn)
         def sync_wrapper(state):
-            print(f"⚙️ Executing node: {name}")
-            new_state = node_fn(state)
-            print(f"➡️ Next route: {new_state.get('route', 'END')}\n")
+            token = current_node.set(name)
+            started = time.perf_counter()
+            try:
+                new_state = node_fn(state)
+            except Exception:
+                NODE_ERRORS.labels(name).inc()
+                raise
+            finally:
+                current_node.reset(token)
+            _record(name, new_state, started)
             return new_state
         return sync_wrapper
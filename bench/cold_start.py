@@ -0,0 +1,113 @@
+"""Cold start of the API: `import main`, the FastAPI lifespan, and time until /readyz reports ready.
+
+Each sample is a fresh interpreter in an empty scratch directory (so no
+database, Chroma or cache file is reused) with dummy API keys, since older
+trees build their OpenAI / Tavily clients at import time. Nothing calls the
+network: warm-up runs with PREWARM_CONNECTIONS off. Medians over --runs.
+
+With --baseline REF the same measurements are taken on REF checked out in a
+temporary git worktree (trees without /readyz count as ready once the
+lifespan has started).
+
+Usage (from the repo root):
+    python bench/cold_start.py [--runs 5] [--baseline HEAD~1] [--out cold_start.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+HEAVY_MODULES = ("langchain_openai", "langchain_chroma", "chromadb", "langchain_tavily", "fastmcp",
+                 "langchain_community.document_loaders")
+
+# runs in the child interpreter; prints one JSON line
+PROBE = '''
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+loaded = [m for m in %r if m in sys.modules]
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    lifespan = time.perf_counter()
+    has_readyz = any(getattr(r, "path", None) == "/readyz" for r in main.app.routes)
+    status = None
+    while has_readyz:
+        response = client.get("/readyz")
+        status = response.json()
+        if response.status_code == 200 or status.get("warm"):
+            break
+        time.sleep(0.01)
+    ready = time.perf_counter()
+print(json.dumps({"import_ms": (imported - started) * 1000, "lifespan_ms": (lifespan - imported) * 1000,
+                  "ready_ms": (ready - started) * 1000, "heavy_modules_after_import": loaded,
+                  "ready": status is None or status.get("status") == "ready",
+                  "warmup_ms": (status or {}).get("warmup_ms")}))
+''' % (HEAVY_MODULES,)
+
+
+def sample(backend_dir: str) -> dict:
+    workdir = tempfile.mkdtemp(prefix="rag-cold-")
+    env = {**os.environ, "OPENAI_API_KEY": "bench", "TAVILY_API_KEY": "bench", "INDEX_ON_STARTUP": "false",
+           "PREWARM_CONNECTIONS": "false", "MCP_OUTBOX_FLUSH_INTERVAL_SECONDS": "3600"}
+    try:
+        out = subprocess.run([sys.executable, "-c", PROBE, backend_dir], cwd=workdir, env=env, capture_output=True,
+                             text=True, check=True, timeout=300).stdout
+        return json.loads(out.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def measure(backend_dir: str, runs: int) -> dict:
+    sample(backend_dir)  # first run fills the OS page cache / __pycache__; not counted
+    samples = [sample(backend_dir) for _ in range(runs)]
+    summary = {key: round(statistics.median(s[key] for s in samples), 1)
+               for key in ("import_ms", "lifespan_ms", "ready_ms")}
+    warmups = [s["warmup_ms"] for s in samples if s["warmup_ms"] is not None]
+    return {**summary, "warmup_ms": round(statistics.median(warmups), 1) if warmups else None,
+            "ready": all(s["ready"] for s in samples),
+            "heavy_modules_after_import": samples[-1]["heavy_modules_after_import"]}
+
+
+def git(*args) -> str:
+    return subprocess.run(["git", *args], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--baseline", help="git ref to compare against, e.g. HEAD~1")
+    parser.add_argument("--out", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    commit = git("rev-parse", "--short", "HEAD") + ("-dirty" if git("status", "--porcelain", "--", "backend") else "")
+    results = {"runs": args.runs, "current": {"commit": commit,
+                                              **measure(os.path.join(REPO_DIR, "backend"), args.runs)}}
+    if args.baseline:
+        worktree = tempfile.mkdtemp(prefix="rag-baseline-")
+        git("worktree", "add", "--detach", worktree, args.baseline)
+        try:
+            results["baseline"] = {"commit": git("rev-parse", "--short", args.baseline),
+                                   **measure(os.path.join(worktree, "backend"), args.runs)}
+        finally:
+            git("worktree", "remove", "--force", worktree)
+        for key in ("import_ms", "ready_ms"):
+            results[f"{key.split('_')[0]}_speedup"] = round(results["baseline"][key] / results["current"][key], 2)
+
+    output = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""N parallel /chat requests against a slow stand-in LLM finish in about the time of one.
+
+Graph nodes and tools are async, so requests waiting on the LLM must not
+block each other: the wall time of --requests concurrent turns (separate
+sessions) should stay close to the latency of a single turn. The stand-in
+ChatOpenAI sleeps --llm-ms per call (asyncio.sleep on the async path), so a
+blocking call anywhere on the request path shows up as a wall time that
+grows with N. Exits with status 1 when the ratio exceeds --max-ratio.
+
+Usage (from the repo root):
+    python bench/concurrency.py [--requests 20] [--llm-ms 1000] [--max-ratio 1.5]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+from suite import CHAT_QUESTIONS, git_commit, prepare_environment
+
+
+async def timed_post(client, session_id: str, question: str) -> float:
+    started = time.perf_counter()
+    response = await client.post("/chat", json={"question": question, "session_id": session_id})
+    response.raise_for_status()
+    return (time.perf_counter() - started) * 1000
+
+
+async def run(args) -> dict:
+    import httpx
+    import stand_ins
+    import main
+    from bulk_indexer import sync_directory
+    from mcp_client import mcp_client
+    from resources import registry
+
+    stand_ins.install_mcp(mcp_client())
+    await registry.startup()  # the ASGI transport skips the lifespan, which warms up the resources
+    await asyncio.to_thread(sync_directory)
+
+    question = CHAT_QUESTIONS[0]
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        await timed_post(client, "warm-up", question)
+        single = statistics.median([await timed_post(client, f"single-{i}", question) for i in range(3)])
+        stand_ins.reset_counters()
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(timed_post(client, f"parallel-{i}", question)
+                                           for i in range(args.requests)))
+        wall = (time.perf_counter() - started) * 1000
+    calls = stand_ins.reset_counters()
+    await mcp_client().close()
+    ratio = wall / single
+    return {"meta": {"commit": git_commit(), "llm_ms": args.llm_ms},
+            "requests": args.requests, "single_ms": round(single, 1), "parallel_wall_ms": round(wall, 1),
+            "parallel_max_ms": round(max(latencies), 1), "ratio": round(ratio, 2),
+            "serial_estimate_ms": round(single * args.requests, 1),
+            "llm_calls": calls["llm_calls"], "max_ratio": args.max_ratio, "ok": ratio <= args.max_ratio}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--llm-ms", type=float, default=1000.0, help="stand-in LLM latency per call")
+    parser.add_argument("--max-ratio", type=float, default=1.5, help="allowed parallel wall time / single turn")
+    parser.add_argument("--workdir", help="scratch directory (default: a new temp dir)")
+    parser.add_argument("--out", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    out_path = os.path.abspath(args.out) if args.out else None
+    # the LLM dominates; embeddings, search and MCP stay cheap so the ratio measures blocking, not load
+    prepare_environment(args.workdir or tempfile.mkdtemp(prefix="rag-concurrency-"), SimpleNamespace(
+        caches=False, llm_ms=args.llm_ms, llm_ms_per_token=0.0, completion_tokens=40, embed_ms=5.0,
+        search_ms=5.0, mcp_ms=1.0))
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = asyncio.run(run(args))
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+    sys.exit(0 if results["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
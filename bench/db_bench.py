@@ -0,0 +1,116 @@
+"""Benchmark the chat-history data layer: legacy per-call connections vs. the pooled WAL layer.
+
+Usage (from the repo root):
+    python bench/db_bench.py --rows 1000000 --sessions 20000
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+
+def populate(db_path: str, rows: int, sessions: int) -> None:
+    """Fill a legacy-schema chat_history table (no indexes) with synthetic turns."""
+    conn = sqlite3.connect(db_path)
+    conn.execute('''CREATE TABLE chat_history
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     session_id TEXT,
+                     user_query TEXT,
+                     gpt_response TEXT,
+                     model TEXT,
+                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    rng = random.Random(0)
+    batch = []
+    for i in range(rows):
+        batch.append((f"session-{rng.randrange(sessions)}", f"คุ้มชีวา question {i}",
+                      "แผนประกันคุ้มชีวา " * 8, "gpt-4.1-mini", f"2025-01-01 00:{(i // 60) % 60:02d}:{i % 60:02d}"))
+        if len(batch) == 50000:
+            conn.executemany('INSERT INTO chat_history (session_id, user_query, gpt_response, model, created_at) '
+                             'VALUES (?, ?, ?, ?, ?)', batch)
+            batch.clear()
+    if batch:
+        conn.executemany('INSERT INTO chat_history (session_id, user_query, gpt_response, model, created_at) '
+                         'VALUES (?, ?, ?, ?, ?)', batch)
+    conn.commit()
+    conn.close()
+
+
+def timed(fn, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {"p50_ms": round(statistics.median(samples), 3),
+            "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 3)}
+
+
+def legacy_layer(db_path: str) -> dict:
+    def history(session_id):
+        conn = sqlite3.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        conn.execute('SELECT user_query, gpt_response FROM chat_history WHERE session_id = ? ORDER BY created_at',
+                     (session_id,)).fetchall()
+        conn.close()
+
+    def sessions():
+        conn = sqlite3.connect(db_path)
+        conn.execute("SELECT DISTINCT session_id FROM chat_history ORDER BY id DESC;").fetchall()
+        conn.close()
+
+    def insert():
+        conn = sqlite3.connect(db_path)
+        conn.execute('INSERT INTO chat_history (session_id, user_query, gpt_response, model) VALUES (?, ?, ?, ?)',
+                     ("session-1", "q", "a", "gpt-4.1-mini"))
+        conn.commit()
+        conn.close()
+
+    return {"get_chat_history": lambda: history(f"session-{random.randrange(1000)}"),
+            "list_sessions": sessions, "insert_chat_history": insert}
+
+
+def pooled_layer(db_path: str) -> dict:
+    os.environ["CHAT_DB_PATH"] = db_path
+    sys.path.insert(0, BACKEND_DIR)
+    import db_utils  # creates indexes and backfills chat_sessions on import
+
+    return {"get_chat_history": lambda: db_utils.get_chat_history(f"session-{random.randrange(1000)}"),
+            "list_sessions": db_utils.get_all_sessions,
+            "insert_chat_history": lambda: db_utils.insert_chat_history("session-1", "q", "a", "gpt-4.1-mini")}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--sessions", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    db_path = os.path.join(tmpdir, "rag_app.db")
+    started = time.perf_counter()
+    populate(db_path, args.rows, args.sessions)
+    results = {"rows": args.rows, "sessions": args.sessions,
+               "populate_s": round(time.perf_counter() - started, 1)}
+
+    layer = legacy_layer(db_path)
+    results["legacy"] = {name: timed(fn, args.repeat) for name, fn in layer.items()}
+
+    started = time.perf_counter()
+    layer = pooled_layer(db_path)
+    results["migration_s"] = round(time.perf_counter() - started, 1)
+    results["pooled"] = {name: timed(fn, args.repeat) for name, fn in layer.items()}
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
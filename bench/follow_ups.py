@@ -0,0 +1,169 @@
+"""Follow-up questions with and without contextualization, against the local stand-ins.
+
+1. heuristic: contextualize.needs_context on labelled follow-up and
+   self-contained questions asked after a first turn (no LLM calls)
+2. dialogues: short conversations whose later turns lean on the first one
+   ("คุ้มชีวา คุ้มครองอะไรบ้าง" → "แล้วเบี้ยเท่าไหร่?"), with
+   CONTEXTUALIZE_ENABLED true and false, each with the pre-router on (its
+   rules route the turns naming a product locally; follow-ups go to the
+   router LLM) and off (the router LLM runs on every turn, so the rewrite
+   overlaps it). Every run is a fresh process and scratch directory
+   with the answer cache on. Per run: LLM calls by node, how many follow-ups
+   were searched with their product named, how many were answered from the
+   cache entry of another product's question, and the latency of follow-ups
+   that were answered (not served from the cache).
+
+The stand-in rewrite prefixes the question with the product named last in
+the history (see stand_ins.standalone_question).
+
+Usage (from the repo root):
+    python bench/follow_ups.py [--llm-ms 300] [--out follow_ups.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from suite import git_commit, latency_summary, metric_delta, metric_snapshot, prepare_environment
+
+FIRST_TURN = "คุ้มชีวา คุ้มครองอะไรบ้าง"
+# (question, needs the conversation) asked after FIRST_TURN
+LABELLED = [
+    ("แล้วเบี้ยเท่าไหร่?", True),
+    ("ต้องจ่ายเบี้ยกี่ปี", True),
+    ("แผนนี้มีค่าห้องเท่าไหร่", True),
+    ("ส่วนคุ้มออมสุขล่ะ", True),
+    ("ลดหย่อนภาษีได้ไหม", True),
+    ("what about the premium?", True),
+    ("How long do I pay for it?", True),
+    ("Can I pay monthly?", True),
+    ("คุ้มตลอดชีพ พลัส จ่ายเบี้ยกี่ปี", False),
+    ("เบี้ยประกันคุ้มออมสุขปีละเท่าไหร่", False),
+    ("ลดหย่อนภาษีประกันชีวิตล่าสุดได้เท่าไหร่", False),
+    ("ประกันสุขภาพแบบเหมาจ่ายต่างจากแบบแยกค่าใช้จ่ายอย่างไร", False),
+    ("What is the waiting period for health insurance claims?", False),
+    ("What does คุ้มรักษาเหมาจ่าย เอ็กซ์ตร้า cover?", False),
+]
+# each dialogue is about one product: (product, questions)
+DIALOGUES = [
+    ("คุ้มชีวา", [FIRST_TURN, "แล้วเบี้ยเท่าไหร่?", "ต้องจ่ายกี่ปี"]),
+    ("คุ้มออมสุข", ["คุ้มออมสุขคืออะไร", "แล้วเบี้ยเท่าไหร่?", "ต้องจ่ายกี่ปี"]),
+    ("คุ้มรักษาเหมาจ่าย เอ็กซ์ตร้า", ["คุ้มรักษาเหมาจ่าย เอ็กซ์ตร้า คุ้มครองอะไรบ้าง", "แล้วเบี้ยเท่าไหร่?",
+                                      "แผนนี้มีค่าห้องเท่าไหร่"]),
+    ("ตลอดชีพ 90/20", ["ตลอดชีพ 90/20 คุ้มครองอะไรบ้าง", "แล้วเบี้ยเท่าไหร่?", "ต้องจ่ายกี่ปี"]),
+]
+
+
+def check_heuristic() -> dict:
+    from langchain_core.messages import AIMessage, HumanMessage
+    from contextualize import needs_context
+
+    history = [HumanMessage(content=FIRST_TURN), AIMessage(content="คุ้มชีวาคุ้มครองชีวิต")]
+    wrong = [{"question": q, "expected": expected} for q, expected in LABELLED
+             if needs_context(q, {"messages": history + [HumanMessage(content=q)]}) != expected]
+    first_turn = sum(needs_context(q, {"messages": [HumanMessage(content=q)]}) for q, _ in LABELLED)
+    return {"questions": len(LABELLED), "correct": len(LABELLED) - len(wrong), "wrong": wrong,
+            "rewrites_on_first_turn": first_turn}
+
+
+async def run_dialogues() -> dict:
+    import httpx
+    import stand_ins
+    import main
+    from bulk_indexer import sync_directory
+    from mcp_client import mcp_client
+    from resources import registry
+
+    stand_ins.install_mcp(mcp_client())
+    await registry.startup()  # the ASGI transport skips the lifespan, which warms up the resources
+    await asyncio.to_thread(sync_directory)
+
+    turns = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        for i, (product, questions) in enumerate(DIALOGUES):
+            for n, question in enumerate(questions):
+                before = metric_snapshot()
+                started = time.perf_counter()
+                response = await client.post("/chat", json={"question": question, "session_id": f"dialogue-{i}"})
+                latency_ms = (time.perf_counter() - started) * 1000
+                delta = metric_delta(before, metric_snapshot())
+                state = await main.get_state(f"dialogue-{i}")
+                llm_by_node = {node: v["calls"] for node, v in delta["llm_by_node"].items()}
+                turns.append({"dialogue": i, "turn": n, "question": question, "ok": response.status_code == 200,
+                              "latency_ms": round(latency_ms, 1), "llm_by_node": llm_by_node,
+                              "search_query": state.get("cache_key"),
+                              "searched_product": product in (state.get("cache_key") or ""),
+                              "from_cache": "answer" not in llm_by_node and "rag_lookup" in delta["nodes"]})
+    await mcp_client().close()
+    return {"turns": turns, "contextualizer": main.STATS_SOURCES["contextualizer"]()}
+
+
+def summarize(turns: list) -> dict:
+    follow_ups = [t for t in turns if t["turn"] > 0]
+    calls = {}
+    for t in turns:
+        for node, n in t["llm_by_node"].items():
+            calls[node] = calls.get(node, 0) + n
+    return {"errors": sum(not t["ok"] for t in turns),
+            "first_turn_latency": latency_summary([t["latency_ms"] for t in turns if t["turn"] == 0]),
+            "answered_follow_up_latency": latency_summary([t["latency_ms"] for t in follow_ups
+                                                           if not t["from_cache"]]),
+            "llm_calls_per_turn": round(sum(calls.values()) / len(turns), 2), "llm_calls_by_node": calls,
+            "follow_ups_searched_with_product": f"{sum(t['searched_product'] for t in follow_ups)}/{len(follow_ups)}",
+            "follow_ups_from_other_products_cache": sum(t["from_cache"] for t in follow_ups)}
+
+
+def child(args) -> None:
+    prepare_environment(tempfile.mkdtemp(prefix="rag-follow-ups-"), argparse.Namespace(
+        caches=True, llm_ms=args.llm_ms, llm_ms_per_token=args.llm_ms_per_token, completion_tokens=40,
+        embed_ms=40.0, search_ms=800.0, mcp_ms=20.0))
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = {"heuristic": check_heuristic(), **asyncio.run(run_dialogues())}
+    print(json.dumps(results, ensure_ascii=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llm-ms", type=float, default=300.0, help="stand-in LLM latency per call")
+    parser.add_argument("--llm-ms-per-token", type=float, default=10.0)
+    parser.add_argument("--child", choices=["true", "false"], help=argparse.SUPPRESS)  # CONTEXTUALIZE_ENABLED
+    parser.add_argument("--out", help="also write the JSON results to this file")
+    args = parser.parse_args()
+    if args.child:
+        return child(args)
+
+    results = {"meta": {"commit": git_commit(), "llm_ms": args.llm_ms}}
+    for prerouter in ("true", "false"):
+        runs = {}
+        for enabled in ("true", "false"):
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", enabled,
+                                  "--llm-ms", str(args.llm_ms), "--llm-ms-per-token", str(args.llm_ms_per_token)],
+                                 env={**os.environ, "CONTEXTUALIZE_ENABLED": enabled, "PREROUTER_ENABLED": prerouter},
+                                 capture_output=True, text=True, check=True).stdout
+            run = json.loads(out.strip().splitlines()[-1])
+            results.setdefault("heuristic", run["heuristic"])
+            runs["contextualized" if enabled == "true" else "as_asked"] = {
+                **summarize(run["turns"]), "contextualizer": run["contextualizer"], "turns": run["turns"]}
+        on, off = runs["contextualized"], runs["as_asked"]
+        # what the rewrite adds to an answered follow-up; run before routing it would add all of avg_rewrite_ms
+        runs["answered_follow_up_latency_delta_ms"] = round(
+            on["answered_follow_up_latency"]["mean_ms"] - off["answered_follow_up_latency"]["mean_ms"], 1)
+        runs["avg_rewrite_ms"] = round(on["contextualizer"]["avg_rewrite_ms"], 1)
+        results["prerouter_on" if prerouter == "true" else "prerouter_off"] = runs
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Prompt tokens and latency per turn on long synthetic sessions: full history vs. budgeted history.
+
+Each turn builds the router and answer prompts the way the nodes do,
+once from the full message list (old behaviour) and once through
+history.history_for_prompt with the rolling summary maintained by
+history.compact_history. Offline, the LLM is simulated with a latency of
+--base-ms + --ms-per-1k-tokens per 1k prompt tokens; --live calls gpt-4.1-mini instead.
+
+Usage (from the repo root):
+    python bench/history_compaction.py --turns 60 [--live]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage  # noqa: E402
+import history  # noqa: E402
+from history import compact_history, count_tokens, history_for_prompt, message_tokens  # noqa: E402
+from config import ANSWER_HISTORY_BUDGET, HISTORY_SUMMARY_MAX_TOKENS, ROUTER_HISTORY_BUDGET  # noqa: E402
+
+ROUTER_SYSTEM = SystemMessage(content="You are a router that decides how to handle user queries: " * 6)
+CONTEXT = "Knowledge Base Information:\n" + "แผนประกันคุ้มชีวาให้ความคุ้มครองชีวิตถึงอายุ 90 ปี " * 30
+
+
+class SimulatedLLM:
+    """Latency proportional to prompt size; replies with a fixed-length answer."""
+
+    def __init__(self, base_ms: float, ms_per_1k: float, reply_tokens: int):
+        self.base_ms = base_ms
+        self.ms_per_1k = ms_per_1k
+        self.reply = "คุ้มชีวาคุ้มครอง " * (reply_tokens // 4)
+
+    async def ainvoke(self, messages):
+        tokens = sum(message_tokens(m) for m in messages)
+        await asyncio.sleep((self.base_ms + self.ms_per_1k * tokens / 1000) / 1000)
+        return AIMessage(content=self.reply)
+
+
+class SimulatedSummarizer(SimulatedLLM):
+    async def ainvoke(self, messages):
+        await super().ainvoke(messages)
+        return AIMessage(content="สรุป: ลูกค้าสอบถามแผนคุ้มชีวา " * (HISTORY_SUMMARY_MAX_TOKENS // 8))
+
+
+def build_prompts(state: dict, budgeted: bool, question: str) -> dict:
+    messages = state["messages"]
+    answer_prompt = HumanMessage(content=f"Question: {question}\n\nContext:\n{CONTEXT}")
+    if not budgeted:
+        return {"router": [ROUTER_SYSTEM] + messages,
+                "answer": messages + [answer_prompt]}
+    return {"router": [ROUTER_SYSTEM] + history_for_prompt(state, ROUTER_HISTORY_BUDGET),
+            "answer": history_for_prompt(state, ANSWER_HISTORY_BUDGET, exclude_last_human=True) + [answer_prompt]}
+
+
+async def run_session(turns: int, budgeted: bool, llm, summarizer) -> list:
+    state = {"messages": []}
+    rows = []
+    for turn in range(1, turns + 1):
+        question = f"คุ้มชีวา ข้อ {turn}: ระยะเวลาคุ้มครองและเบี้ยประกันเป็นอย่างไรครับ"
+        state["messages"] = state["messages"] + [HumanMessage(content=question)]
+        started = time.perf_counter()
+
+        prompts = build_prompts(state, budgeted, question)
+        await llm.ainvoke(prompts["router"])
+        reply = await llm.ainvoke(prompts["answer"])
+        state["messages"] = state["messages"] + [reply]
+        compacted = None
+        if budgeted:
+            compacted = await compact_history(state, summarizer)
+            if compacted:
+                state.update(compacted)
+
+        rows.append({
+            "turn": turn,
+            **{f"{node}_tokens": sum(message_tokens(m) for m in msgs) for node, msgs in prompts.items()},
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "compacted": bool(compacted),
+        })
+    return rows
+
+
+def summarize(rows: list, label: str) -> dict:
+    last = rows[-1]
+    return {
+        "mode": label,
+        "turns": len(rows),
+        "final_router_tokens": last["router_tokens"],
+        "final_answer_tokens": last["answer_tokens"],
+        "total_prompt_tokens": sum(r["router_tokens"] + r["answer_tokens"] for r in rows),
+        "p50_latency_ms": statistics.median(r["latency_ms"] for r in rows),
+        "last10_avg_latency_ms": round(statistics.mean(r["latency_ms"] for r in rows[-10:]), 1),
+        "compactions": sum(r["compacted"] for r in rows),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=60)
+    parser.add_argument("--base-ms", type=float, default=300)
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=60)
+    parser.add_argument("--reply-tokens", type=int, default=200)
+    parser.add_argument("--live", action="store_true", help="call gpt-4.1-mini instead of the simulated LLM")
+    parser.add_argument("--per-turn", action="store_true", help="also print every turn")
+    args = parser.parse_args()
+
+    if args.live:
+        from langchain_openai import ChatOpenAI
+        llm = ChatOpenAI(model="gpt-4.1-mini", temperature=0, max_tokens=args.reply_tokens)
+        summarizer = ChatOpenAI(model="gpt-4.1-mini", temperature=0)
+    else:
+        llm = SimulatedLLM(args.base_ms, args.ms_per_1k_tokens, args.reply_tokens)
+        summarizer = SimulatedSummarizer(args.base_ms, args.ms_per_1k_tokens, args.reply_tokens)
+
+    count_tokens("")  # loads the tokenizer
+    results = {"token_counter": "tiktoken" if history._encoding is not None else "estimate"}
+    for label, budgeted in (("full_history", False), ("budgeted", True)):
+        rows = await run_session(args.turns, budgeted, llm, summarizer)
+        results[label] = summarize(rows, label)
+        if args.per_turn:
+            results[label]["per_turn"] = rows
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
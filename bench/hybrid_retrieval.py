@@ -0,0 +1,132 @@
+"""Fixed query set with HYBRID_RETRIEVAL on and off: web fallbacks, latency and retrieval hits.
+
+Every query runs as a fresh /chat session against the local stand-ins with
+the brochures in documents/ indexed and the caches off, once per mode in a
+fresh process and scratch directory. Per mode: retrieval gate outcomes, how
+many turns fell back to web search (Tavily calls), mean and p95 turn
+latency, and how many queries retrieved a chunk of the brochure of the
+product they ask about.
+
+With hybrid retrieval, a question naming a catalog product keeps the best
+BM25 chunk of that product's brochure and goes to the judge even below the
+reject threshold ('product_judge'). The stand-in judge passes every
+retrieval that is not about the latest news, so the web fallbacks it saves
+are an upper bound: the real judge_llm still rejects chunks that do not
+answer the question. product_hits is the retrieval side of the same change.
+
+Usage (from the repo root):
+    python bench/hybrid_retrieval.py [--out hybrid_retrieval.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from suite import git_commit, latency_summary, prepare_environment
+
+# (query, product whose brochure answers it)
+QUERIES = [
+    ("คุ้มชีวา คุ้มครองอะไรบ้าง", "คุ้มชีวา"),
+    ("คุ้มชีวา รับประกันอายุเท่าไหร่", "คุ้มชีวา"),
+    ("คุ้มชีวา ระยะเวลาชำระเบี้ยกี่ปี", "คุ้มชีวา"),
+    ("เบี้ยประกันคุ้มออมสุขปีละเท่าไหร่", "คุ้มออมสุข"),
+    ("คุ้มออมสุข เงินคืนระหว่างสัญญาเท่าไหร่", "คุ้มออมสุข"),
+    ("คุ้มออมสุข ลดหย่อนภาษีได้ไหม", "คุ้มออมสุข"),
+    ("ตลอดชีพ 90/20 ต้องจ่ายเบี้ยกี่ปี", "ตลอดชีพ90_20"),
+    ("ตลอดชีพ 90/20 คุ้มครองถึงอายุเท่าไหร่", "ตลอดชีพ90_20"),
+    ("คุ้มรักษาเหมาจ่าย เอ็กซ์ตร้า ค่าห้องวันละเท่าไหร่", "คุ้มรักษาเหมาจ่าย เอ็กซ์ตร้า"),
+    ("คุ้มรักษาเหมาจ่าย เอ็กซ์ตร้า วงเงินค่ารักษาต่อปี", "คุ้มรักษาเหมาจ่าย เอ็กซ์ตร้า"),
+    ("What does คุ้มตลอดชีพ พลัส cover?", "คุ้มตลอดชีพ พลัส"),
+    ("คุ้มตลอดชีพ พลัส เงินปันผลเท่าไหร่", "คุ้มตลอดชีพ พลัส"),
+    ("ประกันสุขภาพเหมาจ่ายค่าห้องเดี่ยว", "คุ้มรักษาเหมาจ่าย เอ็กซ์ตร้า"),
+    ("ประกันออมทรัพย์ระยะสั้นได้เงินคืน", "คุ้มออมสุข"),
+    ("ประกันตลอดชีพจ่ายเบี้ยสั้น", "ตลอดชีพ90_20"),
+    ("ลดหย่อนภาษีประกันชีวิตล่าสุดได้เท่าไหร่", None),
+]
+
+
+async def run_queries() -> dict:
+    import httpx
+    import stand_ins
+    import main
+    from bulk_indexer import sync_directory
+    from db_utils import get_all_documents
+    from mcp_client import mcp_client
+    from nodes import RAG_GATE_STATS
+    from resources import registry
+
+    stand_ins.install_mcp(mcp_client())
+    await registry.startup()  # the ASGI transport skips the lifespan, which warms up the resources
+    await asyncio.to_thread(sync_directory)
+    filenames = {doc["id"]: doc["filename"] for doc in get_all_documents()}
+
+    rows = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        await client.post("/chat", json={"question": QUERIES[0][0], "session_id": "warm-up"})
+        RAG_GATE_STATS.clear()
+        stand_ins.reset_counters()
+        for i, (query, product) in enumerate(QUERIES):
+            searches = stand_ins.counters["searches"]
+            started = time.perf_counter()
+            response = await client.post("/chat", json={"question": query, "session_id": f"query-{i}"})
+            latency_ms = (time.perf_counter() - started) * 1000
+            state = await main.get_state(f"query-{i}")
+            sources = [filenames.get(file_id, "") for file_id in state.get("rag_sources") or []]
+            rows.append({"query": query, "ok": response.status_code == 200, "latency_ms": round(latency_ms, 1),
+                         "gate": state.get("rag_gate"), "web": stand_ins.counters["searches"] > searches,
+                         "hit": None if product is None else any(product in name for name in sources)})
+    await mcp_client().close()
+    return {"rows": rows, "rag_gate": dict(RAG_GATE_STATS)}
+
+
+def child(args) -> None:
+    prepare_environment(tempfile.mkdtemp(prefix="rag-hybrid-"), argparse.Namespace(
+        caches=False, llm_ms=args.llm_ms, llm_ms_per_token=0.0, completion_tokens=40, embed_ms=40.0,
+        search_ms=args.search_ms, mcp_ms=20.0))
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = asyncio.run(run_queries())
+    print(json.dumps(results, ensure_ascii=False))
+
+
+def summarize(run: dict) -> dict:
+    rows = run["rows"]
+    scored = [r for r in rows if r["hit"] is not None]
+    return {"queries": len(rows), "errors": sum(not r["ok"] for r in rows), "rag_gate": run["rag_gate"],
+            "web_fallbacks": sum(r["web"] for r in rows), **latency_summary([r["latency_ms"] for r in rows]),
+            "product_hits": f"{sum(r['hit'] for r in scored)}/{len(scored)}", "rows": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llm-ms", type=float, default=300.0, help="stand-in LLM latency per call")
+    parser.add_argument("--search-ms", type=float, default=800.0, help="stand-in Tavily latency per search")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help="also write the JSON results to this file")
+    args = parser.parse_args()
+    if args.child:
+        return child(args)
+
+    results = {"meta": {"commit": git_commit(), "llm_ms": args.llm_ms, "search_ms": args.search_ms}}
+    for hybrid in ("true", "false"):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", "--llm-ms", str(args.llm_ms),
+                              "--search-ms", str(args.search_ms)],
+                             env={**os.environ, "HYBRID_RETRIEVAL": hybrid}, capture_output=True, text=True,
+                             check=True).stdout
+        results["hybrid" if hybrid == "true" else "dense_only"] = summarize(json.loads(out.strip().splitlines()[-1]))
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Turns and LLM calls per completed lead: one field per turn vs. multi-slot extraction.
+
+Each scripted customer opens the interview, answers whatever is asked (some
+answers state several fields), and confirms the summary. The interview LLM is
+an oracle that returns the true value of each requested field the current
+message states, so the LLM-call counts measure how often the rules fall back,
+not model quality.
+
+It also checks that sentences which only look like answers ("I'm interested
+in applying", a confirmation with "เป็น" in it) fill no field.
+
+Usage (from the repo root):
+    python bench/interview_slots.py
+"""
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("MCP_OUTBOX_DB_PATH", os.path.join(tempfile.mkdtemp(), "mcp_outbox.db"))
+
+from langchain_core.messages import HumanMessage  # noqa: E402
+from langchain_core.runnables import RunnableLambda  # noqa: E402
+import interview_node  # noqa: E402
+from mcp_client import Delivery  # noqa: E402
+from pydantic_models import ProductInterestSlots  # noqa: E402
+
+ALL = {"name", "age", "occupation", "income", "product_name"}
+
+# open / replies: (message, fields it states); fields asked again after being stated get a plain answer
+CORPUS = [
+    {"truth": {"name": "สมชาย ใจดี", "age": 35, "occupation": "วิศวกร", "income": 60000,
+               "product_name": "คุ้มชีวา", "memo": ""},
+     "open": ("สวัสดีครับ ผมชื่อสมชาย ใจดี อายุ 35 เป็นวิศวกร เงินเดือน 60000 สนใจคุ้มชีวาครับ", ALL),
+     "replies": {"memo": ("-", {"memo"})}},
+    {"truth": {"name": "มาลี ศรีสุข", "age": 40, "occupation": "ครู", "income": 35000,
+               "product_name": "คุ้มออมสุข", "memo": "สะดวกให้ติดต่อช่วงเย็น"},
+     "open": ("ดิฉันชื่อ มาลี ศรีสุข อายุ ๔๐ ปี อาชีพครู รายได้เดือนละ ๓๕,๐๐๐ บาท อยากสมัครคุ้มออมสุขค่ะ", ALL),
+     "replies": {"memo": ("สะดวกให้ติดต่อช่วงเย็น", {"memo"})}},
+    {"truth": {"name": "วิชัย", "age": 38, "occupation": "ค้าขาย", "income": 60000,
+               "product_name": "คุ้มตลอดชีพ พลัส", "memo": ""},
+     "open": ("อยากสมัครประกันครับ", set()),
+     "replies": {"name": ("วิชัย", {"name"}), "age": ("สามสิบแปด", {"age"}), "occupation": ("ค้าขาย", {"occupation"}),
+                 "income": ("6 หมื่น", {"income"}), "product_name": ("2", {"product_name"}), "memo": ("ไม่มี", {"memo"})}},
+    {"truth": {"name": "นภา แสงทอง", "age": 29, "occupation": "พยาบาล", "income": 45000,
+               "product_name": "คุ้มรักษาเหมาจ่าย เอ็กซ์ตร้า", "memo": ""},
+     "open": ("สนใจคุ้มรักษาเหมาจ่าย เอ็กซ์ตร้า ค่ะ", {"product_name"}),
+     "replies": {"name": ("นภา แสงทอง อายุ 29 ค่ะ", {"name", "age"}),
+                 "occupation": ("พยาบาล เงินเดือน 4 หมื่นห้าพัน", {"occupation", "income"}), "memo": ("-", {"memo"})}},
+    {"truth": {"name": "John Smith", "age": 42, "occupation": "teacher", "income": 45000,
+               "product_name": "คุ้มออมสุข", "memo": ""},
+     "open": ("Hi, my name is John Smith, 42 years old, I work as a teacher and earn 45k baht. "
+              "Interested in คุ้มออมสุข", ALL),
+     "replies": {"memo": ("none", {"memo"})}},
+    {"truth": {"name": "Anna Lee", "age": 31, "occupation": "designer", "income": 80000,
+               "product_name": "ตลอดชีพ 90/20", "memo": "call after 6pm"},
+     "open": ("I'd like to sign up", set()),
+     "replies": {"name": ("Anna Lee", {"name"}), "age": ("31", {"age"}), "occupation": ("designer", {"occupation"}),
+                 "income": ("80,000", {"income"}), "product_name": ("5", {"product_name"}),
+                 "memo": ("call after 6pm", {"memo"})}},
+    {"truth": {"name": "ต้น", "age": 34, "occupation": "พนักงานบริษัทเอกชน", "income": 50000,
+               "product_name": "ตลอดชีพ 90/20", "memo": ""},
+     "open": ("ผมชื่อต้น อายุ 34 ทำงานบริษัทเอกชน สนใจตลอดชีพ 90/20", {"name", "age", "occupation", "product_name"}),
+     "replies": {"income": ("เดือนละห้าหมื่นครับ", {"income"}), "memo": ("-", {"memo"})}},
+    {"truth": {"name": "ปรีชา มั่นคง", "age": 45, "occupation": "เจ้าของกิจการ", "income": 120000,
+               "product_name": "คุ้มตลอดชีพ พลัส", "memo": ""},
+     "open": ("อยากซื้อคุ้มตลอดชีพ พลัส ชื่อ ปรีชา มั่นคง", {"product_name", "name"}),
+     "replies": {"age": ("45", {"age"}), "occupation": ("เจ้าของกิจการ รายได้ 1.2 แสน", {"occupation", "income"}),
+                 "memo": ("-", {"memo"})}},
+    {"truth": {"name": "Somsak", "age": 50, "occupation": "farmer", "income": 20000,
+               "product_name": "คุ้มชีวา", "memo": ""},
+     "open": ("my name is Somsak, i'm 50 and a farmer, interested in คุ้มชีวา",
+              {"name", "age", "occupation", "product_name"}),
+     "replies": {"income": ("about 20k a month", {"income"}), "memo": ("-", {"memo"})}},
+    {"truth": {"name": "กานต์ ทองดี", "age": 27, "occupation": "โปรแกรมเมอร์", "income": 55000,
+               "product_name": "คุ้มรักษาเหมาจ่าย เอ็กซ์ตร้า", "memo": ""},
+     "open": ("อยากได้ประกันสุขภาพค่ะ", set()),
+     "replies": {"name": ("กานต์ ทองดี ค่ะ อายุ 27 ทำงานเป็นโปรแกรมเมอร์", {"name", "age", "occupation"}),
+                 "income": ("55,000", {"income"}), "product_name": ("3", {"product_name"}), "memo": ("-", {"memo"})}},
+]
+
+
+# opening messages that state no field other than the product
+NOT_SLOTS = ["I'm interested in applying for a plan", "ฉันเป็นคนที่สนใจสมัครประกันค่ะ", "I'm a bit confused about the plans",
+             "ผมเป็นห่วงเรื่องค่ารักษาครับ"]
+# confirmations of the summary that must not change any field
+CONFIRMATIONS = ["ถูกต้องครับ เป็นข้อมูลที่ถูก", "yes, I'm happy with that", "ใช่ค่ะ เป็นแบบนี้แหละ"]
+
+
+def plain_answer(truth: dict, field: str) -> str:
+    return str(truth[field]) if truth[field] != "" else "-"
+
+
+async def run_lead(lead: dict, delivered: list, current: dict) -> dict:
+    truth, given = lead["truth"], set()
+    message, stated = lead["open"]
+    state, turns = {"messages": []}, 0
+    while turns < 20:
+        turns += 1
+        given |= stated
+        current["stated"] = stated
+        state = await interview_node.interview_node({**state, "messages": state["messages"] + [HumanMessage(content=message)]})
+        if state.get("done"):
+            break
+        if state.get("awaiting_confirmation"):
+            message, stated = ("ถูกต้องครับ" if interview_node.message_language(lead["open"][0]) == "th" else "yes"), set()
+            continue
+        field = state["awaiting_field"]
+        if field in lead["replies"] and field not in given:
+            message, stated = lead["replies"][field]
+        else:
+            message, stated = plain_answer(truth, field), {field}
+    return {"turns": turns, "llm_calls": current.pop("llm_calls", 0), "exact": bool(delivered) and delivered[-1] == truth}
+
+
+async def run(multi_slot: bool) -> dict:
+    interview_node.INTERVIEW_MULTI_SLOT = multi_slot
+    delivered, current = [], {}
+
+    async def deliver(name, arguments):
+        delivered.append(arguments)
+        return Delivery(None, True, len(delivered))
+
+    def oracle(messages):
+        current["llm_calls"] = current.get("llm_calls", 0) + 1
+        requested = re.search(r"states them: (.*?)\. Return", messages[0].content).group(1).split(", ")
+        return ProductInterestSlots(**{f: current["truth"][f] for f in requested if f in current["stated"]})
+
+    interview_node.mcp_client().deliver = deliver
+    interview_node.slot_llm.override(RunnableLambda(oracle))
+    results = []
+    for lead in CORPUS:
+        current["truth"] = lead["truth"]
+        results.append(await run_lead(lead, delivered, current))
+    n = len(results)
+    return {"mode": "multi_slot" if multi_slot else "one_field_per_turn", "leads": n,
+            "completed_exact": sum(r["exact"] for r in results),
+            "turns_per_lead": round(sum(r["turns"] for r in results) / n, 2),
+            "llm_calls_per_lead": round(sum(r["llm_calls"] for r in results) / n, 2),
+            "turns": [r["turns"] for r in results]}
+
+
+async def check_false_slots() -> dict:
+    """Fields wrongly filled from NOT_SLOTS openings and CONFIRMATIONS (the oracle LLM states nothing)."""
+    delivered, truth = [], CORPUS[0]["truth"]
+
+    async def deliver(name, arguments):
+        delivered.append(arguments)
+        return Delivery(None, True, len(delivered))
+
+    interview_node.mcp_client().deliver = deliver
+    interview_node.slot_llm.override(RunnableLambda(lambda messages: ProductInterestSlots()))
+    wrong = []
+    for message in NOT_SLOTS:
+        state = await interview_node.interview_node({"messages": [HumanMessage(content=message)]})
+        if state.get("customer_data"):
+            wrong.append({"message": message, "filled": state["customer_data"]})
+    for message in CONFIRMATIONS:
+        state = await interview_node.interview_node({"messages": [HumanMessage(content=message)], "customer_data": truth,
+                                                     "awaiting_confirmation": True})
+        if not state.get("done") or delivered[-1] != truth:
+            wrong.append({"message": message, "delivered": delivered[-1] if state.get("done") else None})
+    return {"messages": len(NOT_SLOTS) + len(CONFIRMATIONS), "wrong": wrong}
+
+
+def main():
+    results = [asyncio.run(run(False)), asyncio.run(run(True)), {"false_slots": asyncio.run(check_false_slots())}]
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
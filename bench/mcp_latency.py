@@ -0,0 +1,123 @@
+"""Per-call MCP latency: a new client per call (old log_to_mcp) vs. the shared mcp_client session.
+
+Starts a local stand-in MCP server with the same log_product_interest tool
+signature, then also checks the outage path: calls made while the server is
+down are queued in the outbox and flushed after it comes back.
+
+Usage (from the repo root):
+    python bench/mcp_latency.py --calls 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+STAND_IN_SERVER = '''
+import sys
+from fastmcp import FastMCP
+mcp = FastMCP("stand-in")
+
+@mcp.tool()
+def log_product_interest(name: str, age: int, occupation: str, income: int, product_name: str, memo: str = "") -> dict:
+    return {"message": f"logged {name}"}
+
+mcp.run(transport="streamable-http", host="127.0.0.1", port=int(sys.argv[1]), show_banner=False)
+'''
+INTEREST = {"name": "สมชาย", "age": 35, "occupation": "engineer", "income": 50000, "product_name": "คุ้มชีวา", "memo": ""}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int) -> subprocess.Popen:
+    proc = subprocess.Popen([sys.executable, "-c", STAND_IN_SERVER, str(port)],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("stand-in MCP server did not start")
+
+
+def percentiles(samples: list) -> dict:
+    samples = sorted(samples)
+    return {"p50_ms": round(statistics.median(samples), 2),
+            "p95_ms": round(samples[max(int(len(samples) * 0.95) - 1, 0)], 2),
+            "mean_ms": round(statistics.mean(samples), 2)}
+
+
+async def per_call_client(url: str, calls: int) -> list:
+    from fastmcp import Client
+    samples = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        async with Client(url) as client:
+            await client.call_tool("log_product_interest", INTEREST)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+async def shared_session(manager, calls: int) -> list:
+    samples = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        await manager.deliver("log_product_interest", INTEREST)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=50)
+    args = parser.parse_args()
+
+    from mcp_client import MCPClientManager, MCPOutbox
+
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/mcp"
+    outbox = MCPOutbox(os.path.join(tempfile.mkdtemp(), "outbox.db"))
+    manager = MCPClientManager(url, outbox, max_retries=2, backoff_base=0.05, backoff_max=0.5, flush_interval=0.5)
+    results = {"calls": args.calls}
+
+    server = start_server(port)
+    try:
+        await per_call_client(url, 3)  # warm up the server
+        results["client_per_call"] = percentiles(await per_call_client(url, args.calls))
+        results["shared_session"] = percentiles(await shared_session(manager, args.calls))
+
+        # outage: calls are queued instead of failing, then flushed once the server is back
+        server.kill()
+        server.wait()
+        outage = await shared_session(manager, 10)
+        results["outage"] = {"queued": len(outbox), **percentiles(outage)}
+
+        server = start_server(port)
+        started = time.perf_counter()
+        while len(outbox) and time.perf_counter() - started < 30:
+            await asyncio.sleep(0.1)
+        results["recovery"] = {"outbox_left": len(outbox), "seconds": round(time.perf_counter() - started, 2),
+                               **{k: v for k, v in manager.stats().items() if k != "outbox_pending"}}
+    finally:
+        await manager.close()
+        server.kill()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,185 @@
+"""Throughput and correctness of the MCP server storage backends under concurrent writers.
+
+Store level: --clients threads each append --calls records, for every backend
+plus the legacy open/append/close CSV writer. Every row must come back
+intact and exactly once. A record replayed with the same request_id (a
+retried call), in the same batch, a later call and after reopening the
+store, must be stored once.
+
+End to end (--e2e): runs mcpserver/server.py and has --clients concurrent
+MCP clients call log_product_interest, then checks query_product_interests.
+
+Usage (from the repo root):
+    python bench/mcp_storage.py --clients 100 --calls 50 [--e2e]
+"""
+import argparse
+import asyncio
+import csv
+import importlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+MCPSERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "mcpserver")
+
+
+def record(client: int, call: int) -> dict:
+    return {"name": f"client{client}-call{call}", "age": 30 + call % 40, "occupation": "engineer, \"senior\"",
+            "income": 50000 + client, "product_name": f"product-{client % 5}", "memo": "line1\nline2 ทดสอบ"}
+
+
+def legacy_append(path: str, r: dict) -> None:
+    """The original log_product_interest write path."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    file_exists = os.path.exists(path)
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if not file_exists:
+            writer.writerow(["name", "age", "occupation", "income", "product_name", "memo"])
+        writer.writerow([r["name"], r["age"], r["occupation"], r["income"], r["product_name"], r["memo"]])
+
+
+def hammer(append, clients: int, calls: int) -> float:
+    barrier = threading.Barrier(clients)
+
+    def worker(client):
+        barrier.wait()
+        for call in range(calls):
+            append(record(client, call))
+
+    threads = [threading.Thread(target=worker, args=(c,)) for c in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - started
+
+
+def check(rows: list, clients: int, calls: int) -> dict:
+    expected = {(record(c, i)["name"], record(c, i)["memo"]) for c in range(clients) for i in range(calls)}
+    got = [(r["name"], r["memo"]) for r in rows]
+    return {"rows": len(got), "expected": len(expected), "missing": len(expected - set(got)),
+            "duplicates": len(got) - len(set(got)), "corrupt": sum(1 for g in got if g not in expected)}
+
+
+def load_storage(data_dir: str, backend: str):
+    os.environ.update(MCP_DATA_DIR=data_dir, MCP_STORAGE_BACKEND=backend,
+                      MCP_SQLITE_PATH=os.path.join(data_dir, "interested_users.db"),
+                      MCP_CSV_PATH=os.path.join(data_dir, "interested_users.csv"),
+                      MCP_CSV_MAX_BYTES=str(256 * 1024))  # small, so rotation is exercised
+    if MCPSERVER_DIR not in sys.path:
+        sys.path.insert(0, MCPSERVER_DIR)
+    import storage
+    return importlib.reload(storage)
+
+
+def check_idempotent(storage, backend: str) -> dict:
+    keyed = {**record(0, 0), "request_id": "retry-1"}
+    store = storage.create_store(backend)
+    new = [store.append([keyed, keyed]), store.append([keyed])]
+    store.close()
+    store = storage.create_store(backend)  # ids already on disk
+    new.append(store.append([keyed]))
+    rows, total = store.query(limit=10)
+    store.close()
+    return {"replay_new_rows": new, "replay_stored": total}
+
+
+def bench_store(backend: str, clients: int, calls: int) -> dict:
+    data_dir = tempfile.mkdtemp()
+    if backend == "legacy_csv":
+        path = os.path.join(data_dir, "interested_users.csv")
+        seconds = hammer(lambda r: legacy_append(path, r), clients, calls)
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        storage = load_storage(data_dir, backend)
+        store = storage.create_store(backend)
+        seconds = hammer(lambda r: store.append([r]), clients, calls)
+        rows, total = store.query(limit=clients * calls + 1)
+        store.close()
+        replay = check_idempotent(load_storage(tempfile.mkdtemp(), backend), backend)
+    return {"backend": backend, "seconds": round(seconds, 2),
+            "writes_per_s": round(clients * calls / seconds), **check(rows, clients, calls),
+            **(replay if backend != "legacy_csv" else {})}
+
+
+async def bench_e2e(clients: int, calls: int, backend: str) -> dict:
+    from fastmcp import Client
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    data_dir = tempfile.mkdtemp()
+    env = {**os.environ, "MCP_PORT": str(port), "MCP_DATA_DIR": data_dir, "MCP_STORAGE_BACKEND": backend,
+           "MCP_SQLITE_PATH": os.path.join(data_dir, "interested_users.db"),
+           "MCP_CSV_PATH": os.path.join(data_dir, "interested_users.csv")}
+    server = subprocess.Popen([sys.executable, "server.py"], cwd=MCPSERVER_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}/mcp"
+    try:
+        for _ in range(300):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+                break
+            except OSError:
+                await asyncio.sleep(0.1)
+
+        connected = asyncio.Event()
+        ready = []
+
+        async def client_worker(client_no):
+            async with Client(url, timeout=60) as client:
+                ready.append(client_no)
+                if len(ready) == clients:
+                    connected.set()
+                await connected.wait()  # time the calls, not the 100 session handshakes
+                for call in range(calls):
+                    await client.call_tool("log_product_interest", record(client_no, call))
+
+        workers = [asyncio.create_task(client_worker(c)) for c in range(clients)]
+        await connected.wait()
+        started = time.perf_counter()
+        await asyncio.gather(*workers)
+        seconds = time.perf_counter() - started
+
+        rows = []
+        async with Client(url, timeout=60) as client:
+            offset = 0
+            while offset is not None:
+                page = (await client.call_tool("query_product_interests", {"limit": 1000, "offset": offset})).data
+                rows.extend(page["items"])
+                offset = page["next_offset"]
+            bulk = (await client.call_tool("log_product_interests_bulk",
+                                           {"interests": [record(999, i) for i in range(500)]})).data
+            filtered = (await client.call_tool("query_product_interests",
+                                               {"product_name": "product-4", "limit": 1})).data
+    finally:
+        server.kill()
+    return {"backend": backend, "clients": clients, "seconds": round(seconds, 2),
+            "calls_per_s": round(clients * calls / seconds), **check(rows, clients, calls),
+            "bulk_logged": bulk["count"], "product-4_total": filtered["total"]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--e2e", action="store_true")
+    parser.add_argument("--e2e-calls", type=int, default=5)
+    args = parser.parse_args()
+
+    results = {"store": [bench_store(b, args.clients, args.calls) for b in ("legacy_csv", "csv", "sqlite")]}
+    if args.e2e:
+        results["e2e"] = [asyncio.run(bench_e2e(args.clients, args.e2e_calls, b)) for b in ("csv", "sqlite")]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Checks of the local pre-router: which messages skip router_llm, and whether its model can be trusted.
+
+1. decisions: labelled messages, each on a first turn or after earlier
+   turns, with the expected pre-route (None = deferred to router_llm).
+   Small talk, purchase intent and product names are decided by the rules;
+   off-domain questions ("what is the capital of France") and questions
+   about the conversation ("ผมชื่ออะไร") must reach the LLM router.
+2. calibration: the naive Bayes model's 'rag' confidence on held-out KB
+   questions and on held-out off-domain / conversation questions, the
+   lowest PREROUTER_MIN_CONFIDENCE that keeps every off-domain one away
+   from 'rag', and how many KB questions would still be pre-routed with it.
+
+Runs the pre-router as configured (PREROUTER_* environment variables), so
+it also checks a calibration before PREROUTER_MODEL_ROUTES is enabled.
+Prints JSON and exits with status 1 when a decision is wrong. No LLM calls.
+
+Usage (from the repo root):
+    python bench/prerouter.py [--out prerouter.json]
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from intent_classifier import PreRouter  # noqa: E402
+
+# (message, has earlier turns, expected route or None to defer to router_llm)
+DECISIONS = [
+    ("สวัสดีครับ", False, "end"),
+    ("ขอบคุณมากครับ บาย", True, "end"),
+    ("thank you so much", True, "end"),
+    ("สนใจสมัครคุ้มออมสุขครับ", True, "interview"),
+    ("i want to buy this plan", False, "interview"),
+    ("คุ้มชีวา คุ้มครองอะไรบ้าง", False, "rag"),
+    ("What does คุ้มตลอดชีพ พลัส cover?", True, "rag"),
+    ("what is the capital of France", False, None),
+    ("what's the weather today", False, None),
+    ("who won the football game last night", False, None),
+    ("ผมชื่ออะไร", False, None),
+    ("ผมชื่ออะไร", True, None),
+    ("เมื่อกี้ผมถามอะไรไป", True, None),
+    ("what did I just ask", True, None),
+    ("แล้วเบี้ยเท่าไหร่?", True, None),
+    ("ประกันสุขภาพคุ้มครองอะไรบ้าง", True, None),
+]
+# held out of ROUTE_EXAMPLES
+KB_QUESTIONS = [
+    "ประกันสุขภาพคุ้มครองอะไรบ้าง", "เบี้ยประกันเท่าไหร่", "ต้องจ่ายเบี้ยกี่ปี", "เคลมค่ารักษาพยาบาลยังไง",
+    "what is the waiting period for claims", "how do i claim hospital costs", "can i pay the premium monthly",
+    "what is the sum insured of the health plan",
+]
+OFF_DOMAIN = [
+    "what is the capital of France", "what's the weather today", "who won the football game last night",
+    "tell me a joke", "ทำไมท้องฟ้าสีฟ้า", "วันนี้อากาศเป็นยังไง", "ผมชื่ออะไร", "เมื่อกี้ผมถามอะไรไป",
+    "what did I just ask", "how old am I",
+]
+
+
+def check_decisions(prerouter: PreRouter, failures: list) -> list:
+    rows = []
+    for message, has_history, expected in DECISIONS:
+        decision = prerouter.classify(message, has_history)
+        route = decision.route if decision else None
+        rows.append({"message": message, "has_history": has_history, "expected": expected, "route": route,
+                     "source": decision.source if decision else None})
+        if route != expected:
+            failures.append(f"decisions: {message!r} (history {has_history}) pre-routed to {route}, "
+                            f"expected {expected}")
+    return rows
+
+
+def calibrate(prerouter: PreRouter) -> dict:
+    def rag_confidence(text: str) -> float:
+        route, confidence = prerouter.model.predict(text)
+        return confidence if route == "rag" else 0.0
+
+    off_domain = {q: round(rag_confidence(q), 4) for q in OFF_DOMAIN}
+    kb = {q: round(rag_confidence(q), 4) for q in KB_QUESTIONS}
+    # strictly above every off-domain confidence
+    threshold = max(off_domain.values())
+    return {"configured_min_confidence": prerouter.min_confidence, "model_routes": sorted(prerouter.model_routes),
+            "safe_min_confidence_above": threshold,
+            "kb_questions_pre_routed_at_safe_threshold": f"{sum(c > threshold for c in kb.values())}/{len(kb)}",
+            "off_domain_rag_confidence": off_domain, "kb_rag_confidence": kb}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    failures = []
+    prerouter = PreRouter()
+    results = {"decisions": check_decisions(prerouter, failures), "calibration": calibrate(prerouter),
+               "failures": failures}
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""Replay recorded chat sessions against this build with every external call served from cassettes.
+
+Record first: run the backend with CASSETTE_DIR set (see backend/cassette.py),
+so each chat turn leaves its LLM, embedding, Tavily and MCP calls in
+<CASSETTE_DIR>/<session_id>.jsonl. The replayer copies rag_app.db and
+chroma_db from --data-dir into a scratch directory and takes the sessions in
+chat_history that have a cassette. Their questions are posted turn by turn to
+the in-process app, on the endpoint each turn was recorded on (/chat or
+/chat/stream). Each external call is answered from the turn's
+cassette after its recorded latency, scaled by --speed. Calls the cassette
+does not hold are counted as misses and answered by the stand-ins in
+stand_ins.py; these are calls new in this build, or cache hits at recording
+time. No network access is needed. Run it with the cache settings
+(ANSWER_CACHE_ENABLED, WEB_SEARCH_CACHE_ENABLED) the recording was made with,
+or expect call counts to differ for that reason alone.
+
+Reports per-turn and total latency, calls by kind and LLM tokens, replay
+against the recorded baseline, as JSON. With --max-regression R it exits
+with status 1 when mean turn latency, LLM calls or LLM tokens grow by more
+than R (0.1 = 10%). p50 is reported but not gated: most turns (interview,
+greetings) take milliseconds, so it is mostly noise.
+
+Usage (from the repo root):
+    python bench/replay.py --data-dir backend --cassettes backend/cassettes [--sessions 50] [--out replay.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import stand_ins
+from suite import BACKEND_DIR, BENCH_DIR, git_commit, latency_summary
+
+speed = 1.0  # recorded latency multiplier (--speed)
+GATED = ("mean_ms", "llm_calls", "llm_tokens")  # growth figures checked by --max-regression
+
+
+class ReplayTurn:
+    """The recorded calls of one turn, served per (kind, key) in recorded order."""
+
+    def __init__(self, recording: dict):
+        self.recording = recording
+        self.queues: Dict[tuple, deque] = {}
+        for call in recording.get("calls", []):
+            self.queues.setdefault((call["kind"], call["key"]), deque()).append(call)
+        self.calls: Counter = Counter()
+        self.misses: Counter = Counter()
+        self.tokens = [0, 0]
+
+    def take(self, kind: str, key: str) -> Optional[dict]:
+        queue = self.queues.get((kind, key))
+        call = queue.popleft() if queue else None
+        self.calls[kind] += 1
+        if call is None:
+            self.misses[kind] += 1
+        return call
+
+
+current_turn: ContextVar[Optional[ReplayTurn]] = ContextVar("current_turn", default=None)
+
+
+def take(kind: str, key: str) -> Optional[dict]:
+    turn = current_turn.get()
+    return turn.take(kind, key) if turn is not None else None
+
+
+class ReplayChatOpenAI(stand_ins.FakeChatOpenAI):
+    """Answers with the recorded response of the same node (and output schema)."""
+
+    def _reply(self, messages, run_manager=None) -> tuple:
+        from cassette import llm_key
+        from metrics import current_node
+
+        node = current_node.get()
+        if node == "none" and run_manager is not None:
+            node = (run_manager.metadata or {}).get("langgraph_node", "none")
+        schema = self.structured_schema.__name__ if self.structured_schema is not None else None
+        call = take("llm", llm_key(node, schema))
+        if call is None:
+            content, usage, seconds = super()._reply(messages, run_manager)
+        else:
+            prompt_tokens, completion_tokens = call.get("tokens") or (0, 0)
+            usage = {"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                     "total_tokens": prompt_tokens + completion_tokens}
+            content, seconds = call["response"], call["ms"] / 1000 * speed
+        turn = current_turn.get()
+        if turn is not None:
+            turn.tokens[0] += usage["input_tokens"]
+            turn.tokens[1] += usage["output_tokens"]
+        return content, usage, seconds
+
+
+class ReplayEmbeddings(stand_ins.FakeEmbeddings):
+    """Recorded vectors by text; texts never recorded get a stand-in vector."""
+
+    def _replay(self, texts: List[str]) -> tuple:
+        from cassette import decode_vector
+
+        vectors, seconds = [], 0.0
+        for text in texts:
+            call = take("embedding", text)
+            if call is None:
+                vectors.append(self._vector(text))
+                seconds += self._delay(1)
+            else:
+                vectors.append(decode_vector(call["response"]))
+                seconds += call["ms"] / 1000 * speed
+        return vectors, seconds
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors, seconds = self._replay(texts)
+        time.sleep(seconds)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors, seconds = self._replay(texts)
+        await asyncio.sleep(seconds)
+        return vectors
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class ReplayTavilySearch(stand_ins.FakeTavilySearch):
+    async def ainvoke(self, payload: dict, *args, **kwargs) -> dict:
+        call = take("tavily", payload["query"])
+        if call is None:
+            return await super().ainvoke(payload)
+        await asyncio.sleep(call["ms"] / 1000 * speed)
+        return call["response"]
+
+
+async def replay_mcp_call_tool(name: str, arguments: dict):
+    from cassette import mcp_key
+
+    call = take("mcp", mcp_key(name, arguments))
+    if call is None:
+        return await stand_ins.fake_mcp_call_tool(name, arguments)
+    await asyncio.sleep(call["ms"] / 1000 * speed)
+    result = call["response"]
+    return SimpleNamespace(data=result["data"], structured_content=result["structured_content"],
+                           content=[SimpleNamespace(text=result["text"])])
+
+
+def copy_data(data_dir: str, workdir: str) -> None:
+    """Snapshot the chat/document database and the Chroma index so the replay never writes to them."""
+    source = sqlite3.connect(os.path.join(data_dir, "rag_app.db"))
+    target = sqlite3.connect(os.path.join(workdir, "rag_app.db"))
+    source.backup(target)
+    source.close()
+    target.close()
+    if os.path.isdir(os.path.join(data_dir, "chroma_db")):
+        shutil.copytree(os.path.join(data_dir, "chroma_db"), os.path.join(workdir, "chroma_db"))
+
+
+def recorded_sessions(db_path: str, cassette_dir: str, limit: Optional[int]) -> List[tuple]:
+    """(session_id, [(question, recorded turn)]) for chat_history sessions that have a cassette."""
+    from cassette import load_cassette
+
+    conn = sqlite3.connect(db_path)
+    questions: Dict[str, List[str]] = {}
+    for session_id, question in conn.execute('SELECT session_id, user_query FROM chat_history ORDER BY created_at, id'):
+        questions.setdefault(session_id, []).append(question)
+    conn.close()
+
+    sessions = []
+    for session_id, asked in questions.items():
+        recorded = load_cassette(session_id, cassette_dir)
+        if not recorded:
+            continue
+        turns, position = [], 0
+        for question in asked:
+            # turns recorded out of step (e.g. a failed turn) are matched by question
+            match = next((i for i in range(position, len(recorded)) if recorded[i]["question"] == question), None)
+            if match is None:
+                turns.append((question, {"calls": [], "ms": None}))
+            else:
+                turns.append((question, recorded[match]))
+                position = match + 1
+        sessions.append((session_id, turns))
+    return sessions[:limit] if limit else sessions
+
+
+def embedding_dim(sessions: List[tuple]) -> Optional[int]:
+    from cassette import decode_vector
+
+    for _, turns in sessions:
+        for _, recording in turns:
+            for call in recording["calls"]:
+                if call["kind"] == "embedding":
+                    return len(decode_vector(call["response"]))
+    return None
+
+
+def totals(turns: List[dict], side: str) -> dict:
+    calls, tokens = Counter(), [0, 0]
+    for turn in turns:
+        calls.update(turn[side]["calls"])
+        tokens = [a + b for a, b in zip(tokens, turn[side]["llm_tokens"])]
+    return {"turn_latency": latency_summary([t[side]["ms"] for t in turns if t[side]["ms"] is not None]),
+            "calls": dict(calls), "llm_tokens": {"prompt": tokens[0], "completion": tokens[1]}}
+
+
+def growth(before: float, after: float) -> Optional[float]:
+    return round((after - before) / before, 4) if before else None
+
+
+async def run(args, sessions: List[tuple]) -> dict:
+    import httpx
+    import main
+    from mcp_client import mcp_client
+
+    from resources import registry
+
+    mcp_client().call_tool = replay_mcp_call_tool
+    await registry.startup()  # the ASGI transport skips the lifespan, which warms up the resources
+    semaphore = asyncio.Semaphore(args.concurrency)
+    results: List[dict] = []
+
+    async def replay_session(session_id: str, turns: List[tuple]):
+        async with semaphore:
+            for index, (question, recording) in enumerate(turns):
+                turn = ReplayTurn(recording)
+                token = current_turn.set(turn)
+                started = time.perf_counter()
+                try:
+                    response = await client.post(recording.get("endpoint") or "/chat",
+                                                 json={"question": question, "session_id": f"replay-{session_id}"})
+                finally:
+                    current_turn.reset(token)
+                # /chat/stream reports failures as an SSE error event on a 200 response
+                failed = response.status_code != 200 or response.text.startswith("event: error") \
+                    or "\nevent: error" in response.text
+                recorded_calls = recording.get("calls", [])
+                results.append({
+                    "session_id": session_id, "turn": index, "question": question[:80],
+                    "ok": not failed,
+                    "baseline": {"ms": recording.get("ms"), "calls": dict(Counter(c["kind"] for c in recorded_calls)),
+                                 "llm_tokens": [sum((c.get("tokens") or (0, 0))[i] for c in recorded_calls
+                                                    if c["kind"] == "llm") for i in (0, 1)]},
+                    "replay": {"ms": round((time.perf_counter() - started) * 1000, 1), "calls": dict(turn.calls),
+                               "misses": dict(turn.misses), "llm_tokens": turn.tokens},
+                })
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=600) as client:
+        await asyncio.gather(*(replay_session(session_id, turns) for session_id, turns in sessions))
+    await mcp_client().close()
+
+    results.sort(key=lambda t: (t["session_id"], t["turn"]))
+    compared = [t for t in results if t["baseline"]["ms"] is not None]
+    baseline, replay = totals(compared, "baseline"), totals(compared, "replay")
+    misses = Counter()
+    for turn in results:
+        misses.update(turn["replay"]["misses"])
+    replay.update({"misses": dict(misses), "errors": sum(not t["ok"] for t in results)})
+    delta = {
+        "mean_ms": growth(baseline["turn_latency"].get("mean_ms", 0), replay["turn_latency"].get("mean_ms", 0)),
+        "p50_ms": growth(baseline["turn_latency"].get("p50_ms", 0), replay["turn_latency"].get("p50_ms", 0)),
+        "llm_calls": growth(baseline["calls"].get("llm", 0), replay["calls"].get("llm", 0)),
+        "llm_tokens": growth(sum(baseline["llm_tokens"].values()), sum(replay["llm_tokens"].values())),
+    }
+    return {"meta": {"commit": git_commit(), "sessions": len(sessions), "turns": len(results),
+                     "unrecorded_turns": len(results) - len(compared), "speed": speed,
+                     "concurrency": args.concurrency, "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z")},
+            "baseline": baseline, "replay": replay, "growth": delta, "turns": results}
+
+
+def main():
+    global speed
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="backend", help="working directory of the recorded backend")
+    parser.add_argument("--cassettes", help="cassette directory (default: <data-dir>/cassettes)")
+    parser.add_argument("--sessions", type=int, help="replay at most this many sessions")
+    parser.add_argument("--concurrency", type=int, default=1, help="sessions replayed at once")
+    parser.add_argument("--speed", type=float, default=1.0, help="recorded latency multiplier (0 = no waiting)")
+    parser.add_argument("--max-regression", type=float, help="exit 1 when mean latency, LLM calls or tokens grow more")
+    parser.add_argument("--workdir", help="scratch directory (default: a new temp dir)")
+    parser.add_argument("--out", help="also write the JSON results to this file")
+    args = parser.parse_args()
+    speed = args.speed
+
+    data_dir = os.path.abspath(args.data_dir)
+    cassette_dir = os.path.abspath(args.cassettes or os.path.join(data_dir, "cassettes"))
+    out_path = os.path.abspath(args.out) if args.out else None
+    workdir = args.workdir or tempfile.mkdtemp(prefix="rag-replay-")
+    copy_data(data_dir, workdir)
+
+    os.environ.update({"OPENAI_API_KEY": "replay", "TAVILY_API_KEY": "replay", "CASSETTE_DIR": "",
+                       "INDEX_ON_STARTUP": "false", "MCP_OUTBOX_FLUSH_INTERVAL_SECONDS": "3600"})
+    os.chdir(workdir)
+    sys.path[:] = [BACKEND_DIR] + [p for p in sys.path if os.path.abspath(p or ".") != BENCH_DIR] + [BENCH_DIR]
+    import langchain_openai
+    import langchain_tavily
+
+    langchain_openai.ChatOpenAI = ReplayChatOpenAI
+    langchain_openai.OpenAIEmbeddings = ReplayEmbeddings
+    langchain_tavily.TavilySearch = ReplayTavilySearch
+
+    sessions = recorded_sessions("rag_app.db", cassette_dir, args.sessions)
+    if not sessions:
+        sys.exit(f"No chat_history session in {data_dir} has a cassette in {cassette_dir}")
+    stand_ins.settings.embedding_dim = embedding_dim(sessions) or stand_ins.settings.embedding_dim
+
+    # the backend prints retrieval results; keep stdout for the JSON
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = asyncio.run(run(args, sessions))
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+    if args.max_regression is not None:
+        regressed = {name: results["growth"][name] for name in GATED
+                     if results["growth"][name] is not None and results["growth"][name] > args.max_regression}
+        if regressed:
+            print(f"Regression over {args.max_regression:.0%}: {regressed}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
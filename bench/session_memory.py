@@ -0,0 +1,60 @@
+"""Measure resident memory of idle sessions: plain dict vs. the session store.
+
+Usage (from the repo root):
+    python bench/session_memory.py --sessions 10000 --turns 5
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from langchain_core.messages import AIMessage, HumanMessage  # noqa: E402
+from session_store import MemorySessionStore, SqliteSessionStore, TieredSessionStore  # noqa: E402
+
+
+def make_state(turns: int) -> dict:
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"คุ้มชีวา คุ้มครองอะไรบ้างครับ ({i})"))
+        messages.append(AIMessage(content="แผนประกันคุ้มชีวาให้ความคุ้มครองชีวิต " * 10))
+    return {"messages": messages, "route": "answer", "rag": "chunk " * 200}
+
+
+def measure(label: str, store_factory, sessions: int, turns: int) -> dict:
+    tracemalloc.start()
+    store = store_factory()
+    for i in range(sessions):
+        state = make_state(turns)
+        if isinstance(store, dict):
+            store[f"session-{i}"] = state
+        else:
+            store.put(f"session-{i}", state)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"store": label, "sessions": sessions, "current_mb": round(current / 2**20, 1), "peak_mb": round(peak / 2**20, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--cache-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    db_path = os.path.join(tmpdir, "sessions.db")
+    results = [
+        measure("dict", dict, args.sessions, args.turns),
+        measure("memory-lru", lambda: MemorySessionStore(max_entries=args.cache_size), args.sessions, args.turns),
+        measure("tiered", lambda: TieredSessionStore(MemorySessionStore(max_entries=args.cache_size),
+                                                     SqliteSessionStore(db_path)), args.sessions, args.turns),
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Deterministic local stand-ins for ChatOpenAI, OpenAIEmbeddings, TavilySearch and the MCP server.
+
+install() must run before the backend builds its first model: the resource
+factories import `from langchain_openai import ChatOpenAI` when they run, so
+patching the package attributes first swaps every instance. Latency and token
+counts come from the module-level `settings`.
+
+Structured outputs are answered by rule so runs are reproducible:
+- RouteDecision: 'interview' for buying intent, 'end' for greetings, 'answer'
+  for arithmetic and account questions, else 'rag'
+- RagJudge: insufficient for questions about the latest news, so the web path runs
+- anything else: the schema with every field left at its default
+
+Contextualization requests get the question prefixed with the catalog product
+named most recently in the history, so follow-ups retrieve like a real rewrite.
+"""
+import asyncio
+import hashlib
+import re
+import time
+from dataclasses import asdict, dataclass
+from types import SimpleNamespace
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import ConfigDict, Field
+
+
+@dataclass
+class StandInSettings:
+    llm_latency_ms: float = 300.0        # time to first token / fixed cost of every LLM call
+    llm_ms_per_token: float = 10.0       # per completion token
+    completion_tokens: int = 120         # length of free-text answers
+    embed_latency_ms: float = 40.0       # per embeddings request
+    embed_ms_per_text: float = 0.5       # per text in a batch
+    embedding_dim: int = 256
+    search_latency_ms: float = 800.0     # per Tavily search
+    mcp_latency_ms: float = 20.0         # per MCP tool call
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+settings = StandInSettings()
+last_prompt = ""  # last free-text prompt, for checks on what the answer node was given
+counters = {"llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "embed_requests": 0, "embedded_texts": 0,
+            "searches": 0, "mcp_calls": 0}
+
+INTERVIEW_INTENT = re.compile(r"สมัคร|อยากซื้อ|สนใจซื้อ|sign up|\bbuy\b|\bapply\b", re.IGNORECASE)
+GREETING = re.compile(r"^\s*(สวัสดี|ขอบคุณ|hello|hi|thanks)", re.IGNORECASE)
+DIRECT_ANSWER = re.compile(r"password|รหัสผ่าน|\d\s*[-+*/]\s*\d", re.IGNORECASE)
+NEEDS_WEB = re.compile(r"ล่าสุด|latest|news|ข่าว", re.IGNORECASE)
+ANSWER_WORDS = "The plan covers death benefit and maturity benefit with premiums paid annually".split()
+
+
+def last_human(messages: List[BaseMessage]) -> str:
+    return next((str(m.content) for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+
+
+def respond(schema: Any, messages: List[BaseMessage]) -> Any:
+    text = last_human(messages)
+    name = schema.__name__
+    if name == "RouteDecision":
+        if INTERVIEW_INTENT.search(text):
+            return schema(route="interview")
+        if GREETING.search(text):
+            return schema(route="end", reply="สวัสดีครับ มีอะไรให้ช่วยไหมครับ")
+        if DIRECT_ANSWER.search(text):
+            return schema(route="answer")
+        return schema(route="rag")
+    if name == "RagJudge":
+        question = text.split("Retrieved info:")[0]
+        return schema(sufficient=not NEEDS_WEB.search(question))
+    return schema()
+
+
+def standalone_question(messages: List[BaseMessage]) -> str:
+    from utils import match_product_name  # backend module; imported late so install() runs first
+
+    question = last_human(messages)
+    products = (match_product_name(str(m.content)) for m in reversed(messages[1:-1]))
+    product = next((p for p in products if p), None)
+    return f"{product} {question}" if product and product not in question else question
+
+
+def estimate_tokens(text: str) -> int:
+    from history import count_tokens  # backend module; imported late so install() runs first
+    return count_tokens(text)
+
+
+class FakeChatOpenAI(BaseChatModel):
+    """ChatOpenAI stand-in: fixed latency plus per-token time, usage metadata on every reply."""
+
+    model_config = ConfigDict(populate_by_name=True, extra="ignore", arbitrary_types_allowed=True)
+
+    model_name: str = Field(default="gpt-4.1-mini", alias="model")
+    temperature: float = 0.0
+    stream_usage: bool = False
+    structured_schema: Optional[Any] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "bench-stand-in"
+
+    def _reply(self, messages: List[BaseMessage], run_manager=None) -> tuple:
+        """(content, usage metadata, seconds the call takes)."""
+        global last_prompt
+        prompt_tokens = sum(estimate_tokens(str(m.content)) for m in messages)
+        if self.structured_schema is not None:
+            content = respond(self.structured_schema, messages).model_dump_json()
+            completion_tokens = estimate_tokens(content)
+        elif messages and "standalone question" in str(messages[0].content):
+            content = standalone_question(messages)
+            completion_tokens = estimate_tokens(content)
+        else:
+            last_prompt = "\n".join(str(m.content) for m in messages)
+            completion_tokens = settings.completion_tokens
+            content = " ".join(ANSWER_WORDS[i % len(ANSWER_WORDS)] for i in range(completion_tokens))
+        counters["llm_calls"] += 1
+        counters["prompt_tokens"] += prompt_tokens
+        counters["completion_tokens"] += completion_tokens
+        usage = {"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        return content, usage, (settings.llm_latency_ms + settings.llm_ms_per_token * completion_tokens) / 1000
+
+    def _result(self, content: str, usage: dict) -> ChatResult:
+        message = AIMessage(content=content, usage_metadata=usage, response_metadata={"model_name": self.model_name})
+        return ChatResult(generations=[ChatGeneration(message=message)],
+                          llm_output={"model_name": self.model_name})
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        content, usage, seconds = self._reply(messages, run_manager)
+        time.sleep(seconds)
+        return self._result(content, usage)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        content, usage, seconds = self._reply(messages, run_manager)
+        await asyncio.sleep(seconds)
+        return self._result(content, usage)
+
+    async def _astream(self, messages, stop=None, run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs):
+        content, usage, seconds = self._reply(messages, run_manager)
+        words = content.split(" ")
+        per_word = min(settings.llm_ms_per_token / 1000, seconds / len(words))
+        await asyncio.sleep(seconds - per_word * len(words))
+        for i, word in enumerate(words):
+            await asyncio.sleep(per_word)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word if i == len(words) - 1 else f"{word} "))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=usage,
+                                                         response_metadata={"model_name": self.model_name}))
+
+    def _get_invocation_params(self, stop=None, **kwargs) -> dict:
+        params = super()._get_invocation_params(stop=stop, **kwargs)
+        params["response_format"] = self.structured_schema  # as ChatOpenAI reports structured calls
+        return params
+
+    def with_structured_output(self, schema, **kwargs):
+        structured = self.model_copy(update={"structured_schema": schema})
+        return structured | RunnableLambda(lambda message: schema.model_validate_json(message.content))
+
+
+class FakeEmbeddings(Embeddings):
+    """OpenAIEmbeddings stand-in: hashed character-trigram vectors, latency per request and per text.
+
+    Texts sharing wording get a high cosine similarity, so the retrieval score
+    gate sees accept / grey-zone / reject scores much as it would in production.
+    """
+
+    def __init__(self, model: str = "bench", **kwargs):
+        self.model = model
+
+    def _vector(self, text: str) -> List[float]:
+        vector = [0.0] * settings.embedding_dim
+        text = " ".join(text.casefold().split())
+        for i in range(max(1, len(text) - 2)):
+            digest = hashlib.blake2b(text[i:i + 3].encode("utf-8"), digest_size=4).digest()
+            vector[int.from_bytes(digest, "little") % settings.embedding_dim] += 1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def _delay(self, n: int) -> float:
+        counters["embed_requests"] += 1
+        counters["embedded_texts"] += n
+        return (settings.embed_latency_ms + settings.embed_ms_per_text * n) / 1000
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self._delay(len(texts)))
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self._delay(1))
+        return self._vector(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self._delay(len(texts)))
+        return [self._vector(t) for t in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self._delay(1))
+        return self._vector(text)
+
+
+class FakeTavilySearch:
+    """TavilySearch stand-in returning three canned results."""
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+    def _result(self, query: str) -> dict:
+        counters["searches"] += 1
+        return {"query": query, "results": [
+            {"title": f"{query} ({i})", "content": f"Web snippet {i} about {query}. " * 10,
+             "url": f"https://example.com/{i}"} for i in range(3)]}
+
+    async def ainvoke(self, payload: dict, *args, **kwargs) -> dict:
+        await asyncio.sleep(settings.search_latency_ms / 1000)
+        return self._result(payload["query"])
+
+    def invoke(self, payload: dict, *args, **kwargs) -> dict:
+        time.sleep(settings.search_latency_ms / 1000)
+        return self._result(payload["query"])
+
+
+async def fake_mcp_call_tool(name: str, arguments: dict):
+    """MCPClientManager.call_tool stand-in; the result mimics fastmcp's CallToolResult."""
+    counters["mcp_calls"] += 1
+    await asyncio.sleep(settings.mcp_latency_ms / 1000)
+    message = f"✅ Logged interest: {arguments.get('name')} wants {arguments.get('product_name')}"
+    return SimpleNamespace(data={"message": message}, structured_content={"message": message}, content=[])
+
+
+def install() -> None:
+    """Swap the OpenAI and Tavily classes before the backend imports them."""
+    import langchain_openai
+    import langchain_tavily
+
+    langchain_openai.ChatOpenAI = FakeChatOpenAI
+    langchain_openai.OpenAIEmbeddings = FakeEmbeddings
+    langchain_tavily.TavilySearch = FakeTavilySearch
+
+
+def install_mcp(mcp_client) -> None:
+    """Route the backend's MCP client to the stand-in instead of a server on MCP_URL."""
+    mcp_client.call_tool = fake_mcp_call_tool
+
+
+def reset_counters() -> dict:
+    snapshot = dict(counters)
+    for key in counters:
+        counters[key] = 0
+    return snapshot
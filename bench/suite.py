@@ -0,0 +1,259 @@
+"""Offline end-to-end benchmark of the backend with local OpenAI / Tavily / MCP stand-ins.
+
+Runs in a scratch directory, so no database, Chroma or log file of the
+checkout is touched, and no API credits are spent:
+1. ingestion: bulk-index the real brochures in documents/ (cold, then an unchanged re-sync)
+2. chat: POST /chat on the in-process FastAPI app at each --concurrency level
+3. interview: scripted leads through /chat, latency per turn
+Per-node, per-LLM and per-tool latencies are read from the Prometheus metrics
+the backend records (metrics.py) for each phase. Stand-in latencies and token
+counts are set with the --llm-* / --embed-* / --search-ms options (see stand_ins.py).
+
+Results are JSON (stdout, or --out) with the git commit, so runs of two
+commits can be diffed directly.
+
+Usage (from the repo root):
+    python bench/suite.py [--concurrency 1 10 100] [--requests 100] [--out bench_results.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+BACKEND_DIR = os.path.join(REPO_DIR, "backend")
+
+CHAT_QUESTIONS = [
+    "คุ้มชีวา คุ้มครองอะไรบ้าง",
+    "เบี้ยประกันคุ้มออมสุขปีละเท่าไหร่",
+    "ตลอดชีพ 90/20 ต้องจ่ายเบี้ยกี่ปี",
+    "คุ้มรักษาเหมาจ่าย เอ็กซ์ตร้า ค่าห้องวันละเท่าไหร่",
+    "What does คุ้มตลอดชีพ พลัส cover?",
+    "ลดหย่อนภาษีประกันชีวิตล่าสุดได้เท่าไหร่",
+    "สวัสดีครับ",
+    "Can I pay the premium monthly?",
+]
+INTERVIEW_SCRIPT = ["อยากสมัครคุ้มชีวาครับ", "ผมชื่อสมชาย ใจดี อายุ 35", "วิศวกร", "เงินเดือน 6 หมื่น", "-", "ถูกต้องครับ"]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def latency_summary(samples_ms: list) -> dict:
+    if not samples_ms:
+        return {}
+    ordered = sorted(samples_ms)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 1)
+
+    return {"n": len(ordered), "mean_ms": round(statistics.fmean(ordered), 1), "p50_ms": pct(50),
+            "p95_ms": pct(95), "p99_ms": pct(99), "max_ms": round(ordered[-1], 1)}
+
+
+def prepare_environment(workdir: str, args) -> None:
+    """Point every relative path of the backend at workdir and load the stand-ins."""
+    os.environ.update({
+        "OPENAI_API_KEY": "bench", "TAVILY_API_KEY": "bench",
+        "DOC_SOURCE_DIR": os.path.join(REPO_DIR, "documents"),
+        "INDEX_ON_STARTUP": "false",
+        "ANSWER_CACHE_ENABLED": str(args.caches).lower(),
+        "WEB_SEARCH_CACHE_ENABLED": str(args.caches).lower(),
+        "MCP_OUTBOX_FLUSH_INTERVAL_SECONDS": "3600",
+    })
+    os.chdir(workdir)
+    # backend first: some bench scripts share a module name with the backend module they measure
+    sys.path[:] = [BACKEND_DIR] + [p for p in sys.path if os.path.abspath(p or ".") != BENCH_DIR] + [BENCH_DIR]
+    import stand_ins
+
+    stand_ins.settings.llm_latency_ms = args.llm_ms
+    stand_ins.settings.llm_ms_per_token = args.llm_ms_per_token
+    stand_ins.settings.completion_tokens = args.completion_tokens
+    stand_ins.settings.embed_latency_ms = args.embed_ms
+    stand_ins.settings.search_latency_ms = args.search_ms
+    stand_ins.settings.mcp_latency_ms = args.mcp_ms
+    stand_ins.install()
+
+
+def metric_snapshot() -> dict:
+    """(family, label) -> [sum, count] of the backend's latency histograms."""
+    from prometheus_client import REGISTRY
+
+    wanted = {"rag_node_duration_seconds": "node", "rag_llm_duration_seconds": "node",
+              "rag_tool_duration_seconds": "tool"}
+    snapshot = {}
+    for family in REGISTRY.collect():
+        if family.name not in wanted:
+            continue
+        for sample in family.samples:
+            if sample.name.endswith(("_sum", "_count")):
+                key = (family.name, sample.labels[wanted[family.name]])
+                slot = snapshot.setdefault(key, [0.0, 0.0])
+                slot[0 if sample.name.endswith("_sum") else 1] += sample.value
+    return snapshot
+
+
+def metric_delta(before: dict, after: dict) -> dict:
+    sections = {"rag_node_duration_seconds": "nodes", "rag_llm_duration_seconds": "llm_by_node",
+                "rag_tool_duration_seconds": "tools"}
+    out = {name: {} for name in sections.values()}
+    for (family, label), (total, count) in after.items():
+        prev_total, prev_count = before.get((family, label), (0.0, 0.0))
+        calls = int(count - prev_count)
+        if calls:
+            out[sections[family]][label] = {"calls": calls,
+                                            "mean_ms": round((total - prev_total) / calls * 1000, 1)}
+    return out
+
+
+async def bench_ingestion(workers: int) -> dict:
+    import stand_ins
+    from bulk_indexer import sync_directory
+    from documents_loaders import vectorstore
+
+    stand_ins.reset_counters()
+    cold = await asyncio.to_thread(sync_directory, workers=workers)
+    embedded = stand_ins.reset_counters()
+    warm = await asyncio.to_thread(sync_directory, workers=workers)
+    chunks = vectorstore()._collection.count()
+    return {"files": len(cold["indexed"]), "failed": len(cold["failed"]), "chunks": chunks,
+            "cold_seconds": round(cold["seconds"], 3),
+            "files_per_s": round(len(cold["indexed"]) / cold["seconds"], 2) if cold["seconds"] else None,
+            "chunks_per_s": round(chunks / cold["seconds"], 1) if cold["seconds"] else None,
+            "embed_requests": embedded["embed_requests"], "embedded_texts": embedded["embedded_texts"],
+            "unchanged_resync_seconds": round(warm["seconds"], 4)}
+
+
+async def bench_chat(client, concurrency: int, requests: int) -> dict:
+    import stand_ins
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post("/chat", json={"question": CHAT_QUESTIONS[i % len(CHAT_QUESTIONS)],
+                                                        "session_id": f"chat-c{concurrency}-{i}"})
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                errors += 1
+
+    stand_ins.reset_counters()
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    calls = stand_ins.reset_counters()
+    return {"concurrency": concurrency, "requests": requests, "errors": errors,
+            "throughput_rps": round(requests / elapsed, 2), **latency_summary(latencies),
+            "llm_calls_per_request": round(calls["llm_calls"] / requests, 2),
+            "prompt_tokens_per_request": round(calls["prompt_tokens"] / requests, 1),
+            "searches": calls["searches"]}
+
+
+async def bench_interview(client, sessions: int) -> dict:
+    import stand_ins
+
+    per_turn = [[] for _ in INTERVIEW_SCRIPT]
+    completed = 0
+
+    async def lead(n: int):
+        nonlocal completed
+        answer = ""
+        for turn, message in enumerate(INTERVIEW_SCRIPT):
+            started = time.perf_counter()
+            response = await client.post("/chat", json={"question": message, "session_id": f"lead-{n}"})
+            per_turn[turn].append((time.perf_counter() - started) * 1000)
+            answer = response.json().get("answer", "") if response.status_code == 200 else ""
+        completed += "ขอบคุณ" in answer
+
+    stand_ins.reset_counters()
+    await asyncio.gather(*(lead(n) for n in range(sessions)))
+    calls = stand_ins.reset_counters()
+    every_turn = [ms for turn in per_turn for ms in turn]
+    return {"sessions": sessions, "turns_per_lead": len(INTERVIEW_SCRIPT), "leads_completed": completed,
+            "turn_latency": latency_summary(every_turn),
+            "p50_ms_by_turn": [latency_summary(turn).get("p50_ms") for turn in per_turn],
+            "llm_calls_per_lead": round(calls["llm_calls"] / sessions, 2), "mcp_calls": calls["mcp_calls"]}
+
+
+async def run(args) -> dict:
+    import httpx
+    import stand_ins
+    import main
+    from mcp_client import mcp_client
+
+    from resources import registry
+
+    stand_ins.install_mcp(mcp_client())
+    await registry.startup()  # the ASGI transport skips the lifespan, which warms up the resources
+    results = {"meta": {"commit": git_commit(), "python": platform.python_version(),
+                        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "caches": args.caches,
+                        "stand_ins": stand_ins.settings.as_dict()}}
+
+    before = metric_snapshot()
+    results["ingestion"] = await bench_ingestion(args.index_workers)
+    results["ingestion"]["breakdown"] = metric_delta(before, metric_snapshot())
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        results["chat"] = []
+        for concurrency in args.concurrency:
+            before = metric_snapshot()
+            level = await bench_chat(client, concurrency, max(args.requests, concurrency))
+            level["breakdown"] = metric_delta(before, metric_snapshot())
+            results["chat"].append(level)
+
+        before = metric_snapshot()
+        results["interview"] = await bench_interview(client, args.interview_sessions)
+        results["interview"]["breakdown"] = metric_delta(before, metric_snapshot())
+    await mcp_client().close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--requests", type=int, default=100, help="/chat requests per concurrency level")
+    parser.add_argument("--interview-sessions", type=int, default=10)
+    parser.add_argument("--index-workers", type=int, default=4)
+    parser.add_argument("--caches", action="store_true", help="keep the answer and web search caches on")
+    parser.add_argument("--llm-ms", type=float, default=300.0, help="stand-in LLM latency per call")
+    parser.add_argument("--llm-ms-per-token", type=float, default=10.0)
+    parser.add_argument("--completion-tokens", type=int, default=120)
+    parser.add_argument("--embed-ms", type=float, default=40.0)
+    parser.add_argument("--search-ms", type=float, default=800.0)
+    parser.add_argument("--mcp-ms", type=float, default=20.0)
+    parser.add_argument("--workdir", help="scratch directory (default: a new temp dir)")
+    parser.add_argument("--out", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    out_path = os.path.abspath(args.out) if args.out else None
+    prepare_environment(args.workdir or tempfile.mkdtemp(prefix="rag-bench-"), args)
+    # the backend prints retrieval results; keep stdout for the JSON
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = asyncio.run(run(args))
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""Checks of the /chat turn pipeline against the local stand-ins: LLM calls per turn, coalescing, serialization.
+
+1. single pass: every turn (/chat and /chat/stream, RAG, web, small talk and
+   interview turns) runs the graph once: router_node exactly once and no
+   LLM-calling node more than once
+2. coalescing: identical submissions sent concurrently on one session run
+   one turn and all get its answer, on /chat and on /chat/stream (where
+   every duplicate stream also gets the turn's tokens)
+3. serialization: different questions sent concurrently on one session are
+   all kept, in order, in the session state and the chat history
+4. fresh context: a direct-answer turn after a RAG turn is answered without
+   the previous turn's KB chunks or web results
+5. compaction: a session past HISTORY_KEEP_TURNS + HISTORY_SUMMARIZE_BATCH
+   turns is summarized by a background task after the reply (never inside
+   the graph pass), and not while a lead interview is in progress
+
+Prints per-turn LLM calls by node as JSON and exits with status 1 when a
+check fails. Runs in a scratch directory with the brochures in documents/
+indexed; no network access or API credits needed.
+
+Usage (from the repo root):
+    python bench/turn_pipeline.py [--duplicates 3] [--out turn_pipeline.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+from suite import CHAT_QUESTIONS, INTERVIEW_SCRIPT, git_commit, metric_delta, metric_snapshot, prepare_environment
+
+# (endpoint, session, question) in order; each turn is checked on its own
+TURNS = [("/chat", "single-a", q) for q in CHAT_QUESTIONS[:3]] \
+    + [("/chat/stream", "single-a", CHAT_QUESTIONS[5]), ("/chat", "single-a", CHAT_QUESTIONS[6])] \
+    + [("/chat", "single-lead", q) for q in INTERVIEW_SCRIPT]
+# routed to 'answer' by the stand-in router
+DIRECT_QUESTION = "What is 12 * 7?"
+
+
+def reply_of(endpoint: str, response) -> tuple:
+    """(ok, answer) of one turn's response; /chat/stream answers come in the final SSE 'done' event."""
+    if response.status_code != 200:
+        return False, None
+    if endpoint == "/chat":
+        return True, response.json()["answer"]
+    done = response.text.rsplit("event: done\ndata: ", 1)
+    return len(done) == 2, json.loads(done[1])["answer"] if len(done) == 2 else None
+
+
+async def post(client, endpoint: str, session_id: str, question: str) -> tuple:
+    response = await client.post(endpoint, json={"question": question, "session_id": session_id})
+    return reply_of(endpoint, response)
+
+
+def turn_calls(before: dict, after: dict) -> dict:
+    delta = metric_delta(before, after)
+    return {"graph_runs": delta["nodes"].get("router", {}).get("calls", 0),
+            "llm_by_node": {node: v["calls"] for node, v in delta["llm_by_node"].items()}}
+
+
+async def check_single_pass(client, failures: list) -> list:
+    import stand_ins
+
+    turns = []
+    for endpoint, session_id, question in TURNS:
+        stand_ins.reset_counters()
+        before = metric_snapshot()
+        ok, _ = await post(client, endpoint, session_id, question)
+        calls = {"endpoint": endpoint, "question": question, "ok": ok, **turn_calls(before, metric_snapshot()),
+                 "llm_calls": stand_ins.reset_counters()["llm_calls"]}
+        turns.append(calls)
+        repeated = [node for node, n in calls["llm_by_node"].items() if n > 1]
+        if not ok or calls["graph_runs"] != 1 or repeated:
+            failures.append(f"single pass: {endpoint} {question!r} ran the graph {calls['graph_runs']} times, "
+                            f"LLM calls by node {calls['llm_by_node']}")
+        if calls["llm_calls"] != sum(calls["llm_by_node"].values()):
+            failures.append(f"single pass: {question!r} made LLM calls outside the graph nodes")
+    return turns
+
+
+async def check_coalescing(client, endpoint: str, duplicates: int, failures: list) -> dict:
+    from db_utils import aget_chat_history
+
+    session_id = f"coalesce{endpoint.replace('/', '-')}"
+    before = metric_snapshot()
+    responses = await asyncio.gather(*(client.post(endpoint, json={"question": CHAT_QUESTIONS[0],
+                                                                   "session_id": session_id})
+                                       for _ in range(duplicates)))
+    calls = turn_calls(before, metric_snapshot())
+    history = await aget_chat_history(session_id)
+    replies = [reply_of(endpoint, r) for r in responses]
+    answers = {answer for _, answer in replies}
+    tokens = [r.text.count("event: token\n") for r in responses] if endpoint != "/chat" else []
+    if not all(ok for ok, _ in replies) or len(answers) != 1:
+        failures.append(f"coalescing: {endpoint} duplicates got different replies: {replies}")
+    if calls["graph_runs"] != 1 or len(history) != 2:
+        failures.append(f"coalescing: {duplicates} {endpoint} duplicates ran {calls['graph_runs']} turns "
+                        f"and stored {len(history) // 2}")
+    if tokens and (len(set(tokens)) != 1 or not tokens[0]):
+        failures.append(f"coalescing: {endpoint} duplicates streamed different token counts {tokens}")
+    return {"endpoint": endpoint, "submissions": duplicates, **calls, "stored_turns": len(history) // 2,
+            **({"tokens_per_stream": tokens} if tokens else {})}
+
+
+async def check_serialization(client, failures: list) -> dict:
+    import main
+    from db_utils import aget_chat_history
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    questions = CHAT_QUESTIONS[1:5]
+    before = metric_snapshot()
+    replies = await asyncio.gather(*(post(client, "/chat", "serial", q) for q in questions))
+    calls = turn_calls(before, metric_snapshot())
+    history = await aget_chat_history("serial")
+    state = await main.get_state("serial")
+    humans = [m.content for m in state["messages"] if isinstance(m, HumanMessage)]
+    ais = [m for m in state["messages"] if isinstance(m, AIMessage)]
+    stored = [m["content"] for m in history if m["role"] == "human"]
+    if not all(ok for ok, _ in replies) or calls["graph_runs"] != len(questions):
+        failures.append(f"serialization: {len(questions)} questions ran {calls['graph_runs']} turns")
+    # compaction may summarize early turns away from the state, so compare the most recent ones
+    if sorted(stored) != sorted(questions) or humans != stored[-len(humans):] or len(ais) != len(humans):
+        failures.append(f"serialization: turns lost or interleaved (history {stored}, state {humans})")
+    return {"questions": len(questions), **calls, "stored_turns": len(stored),
+            "state_turns": len(humans)}
+
+
+async def check_fresh_context(client, failures: list) -> dict:
+    import main
+    import stand_ins
+
+    await post(client, "/chat", "fresh", CHAT_QUESTIONS[0])
+    carried = bool((await main.get_state("fresh")).get("rag"))
+    stand_ins.last_prompt = ""
+    ok, _ = await post(client, "/chat", "fresh", DIRECT_QUESTION)
+    state = await main.get_state("fresh")
+    if state.get("route") != "answer" or not stand_ins.last_prompt:
+        failures.append(f"fresh context: {DIRECT_QUESTION!r} was not answered directly (route {state.get('route')})")
+    stale = [key for key in main.TURN_KEYS if state.get(key)]
+    leaked = [part for part in ("Knowledge Base Information", "Web Search Results") if part in stand_ins.last_prompt]
+    if not carried:
+        failures.append("fresh context: the RAG turn stored no KB context, so the check proves nothing")
+    if not ok or stale or leaked:
+        failures.append(f"fresh context: {DIRECT_QUESTION!r} after a RAG turn kept {stale} in the state "
+                        f"and sent {leaked} to the answer LLM")
+    return {"rag_turn_context": carried, "stale_keys": stale, "prompt_context": leaked}
+
+
+async def check_compaction(client, failures: list) -> dict:
+    import main
+    from config import HISTORY_KEEP_TURNS, HISTORY_SUMMARIZE_BATCH
+
+    turns = HISTORY_KEEP_TURNS + HISTORY_SUMMARIZE_BATCH
+    for i in range(turns):
+        await post(client, "/chat", "compact", CHAT_QUESTIONS[i % 4])
+    await asyncio.gather(*main.compactor._tasks.values())
+    state = await main.get_state("compact")
+    kept = len(state["messages"]) // 2
+    skipped = main.compactor.stats()["skipped_interview"]
+    if not state.get("history_summary") or kept != HISTORY_KEEP_TURNS:
+        failures.append(f"compaction: {turns} turns left {kept} verbatim and summary "
+                        f"{bool(state.get('history_summary'))}")
+    if not skipped:
+        failures.append("compaction: lead interview turns were not skipped")
+    return {"turns": turns, "kept_turns": kept, "summarized": bool(state.get("history_summary")),
+            "skipped_interview_turns": skipped}
+
+
+async def run(args) -> tuple:
+    import httpx
+    import stand_ins
+    import main
+    from bulk_indexer import sync_directory
+    from mcp_client import mcp_client
+    from resources import registry
+
+    stand_ins.install_mcp(mcp_client())
+    await registry.startup()  # the ASGI transport skips the lifespan, which warms up the resources
+    await asyncio.to_thread(sync_directory)
+
+    failures = []
+    results = {"meta": {"commit": git_commit(), "stand_ins": stand_ins.settings.as_dict()}}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        results["turns"] = await check_single_pass(client, failures)
+        results["coalescing"] = [await check_coalescing(client, endpoint, args.duplicates, failures)
+                                 for endpoint in ("/chat", "/chat/stream")]
+        results["serialization"] = await check_serialization(client, failures)
+        results["fresh_context"] = await check_fresh_context(client, failures)
+        results["compaction"] = await check_compaction(client, failures)
+    results["chat_turns"] = main.chat_turns.stats()
+    await mcp_client().close()
+    results["failures"] = failures
+    return results, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duplicates", type=int, default=3, help="identical concurrent submissions to coalesce")
+    parser.add_argument("--workdir", help="scratch directory (default: a new temp dir)")
+    parser.add_argument("--out", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    out_path = os.path.abspath(args.out) if args.out else None
+    # short stand-in latencies: the checks count calls, they do not time them
+    prepare_environment(args.workdir or tempfile.mkdtemp(prefix="rag-turns-"), SimpleNamespace(
+        caches=False, llm_ms=20.0, llm_ms_per_token=0.0, completion_tokens=40, embed_ms=1.0, search_ms=20.0,
+        mcp_ms=1.0))
+    with contextlib.redirect_stdout(io.StringIO()):
+        results, failures = asyncio.run(run(args))
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Tavily calls and latency with the persistent web search cache, against a local Tavily stand-in.
+
+Scenarios:
+- burst: --clients concurrent sessions ask the same trending question (in
+  varying case / spacing / punctuation), uncached vs. cached
+- restart: a new cache instance on the same database file answers from disk
+- stale: once the TTL passes, stale-while-revalidate serves the old result
+  immediately and refreshes it with one background search
+
+Usage (from the repo root):
+    python bench/web_search_cache.py --clients 50 --latency-ms 800
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+os.environ.setdefault("WEB_SEARCH_CACHE_DB_PATH", os.path.join(tempfile.mkdtemp(), "web_search_cache.db"))
+
+from web_search_cache import WebSearchCache  # noqa: E402
+
+VARIANTS = ["อัตราดอกเบี้ยนโยบายล่าสุด", "อัตราดอกเบี้ยนโยบายล่าสุด?", "  อัตราดอกเบี้ยนโยบาย   ล่าสุด ",
+            "Latest BOT policy rate", "latest bot policy rate?", "LATEST  BOT POLICY RATE"]
+
+
+class FakeTavily:
+    """Stand-in for TavilySearch.ainvoke with a fixed latency and a call counter."""
+
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000
+        self.calls = 0
+
+    async def ainvoke(self, payload: dict) -> dict:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return {"query": payload["query"], "results": [
+            {"title": f"Result for {payload['query']}", "content": "x" * 500, "url": "https://example.com"}]}
+
+
+async def burst(clients: int, tavily: FakeTavily, cache=None) -> dict:
+    async def fetch(query):
+        return await tavily.ainvoke({"query": query})
+
+    async def one(i):
+        started = time.perf_counter()
+        query = VARIANTS[i % len(VARIANTS)]
+        await (cache.search(query, fetch) if cache else fetch(query))
+        return (time.perf_counter() - started) * 1000
+
+    latencies = await asyncio.gather(*(one(i) for i in range(clients)))
+    return {"requests": clients, "tavily_calls": tavily.calls,
+            "p50_ms": round(statistics.median(latencies), 1), "max_ms": round(max(latencies), 1)}
+
+
+async def main_async(args) -> dict:
+    db_path = os.environ["WEB_SEARCH_CACHE_DB_PATH"]
+    results = {"uncached": await burst(args.clients, FakeTavily(args.latency_ms))}
+
+    cache = WebSearchCache(db_path, ttl_seconds=args.ttl)
+    tavily = FakeTavily(args.latency_ms)
+    results["cached_cold"] = await burst(args.clients, tavily, cache)
+    results["cached_warm"] = await burst(args.clients, FakeTavily(args.latency_ms), cache)
+
+    restarted = WebSearchCache(db_path, ttl_seconds=args.ttl)
+    results["after_restart"] = await burst(args.clients, FakeTavily(args.latency_ms), restarted)
+
+    await asyncio.sleep(args.ttl + 0.1)
+    tavily = FakeTavily(args.latency_ms)
+    results["stale_while_revalidate"] = await burst(args.clients, tavily, restarted)
+    await asyncio.sleep(args.latency_ms / 1000 + 0.1)  # let the background refresh land
+    results["stale_while_revalidate"]["tavily_calls_after_refresh"] = tavily.calls
+    results["stats"] = restarted.stats()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=800)
+    parser.add_argument("--ttl", type=float, default=1.0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,35 @@ import streamlit as st
 import requests
 import uuid
 import os
+import json
+import time
 
 # CONFIG
 API_BASE = "http://127.0.0.1:8000"
 UPLOAD_ENDPOINT = f"{API_BASE}/upload-doc"
 CHAT_ENDPOINT = f"{API_BASE}/chat"
+CHAT_STREAM_ENDPOINT = f"{API_BASE}/chat/stream"
 SESSIONS_ENDPOINT = f"{API_BASE}/sessions"
 HISTORY_ENDPOINT = f"{API_BASE}/history"
+JOBS_ENDPOINT = f"{API_BASE}/jobs"
+JOB_POLL_TIMEOUT_SECONDS = 600  # stop waiting for an indexing job after this long
 
 st.set_page_config(page_title="RAG Chatbot", page_icon="💬")
+
+
+def iter_sse(response):
+    """Yield (event, data) pairs from a Server-Sent Events response."""
+    event, data_lines = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+
 #  Ensure persistence across reruns
 st.session_state.setdefault("awaiting_reply", False)
 st.session_state.setdefault("session_id", str(uuid.uuid4()))
@@ -76,8 +96,35 @@ if uploaded_file:
         files = {"file": (uploaded_file.name, uploaded_file, uploaded_file.type)}
         try:
             r = requests.post(UPLOAD_ENDPOINT, files=files)
-            if r.status_code == 200:
-                st.sidebar.success(" File uploaded successfully!")
+            if r.status_code in (200, 202):
+                job_id = r.json()["job_id"]
+                progress_bar = st.sidebar.progress(0.0, text="Indexing...")
+                deadline = time.monotonic() + JOB_POLL_TIMEOUT_SECONDS
+                job, lost = {"status": "running"}, None
+                while time.monotonic() < deadline:
+                    jr = requests.get(f"{JOBS_ENDPOINT}/{job_id}", timeout=10)
+                    if jr.status_code != 200:  # e.g. 404: jobs are in memory and a backend restart drops them
+                        lost = jr.status_code
+                        break
+                    job = jr.json()
+                    progress = job.get("progress") or {}
+                    if progress.get("chunks_total"):
+                        progress_bar.progress(progress["chunks_written"] / progress["chunks_total"],
+                                              text=f"Indexing... {progress['chunks_written']}/{progress['chunks_total']} chunks")
+                    if job["status"] in ("succeeded", "failed"):
+                        break
+                    time.sleep(1)
+                progress_bar.empty()
+                if job["status"] == "succeeded":
+                    st.sidebar.success(" File uploaded successfully!")
+                elif job["status"] == "failed":
+                    st.sidebar.error(f"Indexing failed: {job.get('error')}")
+                elif lost is not None:
+                    st.sidebar.warning(f"Lost track of indexing job {job_id} (HTTP {lost}); "
+                                       "check the document list to see whether it was indexed.")
+                else:
+                    st.sidebar.warning(f"Still indexing after {JOB_POLL_TIMEOUT_SECONDS} s; "
+                                       "check the document list later.")
             else:
                 st.sidebar.error(f"Upload failed: {r.text}")
         except Exception as e:
@@ -109,35 +156,44 @@ if prompt:
         "model": "gpt-4.1-mini",
     }
 
-    # Send to backend
-    with st.spinner("Thinking..."):
+    # Send to backend and render the answer as it streams in
+    with st.chat_message("assistant"):
+        status = st.empty()
+        placeholder = st.empty()
+        answer = ""
+        status.caption("Thinking...")
         try:
-            response = requests.post(CHAT_ENDPOINT, json=payload)
-            # if response.status_code == 200:
-            #     answer = response.json().get("answer", "No answer.")
-            # else:
-            #     answer = f"Error: {response.text}"
-            if response.status_code == 200:
-                data = response.json()
-                answer = data.get("answer", "No answer.")
-
-                # 🧩 If backend paused for human input
-                if data.get("status") == "interrupted" or data.get("status") == "__interrupted__":
-                    answer = f"🤖 {answer}"  # show the question
-                    st.session_state["awaiting_reply"] = True
+            with requests.post(CHAT_STREAM_ENDPOINT, json=payload, stream=True) as response:
+                if response.status_code == 200:
+                    for event, data in iter_sse(response):
+                        if event == "node":
+                            status.caption(f"⚙️ {data['transition']}")
+                        elif event == "token":
+                            answer += data["content"]
+                            placeholder.markdown(answer + "▌")
+                        elif event == "done":
+                            answer = data.get("answer", "No answer.")
+
+                            # 🧩 If backend paused for human input
+                            if data.get("status") == "interrupted" or data.get("status") == "__interrupted__":
+                                answer = f"🤖 {answer}"  # show the question
+                                st.session_state["awaiting_reply"] = True
+                            else:
+                                st.session_state["awaiting_reply"] = False
+                            if " Logged interest" in answer:
+                                st.session_state["awaiting_reply"] = False
+                        elif event == "error":
+                            answer = f"Error: {data.get('detail')}"
+                            st.session_state["awaiting_reply"] = False
                 else:
+                    answer = f"Error: {response.text}"
                     st.session_state["awaiting_reply"] = False
-                if " Logged interest" in answer:
-                    st.session_state["awaiting_reply"] = False
-            else:
-                answer = f"Error: {response.text}"
-                st.session_state["awaiting_reply"] = False
         except Exception as e:
             answer = f"Exception: {e}"
 
-    # Display assistant response
-    with st.chat_message("assistant"):
-        st.markdown(answer)
+        # Display final assistant response
+        status.empty()
+        placeholder.markdown(answer)
 
     # Save to local session chat history
     st.session_state["chat_history"].append({"role": "assistant", "content": answer})
@@ -1,10 +1,25 @@
 from fastmcp import FastMCP
-import csv
 import os
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from storage import create_store
 
 # Create MCP server
 mcp = FastMCP("ProductInterestMCP")
+store = create_store()
+
+MAX_PAGE_SIZE = 1000
+
+
+class ProductInterestRecord(BaseModel):
+    name: str
+    age: int
+    occupation: str
+    income: int
+    product_name: str
+    memo: str = ""
+    request_id: str = ""
+
 
 # Define tool via decorator
 @mcp.tool()
@@ -14,23 +29,40 @@ def log_product_interest(
     occupation: str,
     income: int,
     product_name: str,
-    memo: str = ""
+    memo: str = "",
+    request_id: str = ""
 ) -> dict:
-    """Save user data to csv bu tool calling mcp"""
-    DATA_PATH = "data/interested_users.csv"
-    os.makedirs(os.path.dirname(DATA_PATH), exist_ok=True)
-    file_exists = os.path.exists(DATA_PATH)
-
-    with open(DATA_PATH, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        if not file_exists:
-            writer.writerow(["name", "age", "occupation", "income", "product_name", "memo"])
-        writer.writerow([name, age, occupation, income, product_name, memo])
+    """Save one customer's interest in a product to the lead store (SQLite or CSV, see storage.py).
 
+    request_id is an idempotency key: a retried call with the same key is stored once.
+    """
+    store.append([{"name": name, "age": age, "occupation": occupation, "income": income,
+                   "product_name": product_name, "memo": memo, "request_id": request_id}])
     return {"message": f"✅ Logged interest: {name} wants {product_name}"}
 
 
+@mcp.tool()
+def log_product_interests_bulk(interests: List[ProductInterestRecord]) -> dict:
+    """Save many product interests in one call (one transaction / one fsync)."""
+    count = store.append([interest.model_dump() for interest in interests])
+    return {"message": f"✅ Logged {count} product interests", "count": count}
+
+
+@mcp.tool()
+def query_product_interests(
+    product_name: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: int = Field(50, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Field(0, ge=0),
+) -> dict:
+    """List logged interests, newest first, filtered by product and ISO date range [since, until)."""
+    items, total = store.query(product_name, since, until, limit, offset)
+    next_offset = offset + len(items) if offset + len(items) < total else None
+    return {"items": items, "total": total, "limit": limit, "offset": offset, "next_offset": next_offset}
+
+
 if __name__ == "__main__":
     # Run MCP server (default transport is stdio; for HTTP use transport="streamable-http", etc.)
-    mcp.run(transport="streamable-http", port=8081)
-    
+    mcp.run(transport="streamable-http", port=int(os.getenv("MCP_PORT", "8081")))
+
@@ -0,0 +1,289 @@
+"""Storage backends for product-interest records.
+
+MCP_STORAGE_BACKEND selects the backend:
+- "sqlite" (default): WAL-mode table indexed on product_name and created_at.
+  When the table is first created, rows already logged to the CSV file(s)
+  (the previous default backend) are imported, so no lead is lost or hidden
+  from query_product_interests.
+- "csv": rows appended to data/interested_users.csv by a single writer thread.
+  The writer fsyncs once per batch and rotates the file past MCP_CSV_MAX_BYTES.
+
+Both are safe under concurrent tool calls. A write returns only once its rows are durable.
+A record with a request_id (the client's idempotency key) is stored at most
+once, so a call the client retries after a timeout does not duplicate a lead.
+"""
+import csv
+import glob
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+DATA_DIR = os.getenv("MCP_DATA_DIR", "data")
+STORAGE_BACKEND = os.getenv("MCP_STORAGE_BACKEND", "sqlite")  # sqlite | csv
+SQLITE_PATH = os.getenv("MCP_SQLITE_PATH", os.path.join(DATA_DIR, "interested_users.db"))
+CSV_PATH = os.getenv("MCP_CSV_PATH", os.path.join(DATA_DIR, "interested_users.csv"))
+CSV_MAX_BYTES = int(os.getenv("MCP_CSV_MAX_BYTES", str(64 * 1024 * 1024)))
+
+FIELDS = ["name", "age", "occupation", "income", "product_name", "memo"]
+CSV_HEADER = FIELDS + ["created_at", "request_id"]
+
+
+def utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+
+def normalize_bound(value: Optional[str]) -> Optional[str]:
+    """Accept a date or datetime (ISO 8601) and return a comparable UTC timestamp string."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+
+def as_int(value: Optional[str]):
+    """CSV cells are text; keep what is not a whole number as it is."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def csv_files(path: str) -> List[str]:
+    """path's rotated files (oldest first), then path itself."""
+    root, ext = os.path.splitext(path)
+    return sorted(glob.glob(f"{glob.escape(root)}.*{ext}")) + [path]
+
+
+class InterestStore:
+    """Interface shared by the storage backends."""
+
+    def append(self, records: List[Dict]) -> int:
+        """Store records; returns how many were new (a request_id already stored is skipped)."""
+        raise NotImplementedError
+
+    def query(self, product_name: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+              limit: int = 50, offset: int = 0) -> Tuple[List[Dict], int]:
+        """(records, total matches), newest first; since is inclusive, until exclusive."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteInterestStore(InterestStore):
+    def __init__(self, path: str = SQLITE_PATH, legacy_csv_path: str = CSV_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        is_new = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                                   "AND name = 'product_interests'").fetchone() is None
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS product_interests
+                             (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                              name TEXT NOT NULL,
+                              age INTEGER,
+                              occupation TEXT,
+                              income INTEGER,
+                              product_name TEXT NOT NULL,
+                              memo TEXT,
+                              created_at TEXT NOT NULL,
+                              request_id TEXT)''')
+        columns = {row["name"] for row in self.conn.execute('PRAGMA table_info(product_interests)')}
+        if "request_id" not in columns:  # tables created before idempotency keys
+            self.conn.execute('ALTER TABLE product_interests ADD COLUMN request_id TEXT')
+        self.conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_product_interests_request '
+                          'ON product_interests (request_id) WHERE request_id IS NOT NULL')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_product_interests_product_created '
+                          'ON product_interests (product_name, created_at)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_product_interests_created ON product_interests (created_at)')
+        self.conn.commit()
+        self._lock = threading.Lock()
+        if is_new:
+            self.import_csv(legacy_csv_path)
+
+    def import_csv(self, csv_path: str) -> int:
+        """Copy the rows of csv_path and its rotated files into the table (rows without created_at get the file's mtime)."""
+        rows = []
+        for path in csv_files(csv_path):
+            if not os.path.exists(path):
+                continue
+            mtime = datetime.fromtimestamp(os.path.getmtime(path), timezone.utc).isoformat(timespec="microseconds")
+            with open(path, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    if not row.get("name") or not row.get("product_name"):
+                        continue
+                    rows.append(tuple(as_int(row.get(f)) if f in ("age", "income") else row.get(f) or ""
+                                      for f in FIELDS) + (row.get("created_at") or mtime, row.get("request_id") or None))
+        return self._insert(rows)
+
+    def _insert(self, rows: List[tuple]) -> int:
+        with self._lock:
+            with self.conn:  # one transaction per call, however many records
+                before = self.conn.total_changes
+                self.conn.executemany('INSERT OR IGNORE INTO product_interests (name, age, occupation, income, '
+                                      'product_name, memo, created_at, request_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+                return self.conn.total_changes - before
+
+    def append(self, records):
+        created_at = utc_now()
+        return self._insert([tuple(r.get(f, "") for f in FIELDS) + (created_at, r.get("request_id") or None)
+                             for r in records])
+
+    def query(self, product_name=None, since=None, until=None, limit=50, offset=0):
+        clauses, params = [], []
+        if product_name:
+            clauses.append('product_name = ?')
+            params.append(product_name)
+        if since:
+            clauses.append('created_at >= ?')
+            params.append(normalize_bound(since))
+        if until:
+            clauses.append('created_at < ?')
+            params.append(normalize_bound(until))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            total = self.conn.execute(f'SELECT COUNT(*) FROM product_interests {where}', params).fetchone()[0]
+            rows = self.conn.execute(f'SELECT * FROM product_interests {where} ORDER BY created_at DESC, id DESC '
+                                     'LIMIT ? OFFSET ?', params + [limit, offset]).fetchall()
+        return [dict(row) for row in rows], total
+
+    def close(self):
+        self.conn.close()
+
+
+class CsvInterestStore(InterestStore):
+    """Append-only CSV owned by one writer thread.
+
+    Callers enqueue rows and wait; the writer drains whatever is queued, writes
+    it, then flushes and fsyncs once for the whole batch (group commit). The
+    request_ids in the files are kept in memory to skip repeated records.
+    """
+
+    def __init__(self, path: str = CSV_PATH, max_bytes: int = CSV_MAX_BYTES):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self._queue: "queue.Queue[Optional[Tuple[List[list], Future]]]" = queue.Queue()
+        self._file = None
+        self._open()
+        self._request_ids = self._stored_request_ids()
+        self._writer = threading.Thread(target=self._write_loop, name="csv-writer", daemon=True)
+        self._writer.start()
+
+    def _open(self) -> None:
+        if os.path.exists(self.path):
+            with open(self.path, newline="", encoding="utf-8") as f:
+                header = next(csv.reader(f), None)
+            if header != CSV_HEADER:  # files from before created_at existed are rotated aside as-is
+                self._rotate_existing()
+        is_new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, "a", newline="", encoding="utf-8")
+        self._csv = csv.writer(self._file)
+        if is_new:
+            self._csv.writerow(CSV_HEADER)
+            self._sync()
+
+    def _stored_request_ids(self) -> set:
+        request_ids = set()
+        for path in csv_files(self.path):
+            if os.path.exists(path):
+                with open(path, newline="", encoding="utf-8") as f:
+                    request_ids.update(row["request_id"] for row in csv.DictReader(f) if row.get("request_id"))
+        return request_ids
+
+    def _unseen(self, rows: List[list], added: set) -> List[list]:
+        """rows whose request_id (last column) is empty or not stored yet; new ids go to added."""
+        fresh = []
+        for row in rows:
+            if row[-1]:
+                if row[-1] in self._request_ids or row[-1] in added:
+                    continue
+                added.add(row[-1])
+            fresh.append(row)
+        return fresh
+
+    def _rotate_existing(self) -> None:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        root, ext = os.path.splitext(self.path)
+        os.replace(self.path, f"{root}.{stamp}{ext}")
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            while True:  # group everything already waiting into this fsync
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            pending = [b for b in batch if b is not None]
+            added: set = set()
+            try:
+                written = []
+                for rows, _ in pending:
+                    fresh = self._unseen(rows, added)
+                    self._csv.writerows(fresh)
+                    written.append(len(fresh))
+                self._sync()
+                self._request_ids |= added
+                for (_, future), count in zip(pending, written):
+                    future.set_result(count)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+            if len(pending) != len(batch):  # close() sentinel
+                self._file.close()
+                return
+            if self._file.tell() >= self.max_bytes:
+                self._file.close()
+                self._rotate_existing()
+                self._open()
+
+    def append(self, records):
+        created_at = utc_now()
+        future: Future = Future()
+        self._queue.put(([[r.get(f, "") for f in FIELDS] + [created_at, r.get("request_id") or ""] for r in records],
+                         future))
+        return future.result()
+
+    def query(self, product_name=None, since=None, until=None, limit=50, offset=0):
+        since, until = normalize_bound(since), normalize_bound(until)
+        matches = []
+        for path in csv_files(self.path):
+            if not os.path.exists(path):
+                continue
+            with open(path, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    created_at = row.get("created_at") or ""
+                    if product_name and row.get("product_name") != product_name:
+                        continue
+                    if since and created_at < since:
+                        continue
+                    if until and created_at >= until:
+                        continue
+                    matches.append(row)
+        matches.sort(key=lambda r: r.get("created_at") or "", reverse=True)
+        return matches[offset:offset + limit], len(matches)
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+
+
+def create_store(backend: str = STORAGE_BACKEND) -> InterestStore:
+    if backend == "sqlite":
+        return SqliteInterestStore()
+    if backend == "csv":
+        return CsvInterestStore()
+    raise ValueError(f"Unknown MCP_STORAGE_BACKEND {backend!r}")